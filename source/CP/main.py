@@ -2,45 +2,34 @@ from minizinc import Instance, Model, Solver
 from minizinc.result import Status
 import time
 from datetime import timedelta
-import numpy as np
 import argparse
 import re
-import json
 import os
+import sys
 import math
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import record_result
+from tracing import span, record
+from instance import circle_instance, week_matchings
+from resources import mark, usage, minizinc_memory_mb
 
 def circle_matchings(n):
-    pivot, circle = n, list(range(1, n))
-    weeks = n - 1
-    m = {}
-    for w in range(1, weeks + 1):
-        ms = [(pivot, circle[w-1])]
-        for k in range(1, n//2):
-            i = circle[(w-1 + k) % (n-1)]
-            j = circle[(w-1 - k) % (n-1)]
-            ms.append((i, j))
-        m[w] = ms
-    return m
-
-def generate_dzn(n, matchings, filename):
+    """Circle-method matches as {week: [(i, j), ...]}, 1-based (see instance.py)."""
+    return week_matchings(n, base=1)
+
+def generate_dzn(n, filename):
     with open(filename, 'w') as f:
         f.write(f"num_teams = {n};\n")
         f.write(f"num_weeks = {n - 1};\n")
         f.write(f"num_periods = {n // 2};\n\n")
 
-        weeks = np.zeros((n, n), dtype=int)
-        for week_num, matches in matchings.items():
-            for match in matches:
-                weeks[match[0] - 1, match[1] - 1] = week_num
-                weeks[match[1] - 1, match[0] - 1] = week_num
+        # 1-based week in which two teams meet, 0 on the diagonal
+        weeks = circle_instance(n).week_of_pair + 1
 
-        f.write("week = [|\n")
-        for i in range(n):
-            row = ", ".join(str(weeks[i, j]) for j in range(n))
-            if i == n - 1:
-                f.write(f"{row} |];\n")  
-            else:
-                f.write(f"{row} |\n")
+        rows = [", ".join(map(str, row)) for row in weeks.tolist()]
+        f.write("week = [|\n" + " |\n".join(rows) + " |];\n")
 
 def parse_n_teams(n_input):
     """
@@ -108,53 +97,53 @@ def solution_transform(num_teams, schedule_tuple):
 
     return matrix
 
+def extract_schedule(n, results, matchings):
+    """The [home_team, away_team] matrix of the periods and venues found by MiniZinc."""
+    with span("extract"):
+        return solution_transform(n, (matchings, results['period'], results['home']))
+
 def save_results_as_json(n, results, model_name, output_dir="/res/CP"):
     """
-    Saves the results dictionary to a JSON file.
+    Records the results in the shared results store, which exports them to <output_dir>/<n>.json.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    json_path = os.path.join(output_dir, f"{n}.json")
-    
-    json_obj = {}
-    if os.path.exists(json_path):
-        with open(json_path, "r") as f:
-            try:
-                json_obj = json.load(f)
-            except json.JSONDecodeError:
-                json_obj = {}
-                
-    result = {}
-    result[model_name] = results
-    
-    for method, res in result.items():
-        runtime = res.get("time", 300.0)
-        
-        time_field = 300 if not res.get("optimal") else math.floor(runtime)
-        sol = res.get("sol")
-        matrix = solution_transform(n, sol) if sol else []
-        
-        json_obj[method] = {
+    runtime = results.get("time", 300.0)
+    time_field = 300 if not results.get("optimal") else math.floor(runtime)
+
+    with span("write"):
+        record_result(output_dir, n, model_name, {
             "time": time_field,
-            "optimal": res.get("optimal"),
-            "obj": res.get("obj"),
-            "sol": matrix,
-        }
-    
-    with open(json_path, "w") as f:
-        json.dump(json_obj, f, indent=1)
-    
+            "resources": results.get("resources"),
+            "optimal": results.get("optimal"),
+            "obj": results.get("obj"),
+            "sol": results.get("sol") or [],
+        })
+
 
 def run_minizinc(n, dzn_file, model_file, solver, timeout, init_time):
-    matchings = circle_matchings(n)
-    generate_dzn(n, matchings, dzn_file)
-    model = Model(model_file)
-    solver = Solver.lookup(solver)
-    instance = Instance(solver, model)
-    instance.add_file(dzn_file)
-    remaining_time = timeout - (time.perf_counter() - init_time)
-    results = instance.solve(timeout=timedelta(seconds=remaining_time), random_seed=42)
+    with span("circle_matchings", n=n):
+        matchings = circle_matchings(n)
+    # a private copy of the data file, so that concurrent runs do not overwrite each other's instance
+    fd, dzn_path = tempfile.mkstemp(prefix=f"{os.path.splitext(dzn_file)[0]}_{n}_", suffix=".dzn", dir=".")
+    os.close(fd)
+    try:
+        with span("build"):
+            with span("build.dzn"):
+                generate_dzn(n, dzn_path)
+            with span("build.model"):
+                model = Model(model_file)
+                solver = Solver.lookup(solver)
+                instance = Instance(solver, model)
+                instance.add_file(dzn_path)
+        remaining_time = timeout - (time.perf_counter() - init_time)
+        solve_start = time.perf_counter()
+        with span("solve", solver=solver.name, model=model_file):
+            results = instance.solve(timeout=timedelta(seconds=remaining_time), random_seed=42)
+        # flattening happens inside the minizinc call, its duration is only known from the statistics
+        flat_time = results.statistics.get('flatTime')
+        if isinstance(flat_time, timedelta):
+            record("solve.flatten", solve_start, flat_time.total_seconds())
+    finally:
+        os.remove(dzn_path)
     return results, matchings
 
 def solve_cp_decisional(n, timeout, solver, search_strategy="base", symmetry_breaking='N'):
@@ -162,6 +151,7 @@ def solve_cp_decisional(n, timeout, solver, search_strategy="base", symmetry_bre
     if n % 2 != 0:
         raise ValueError("Number of teams must be even.")
     init_time = time.perf_counter()
+    mark()
 
 
     model_file = f"d_circle_method_{symmetry_breaking}_{search_strategy}.mzn"
@@ -176,7 +166,7 @@ def solve_cp_decisional(n, timeout, solver, search_strategy="base", symmetry_bre
     if status == Status.SATISFIED:
         result = {
             'obj': results.objective,
-            'sol': (matchings, results['period'], results['home']),
+            'sol': extract_schedule(n, results, matchings),
             'optimal': True,
             'time': solve_time
         }
@@ -194,6 +184,7 @@ def solve_cp_decisional(n, timeout, solver, search_strategy="base", symmetry_bre
             'optimal': False,
             'time': solve_time
         }
+    result['resources'] = usage(solver_memory_mb=minizinc_memory_mb(results.statistics))
     return result
 
 def solve_cp_optimization(n, timeout, solver, search_strategy="base", symmetry_breaking=True):
@@ -201,6 +192,7 @@ def solve_cp_optimization(n, timeout, solver, search_strategy="base", symmetry_b
     if n % 2 != 0:
         raise ValueError("Number of teams must be even.")
     init_time = time.perf_counter()
+    mark()
 
     model_file = f"circle_method_{symmetry_breaking}_{search_strategy}.mzn"
     dzn_file = "circle_method.dzn"
@@ -214,14 +206,14 @@ def solve_cp_optimization(n, timeout, solver, search_strategy="base", symmetry_b
     if status == Status.OPTIMAL_SOLUTION:
         result = {
             'obj': results.objective,
-            'sol': (matchings, results["period"], results["home"]),
+            'sol': extract_schedule(n, results, matchings),
             'optimal': True,
             'time': solve_time
         }
     elif status == Status.SATISFIED:
         result = {
             'obj': results.objective,
-            'sol': (matchings, results['period'], results['home']),
+            'sol': extract_schedule(n, results, matchings),
             'optimal': False,
             'time': solve_time
         }
@@ -239,9 +231,10 @@ def solve_cp_optimization(n, timeout, solver, search_strategy="base", symmetry_b
             'optimal': False,
             'time': solve_time
         }
+    result['resources'] = usage(solver_memory_mb=minizinc_memory_mb(results.statistics))
     return result
  
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Sport Tournament Scheduler using CP solvers.")
     parser.add_argument(
         "-n", "--n_teams",
@@ -302,7 +295,7 @@ def main():
         help="Save solver results to JSON files."
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Parse and validate number of teams
     args.n_teams = parse_n_teams(args.n_teams)
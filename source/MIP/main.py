@@ -29,7 +29,17 @@ def parse_n_teams(n_input):
                 print(f"[WARNING] Invalid value for -n: {item}")
     return sorted(result)
 
-def main():
+def str2bool(value):
+    """Parses boolean CLI values such as true/false, y/n, 1/0."""
+    if isinstance(value, bool):
+        return value
+    if value.lower() in ('true', 'y', 'yes', '1'):
+        return True
+    if value.lower() in ('false', 'n', 'no', '0'):
+        return False
+    raise argparse.ArgumentTypeError(f"Boolean value expected, got '{value}'.")
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Sport Tournament Scheduler with MIP formulation.")
     parser.add_argument(
         "-n", "--n_teams",
@@ -72,10 +82,17 @@ def main():
     parser.add_argument(
         "--ic",
         dest="ic",
-        type=bool,
+        type=str2bool,
         default=True,
         help="Enable implied constraints."
     )
+    parser.add_argument(
+        "--solver",
+        type=str,
+        nargs='+',
+        choices=["cbc", "glpk", "gurobi"],
+        help="Restrict the run to these solvers (default: all available)."
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -88,7 +105,7 @@ def main():
         help="Save solver results to JSON files."
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Parse and validate number of teams
     args.n_teams = parse_n_teams(args.n_teams)
@@ -97,25 +114,25 @@ def main():
     
     for n in args.n_teams:
         if args.all:
-            run4dArray(n, args.timeout, ic=False, optimization=False, verbose=args.verbose, save=args.save_json)
-            run4dArray(n, args.timeout, ic=True, optimization=False, verbose=args.verbose, save=args.save_json)
-            run4dArray(n, args.timeout, ic=False, optimization=True, verbose=args.verbose, save=args.save_json)
-            run4dArray(n, args.timeout, ic=True, optimization=True, verbose=args.verbose, save=args.save_json)
-            runCircleMatching(n, args.timeout, ic=False, optimization=False, verbose=args.verbose, save=args.save_json)
-            runCircleMatching(n, args.timeout, ic=True, optimization=False, verbose=args.verbose, save=args.save_json)
-            runCircleMatching(n, args.timeout, ic=False, optimization=True, verbose=args.verbose, save=args.save_json)
-            runCircleMatching(n, args.timeout, ic=True, optimization=True, verbose=args.verbose, save=args.save_json)
+            run4dArray(n, args.timeout, ic=False, optimization=False, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            run4dArray(n, args.timeout, ic=True, optimization=False, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            run4dArray(n, args.timeout, ic=False, optimization=True, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            run4dArray(n, args.timeout, ic=True, optimization=True, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            runCircleMatching(n, args.timeout, ic=False, optimization=False, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            runCircleMatching(n, args.timeout, ic=True, optimization=False, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            runCircleMatching(n, args.timeout, ic=False, optimization=True, verbose=args.verbose, save=args.save_json, solvers=args.solver)
+            runCircleMatching(n, args.timeout, ic=True, optimization=True, verbose=args.verbose, save=args.save_json, solvers=args.solver)
         else:
             if args.CM:
                 if args.run_decisional:
-                    runCircleMatching(n, args.timeout, args.ic, optimization=False, verbose=args.verbose, save=args.save_json)
+                    runCircleMatching(n, args.timeout, args.ic, optimization=False, verbose=args.verbose, save=args.save_json, solvers=args.solver)
                 if args.run_optimization:
-                    runCircleMatching(n, args.timeout, args.ic, optimization=True, verbose=args.verbose, save=args.save_json)
+                    runCircleMatching(n, args.timeout, args.ic, optimization=True, verbose=args.verbose, save=args.save_json, solvers=args.solver)
             if args._4D:
                 if args.run_decisional:
-                    run4dArray(n, args.timeout, args.ic, optimization=False, verbose=args.verbose, save=args.save_json)
+                    run4dArray(n, args.timeout, args.ic, optimization=False, verbose=args.verbose, save=args.save_json, solvers=args.solver)
                 if args.run_optimization:
-                    run4dArray(n, args.timeout, args.ic, optimization=True, verbose=args.verbose, save=args.save_json)
+                    run4dArray(n, args.timeout, args.ic, optimization=True, verbose=args.verbose, save=args.save_json, solvers=args.solver)
     return
 
 if __name__ == "__main__":
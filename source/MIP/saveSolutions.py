@@ -1,17 +1,14 @@
-import os, json, math
+import os, sys, math
 import numpy as np
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import record_result
 
-def saveSol(n, outputs, optimization=True, output_dir='/res/MIP', filename='data.json', update=False):
-    output = {}
-    if update:
-        try:
-            with open(os.path.join(output_dir, filename), 'r', encoding='utf-8') as f:
-                output = json.load(f)
-        except:
-            pass
+
+def saveSol(n, outputs, optimization=True, output_dir='/res/MIP'):
+    """Records every (result, solution, time, name, resources) output in the results store, exported to <output_dir>/<n>.json."""
     for o in outputs:
-        result, solution, time, name = o
+        result, solution, time, name, resources = o
 
         try:
             if result == {} \
@@ -20,12 +17,13 @@ def saveSol(n, outputs, optimization=True, output_dir='/res/MIP', filename='data
                 or (not optimization and result.Solver.termination_condition == 'aborted') \
                 or (optimization and result.Problem.Upper_bound > n) \
                 or solution.shape != (n-1, n//2, n, n):
-                output[name] = {
+                record_result(output_dir, n, name, {
                     "sol": [],
                     "time": 300,
+                    "resources": resources,
                     "optimal": False,
                     "obj": None,
-                }
+                })
                 continue
         except Exception as e:
             pass
@@ -45,15 +43,12 @@ def saveSol(n, outputs, optimization=True, output_dir='/res/MIP', filename='data
         optimal = (not optimization and time < 300) or (optimization and obj == 1 and time < 300)
         formatted_sol = formatted_sol if (not optimization and time < 300) or (not obj == None) else []
 
-        output[name] = {
+        record_result(output_dir, n, name, {
             "sol": formatted_sol,
             "time": time,
+            "resources": resources,
             "optimal": optimal,
             "obj": obj,
-        }
-
-    os.makedirs(output_dir, exist_ok=True)
-    with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=4)
+        })
     return
 
@@ -0,0 +1,184 @@
+"""
+SAT backends for the DIMACS formulas generated by cnf.py.
+
+    z3        Z3, reading the DIMACS file with its own parser
+    cadical, glucose, minisat, kissat
+              CDCL solvers of PySAT (python-sat), each check runs in a forked process
+    external  any DIMACS solver binary run as a subprocess, e.g. kissat, cadical or glucose.
+              The command is read from STS_SAT_SOLVER (default kissat).
+
+Every backend exposes the part of the z3.Solver interface used by the solvers in main.py
+(set, check, model, statistics), so the search does not depend on the backend. Except for z3,
+check() returns z3's sat / unsat / unknown and model() the set of true variables. The PySAT solvers but Kissat
+also take initial phases (set_phases), see PHASE_BACKENDS.
+"""
+import os
+import re
+import sys
+import shlex
+import shutil
+import multiprocessing
+import subprocess
+import importlib.util
+
+from z3 import sat, unsat, unknown
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cnf import read_dimacs
+from z3_config import new_solver
+
+PYSAT_SOLVERS = {'cadical': 'cadical195', 'glucose': 'glucose42', 'minisat': 'minisat22', 'kissat': 'kissat404'}
+BACKENDS = ['z3'] + list(PYSAT_SOLVERS) + ['external']
+# backends swept by --all, when available
+SWEEP_BACKENDS = ['z3', 'cadical', 'external']
+EXTERNAL_ENV = 'STS_SAT_SOLVER'
+# backends whose solver takes initial phases (--seed_phases); Kissat does not in PySAT
+PHASE_BACKENDS = ['cadical', 'glucose', 'minisat']
+
+
+def external_command():
+    return shlex.split(os.environ.get(EXTERNAL_ENV, 'kissat'))
+
+
+def backend_available(backend):
+    if backend in PYSAT_SOLVERS:
+        return importlib.util.find_spec('pysat') is not None
+    if backend == 'external':
+        return shutil.which(external_command()[0]) is not None
+    return True
+
+
+class Statistics(dict):
+    """Solver statistics, read like Z3's."""
+
+    def get_key_value(self, key):
+        return self[key]
+
+
+def _pysat_solve(conn, name, clauses, assumptions, phases):
+    """Body of the process solving a formula with a PySAT solver: sends back (result, model, stats)."""
+    from pysat.solvers import Solver as PySolver
+    with PySolver(name=name, bootstrap_with=clauses) as solver:
+        if phases:
+            solver.set_phases(phases)
+        result = solver.solve(assumptions=assumptions)
+        model = solver.get_model() if result else None
+        try:
+            stats = solver.accum_stats()
+        except NotImplementedError:
+            stats = {}
+    conn.send((result, model, stats))
+
+
+class PySATSolver:
+    """
+    A PySAT solver on a DIMACS formula. CaDiCaL and Kissat do not release the GIL while solving,
+    so they cannot be interrupted from a timer thread: every check runs in a forked process instead,
+    killed when the timeout expires.
+    """
+
+    def __init__(self, path, backend):
+        self.name = PYSAT_SOLVERS[backend]
+        self.num_vars, self.clauses = read_dimacs(path)
+        self._timeout = None
+        self._phases = []
+        self._model = None
+        self._stats = {}
+
+    def set(self, key, value):
+        # PySAT solvers always run with their default seed
+        if key == 'timeout':
+            self._timeout = value / 1000
+
+    def set_phases(self, literals):
+        """Initial phases of the variables, as the literals to try first."""
+        self._phases = literals
+
+    def check(self, *assumptions):
+        context = multiprocessing.get_context('fork')
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(target=_pysat_solve, args=(child_conn, self.name, self.clauses, list(assumptions), self._phases),
+                                  daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            result, model, self._stats = parent_conn.recv() if parent_conn.poll(self._timeout) else (None, None, {})
+        except EOFError:
+            result = None
+        finally:
+            process.kill()
+            process.join()
+            parent_conn.close()
+        if result is None:
+            return unknown
+        if result:
+            self._model = {lit for lit in model if lit > 0}
+            return sat
+        return unsat
+
+    def model(self):
+        return self._model
+
+    def statistics(self):
+        return Statistics({'restarts': self._stats.get('restarts', 0), 'conflicts': self._stats.get('conflicts', 0),
+                           'mk bool var': self.num_vars})
+
+
+class ExternalSolver:
+    """A DIMACS solver binary, run on the formula file at every check."""
+
+    def __init__(self, path, command):
+        self.path = path
+        self.command = command
+        self._timeout = None
+        self._model = None
+        self._stats = Statistics()
+
+    def set(self, key, value):
+        if key == 'timeout':
+            self._timeout = value / 1000
+
+    def check(self):
+        try:
+            proc = subprocess.run(self.command + [self.path], capture_output=True, text=True, timeout=self._timeout)
+        except subprocess.TimeoutExpired:
+            return unknown
+        status, values = None, []
+        for line in proc.stdout.splitlines():
+            if line.startswith('s '):
+                status = line[2:].strip()
+            elif line.startswith('v '):
+                values.extend(int(lit) for lit in line[2:].split())
+            else:
+                # kissat and cadical report e.g. "c conflicts: 1234 ..."
+                match = re.match(r'c\s+(conflicts|restarts):\s+(\d+)', line)
+                if match:
+                    self._stats[match.group(1)] = int(match.group(2))
+        if status == 'SATISFIABLE':
+            self._model = {lit for lit in values if lit > 0}
+            return sat
+        if status == 'UNSATISFIABLE':
+            return unsat
+        return unknown
+
+    def model(self):
+        return self._model
+
+    def statistics(self):
+        return self._stats
+
+
+def cnf_solver(path, backend, ctx=None, n=None):
+    """
+    A solver of the given backend loaded with the DIMACS formula at path of an instance of n teams
+    (for z3, in the Z3 context ctx, with the configured pipeline of z3_config.py).
+    """
+    if backend == 'z3':
+        solver = new_solver(ctx, n)
+        solver.from_file(path)
+        return solver
+    if backend in PYSAT_SOLVERS:
+        return PySATSolver(path, backend)
+    if backend == 'external':
+        return ExternalSolver(path, external_command())
+    raise ValueError(f"Unknown SAT backend: {backend}")
@@ -0,0 +1,501 @@
+"""
+DIMACS CNF generation for the STS SAT model.
+
+Builds the same formula as create_sts_model in main.py, directly as clauses over integer literals
+(variable v is the integer v, its negation -v) instead of Z3 expressions. The model variables come first:
+match_period_vars[(i, j, p)] and home_vars[(i, j)] are numbered by sts_variables, and the auxiliary
+variables of the encodings follow.
+
+Formulas are cached on disk as DIMACS files in STS_CACHE_DIR (default source/.cache), keyed by
+(n, encodings, symmetry breaking, k), so repeated runs read a prebuilt formula instead of generating it.
+"""
+import os
+import sys
+import math
+import tempfile
+from itertools import combinations
+from contextlib import contextmanager
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tracing import span
+from instance import CACHE_DIR, circle_instance, pair_index
+
+# bumped whenever the generated formulas change, so stale cache files are ignored
+CNF_VERSION = 1
+
+
+class CNF:
+    """Clauses over integer literals, stored as blocks of clauses of equal length, with a counter for fresh variables."""
+
+    def __init__(self, num_vars=0):
+        self.num_vars = num_vars
+        self.blocks = []
+
+    @property
+    def num_clauses(self):
+        return sum(len(block) for block in self.blocks)
+
+    def new_vars(self, *shape):
+        """Fresh variables as an array of the given shape, numbered in row-major order."""
+        count = int(np.prod(shape))
+        first = self.num_vars + 1
+        self.num_vars += count
+        return np.arange(first, first + count).reshape(shape)
+
+    def add(self, clause):
+        self.blocks.append(np.array([clause]))
+
+    def add_clauses(self, clauses):
+        """Adds an array of clauses, the last axis holding the literals of each clause."""
+        if clauses.size:
+            self.blocks.append(clauses.reshape(-1, clauses.shape[-1]))
+
+def clauses(*literals):
+    """Clauses made of the given literal arrays, broadcast against each other."""
+    return np.stack(np.broadcast_arrays(*literals), axis=-1)
+
+# --------------------------------------------------------------
+# Exactly-one encodings (same clauses as their Z3 counterparts)
+# Every encoding takes a (groups, size) array of literals and constrains each row of it,
+# all the groups of a constraint family at once. The auxiliary variables of each group are
+# numbered contiguously, in the order the clause-by-clause encodings allocated them.
+# --------------------------------------------------------------
+
+def at_least_one(cnf, lits):
+    cnf.add_clauses(lits)
+
+def at_most_one_np(cnf, lits):
+    a, b = np.triu_indices(lits.shape[1], 1)
+    cnf.add_clauses(clauses(-lits[:, a], -lits[:, b]))
+
+def exactly_one_np(cnf, lits):
+    at_least_one(cnf, lits)
+    at_most_one_np(cnf, lits)
+
+def exactly_one_bw(cnf, lits):
+    at_least_one(cnf, lits)
+    groups, size = lits.shape
+    m = math.ceil(math.log2(size)) if size else 0
+    if m == 0:
+        return
+    r = cnf.new_vars(groups, m)
+    # bits of every index, most significant first
+    bits = (np.arange(size)[:, None] >> np.arange(m - 1, -1, -1)) & 1
+    cnf.add_clauses(clauses(-lits[:, :, None], np.where(bits, r[:, None, :], -r[:, None, :])))
+
+def exactly_one_seq(cnf, lits):
+    at_least_one(cnf, lits)
+    groups, n = lits.shape
+    if n <= 1:
+        return
+    s = cnf.new_vars(groups, n - 1)
+    cnf.add_clauses(clauses(-lits[:, 0], s[:, 0]))
+    cnf.add_clauses(clauses(-lits[:, n - 1], -s[:, n - 2]))
+    i = np.arange(1, n - 1)
+    cnf.add_clauses(clauses(-lits[:, i], s[:, i]))
+    cnf.add_clauses(clauses(-lits[:, i], -s[:, i - 1]))
+    cnf.add_clauses(clauses(-s[:, i - 1], s[:, i]))
+
+def heule_at_most_one(cnf, lits):
+    groups, size = lits.shape
+    splits = max(0, (size - 3) // 2)  # every split replaces 3 literals by the negated auxiliary variable
+    aux = cnf.new_vars(groups, splits)
+    for k in range(splits):
+        at_most_one_np(cnf, np.concatenate([lits[:, :3], aux[:, k:k + 1]], axis=1))
+        lits = np.concatenate([-aux[:, k:k + 1], lits[:, 3:]], axis=1)
+    at_most_one_np(cnf, lits)
+
+def heule_exactly_one(cnf, lits):
+    heule_at_most_one(cnf, lits)
+    at_least_one(cnf, lits)
+
+# --------------------------------------------------------------
+# At-most-k encodings
+# --------------------------------------------------------------
+
+def at_most_k_np(cnf, lits, k):
+    if k >= lits.shape[1]:
+        return
+    subsets = np.array(list(combinations(range(lits.shape[1]), k + 1)))
+    cnf.add_clauses(-lits[:, subsets])
+
+def at_most_k_seq(cnf, lits, k):
+    groups, n = lits.shape
+    if n == 0 or k >= n:
+        return
+    if k == 0:
+        cnf.add_clauses(-lits[:, :, None])
+        return
+    s = cnf.new_vars(groups, n - 1, k)
+    cnf.add_clauses(clauses(-lits[:, 0], s[:, 0, 0]))
+    cnf.add_clauses(-s[:, 0, 1:, None])
+    i = np.arange(1, n - 1)
+    cnf.add_clauses(clauses(-s[:, i - 1, 0], s[:, i, 0]))
+    cnf.add_clauses(clauses(-lits[:, i], s[:, i, 0]))
+    cnf.add_clauses(clauses(-s[:, i - 1, 1:], s[:, i, 1:]))
+    cnf.add_clauses(clauses(-lits[:, i, None], -s[:, i - 1, :-1], s[:, i, 1:]))
+    cnf.add_clauses(clauses(-lits[:, i], -s[:, i - 1, k - 1]))
+    cnf.add_clauses(clauses(-lits[:, n - 1], -s[:, n - 2, k - 1]))
+
+def _totalizer_merges(size):
+    """The (left, right) sizes of the merges of a totalizer tree over size leaves, in order."""
+    merges, level = [], [1] * size
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 == len(level):
+                next_level.append(level[i])
+            else:
+                merges.append((level[i], level[i + 1]))
+                next_level.append(level[i] + level[i + 1])
+        level = next_level
+    return merges
+
+def totalizer(cnf, lits, both_directions=False):
+    """
+    Totalizer tree over each row of lits, returns the (groups, size) outputs: output i is implied by
+    at least i+1 true literals, and with both_directions it is also false when at most i of them are true.
+    """
+    groups, size = lits.shape
+    merges = _totalizer_merges(size)
+    aux = cnf.new_vars(groups, sum(l + r for l, r in merges))
+    level = [lits[:, i:i + 1] for i in range(size)]
+    offset = 0
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 == len(level):
+                next_level.append(level[i])
+                continue
+            left, right = level[i], level[i + 1]
+            L, R = left.shape[1], right.shape[1]
+            merged = aux[:, offset:offset + L + R]
+            offset += L + R
+            a, b = (x.ravel() for x in np.meshgrid(np.arange(L), np.arange(R), indexing='ij'))
+            # at least a+1 on the left, or b+1 on the right, or both -> at least their sum
+            cnf.add_clauses(clauses(-left, merged[:, :L]))
+            cnf.add_clauses(clauses(-right, merged[:, :R]))
+            cnf.add_clauses(clauses(-left[:, a], -right[:, b], merged[:, a + b + 1]))
+            if both_directions:
+                # at most a on the left and at most b on the right -> at most a+b
+                cnf.add_clauses(clauses(left[:, a], right[:, b], -merged[:, a + b]))
+                cnf.add_clauses(clauses(right, -merged[:, L:]))
+                cnf.add_clauses(clauses(left, -merged[:, R:]))
+            next_level.append(merged)
+        level = next_level
+    return level[0] if level else lits
+
+def at_most_k_totalizer(cnf, lits, k):
+    if k >= lits.shape[1]:
+        return
+    cnf.add_clauses(-totalizer(cnf, lits)[:, k:, None])
+
+# Sorting and cardinality networks (Asin et al., "Cardinality Networks: a theoretical and empirical study", 2011).
+# Wires are lists of (groups,) literal columns sorted in decreasing order, None standing for the constant false
+# used as padding; comparator(a, b) returns the (max, min) of two wires.
+
+def comparator(cnf, both_directions=False):
+    """
+    A 2-comparator adding fresh max/min variables: a or b implies max, a and b implies min,
+    and with both_directions also max implies a or b, min implies a and b.
+    """
+    def compare(a, b):
+        if a is None or b is None:
+            return (b, None) if a is None else (a, None)
+        high, low = cnf.new_vars(2, len(a))
+        cnf.add_clauses(clauses(-a, high))
+        cnf.add_clauses(clauses(-b, high))
+        cnf.add_clauses(clauses(-a, -b, low))
+        if both_directions:
+            cnf.add_clauses(clauses(-high, a, b))
+            cnf.add_clauses(clauses(-low, a))
+            cnf.add_clauses(clauses(-low, b))
+        return high, low
+    return compare
+
+def half_merge(compare, a, b):
+    """Merges two sorted sequences of the same power-of-two length."""
+    if len(a) == 1:
+        return list(compare(a[0], b[0]))
+    odd = half_merge(compare, a[::2], b[::2])
+    even = half_merge(compare, a[1::2], b[1::2])
+    merged = [odd[0]]
+    for i in range(len(a) - 1):
+        merged.extend(compare(odd[i + 1], even[i]))
+    return merged + [even[-1]]
+
+def half_sort(compare, a):
+    """Odd-even merge sort of a power-of-two number of wires."""
+    if len(a) == 1:
+        return list(a)
+    half = len(a) // 2
+    return half_merge(compare, half_sort(compare, a[:half]), half_sort(compare, a[half:]))
+
+def simplified_merge(compare, a, b):
+    """The len(a)+1 largest wires of two sorted sequences of the same power-of-two length."""
+    if len(a) == 1:
+        return list(compare(a[0], b[0]))
+    odd = simplified_merge(compare, a[::2], b[::2])
+    even = simplified_merge(compare, a[1::2], b[1::2])
+    merged = [odd[0]]
+    for i in range(len(a) // 2):
+        merged.extend(compare(odd[i + 1], even[i]))
+    return merged
+
+def cardinality_network(compare, a, m):
+    """The m largest wires of a, sorted; len(a) is a multiple of m, a power of two."""
+    if len(a) == m:
+        return half_sort(compare, a)
+    return simplified_merge(compare, cardinality_network(compare, a[:m], m), cardinality_network(compare, a[m:], m))[:m]
+
+def _padded_wires(lits, multiple):
+    wires = [lits[:, i] for i in range(lits.shape[1])]
+    return wires + [None] * (-len(wires) % multiple)
+
+def at_most_k_cardnet(cnf, lits, k):
+    size = lits.shape[1]
+    if k >= size:
+        return
+    if k == 0:
+        cnf.add_clauses(-lits[:, :, None])
+        return
+    m = 1 << k.bit_length()  # smallest power of two above k
+    outputs = cardinality_network(comparator(cnf), _padded_wires(lits, m), m)
+    cnf.add_clauses(-outputs[k][:, None])
+
+def at_most_k_mtotalizer(cnf, lits, k):
+    """
+    Modulo totalizer (Ogawa et al., 2013): every node counts its inputs with two unary digits,
+    the remainder modulo p (p-1 variables) and the quotient, so a node over s inputs needs about
+    s/p + p variables instead of s.
+    """
+    size = lits.shape[1]
+    if k >= size:
+        return
+    p = max(2, math.isqrt(size))
+    # each node: (size, lower digits, upper digits), as lists of columns
+    level = [(1, [lits[:, i]], []) for i in range(size)]
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 == len(level):
+                next_level.append(level[i])
+                continue
+            (size_a, lower_a, upper_a), (size_b, lower_b, upper_b) = level[i], level[i + 1]
+            node_size = size_a + size_b
+            lower = list(cnf.new_vars(min(p - 1, node_size), lits.shape[0]))
+            upper = list(cnf.new_vars(node_size // p, lits.shape[0]))
+            carry = cnf.new_vars(lits.shape[0]) if len(lower_a) + len(lower_b) >= p else None
+            for x in range(len(lower_a) + 1):
+                for y in range(len(lower_b) + 1):
+                    if x + y == 0:
+                        continue
+                    premise = ([-lower_a[x - 1]] if x else []) + ([-lower_b[y - 1]] if y else [])
+                    if x + y < p:
+                        cnf.add_clauses(clauses(*premise, *([carry] if carry is not None else []), lower[x + y - 1]))
+                    else:
+                        cnf.add_clauses(clauses(*premise, carry))
+                        if x + y > p:
+                            cnf.add_clauses(clauses(*premise, lower[x + y - p - 1]))
+            for x in range(len(upper_a) + 1):
+                for y in range(len(upper_b) + 1):
+                    premise = ([-upper_a[x - 1]] if x else []) + ([-upper_b[y - 1]] if y else [])
+                    if x + y > 0:
+                        cnf.add_clauses(clauses(*premise, upper[x + y - 1]))
+                    if carry is not None:
+                        # a quotient beyond the node size cannot occur: the carry must then be false,
+                        # or it could be set only to drop the remainder digits
+                        cnf.add_clauses(clauses(*premise, -carry, *([upper[x + y]] if x + y < len(upper) else [])))
+            next_level.append((node_size, lower, upper))
+        level = next_level
+    _, lower, upper = level[0]
+    # count <= k = q*p + r: the quotient is at most q, and if it is q the remainder is at most r
+    q, r = divmod(k, p)
+    if q < len(upper):
+        cnf.add_clauses(-upper[q][:, None])
+    if r < len(lower):
+        cnf.add_clauses(clauses(*([-upper[q - 1]] if q else []), -lower[r]))
+
+EXACTLY_ONE = {'np': exactly_one_np, 'bw': exactly_one_bw, 'seq': exactly_one_seq, 'heule': heule_exactly_one}
+AT_MOST_K = {'np': at_most_k_np, 'seq': at_most_k_seq, 'totalizer': at_most_k_totalizer,
+             'cardnet': at_most_k_cardnet, 'mtotalizer': at_most_k_mtotalizer}
+
+# --------------------------------------------------------------
+# Bounds lower <= count <= upper on each row, for the home/away balance
+# --------------------------------------------------------------
+
+def _bound_outputs(cnf, outputs, lower, upper):
+    """Bounds a count given by its sorted unary outputs (output i: at least i+1)."""
+    if upper < len(outputs):
+        cnf.add_clauses(-outputs[upper][:, None])
+    if lower > 0:
+        cnf.add_clauses(outputs[lower - 1][:, None])
+
+def bound_totalizer(cnf, lits, lower, upper):
+    outputs = totalizer(cnf, lits, both_directions=True)
+    _bound_outputs(cnf, list(outputs.T), lower, upper)
+
+def bound_sortnet(cnf, lits, lower, upper):
+    """Odd-even merge sorting network over the row, with comparators encoded in both directions."""
+    size = lits.shape[1]
+    outputs = half_sort(comparator(cnf, both_directions=True), _padded_wires(lits, 1 << (size - 1).bit_length()))
+    _bound_outputs(cnf, outputs[:size], lower, upper)
+
+BALANCE = {'totalizer': bound_totalizer, 'sortnet': bound_sortnet}
+
+# --------------------------------------------------------------
+# STS formula
+# --------------------------------------------------------------
+
+def variable_arrays(n):
+    """The model variables as arrays: match_period[pair, p] and home[pair], pairs indexed as in pair_list."""
+    num_pairs = n * (n - 1) // 2
+    periods = n // 2
+    match_period = 1 + np.arange(num_pairs)[:, None] * periods + np.arange(periods)
+    home = 1 + num_pairs * periods + np.arange(num_pairs)
+    return match_period, home
+
+def sts_variables(n):
+    """Numbering of the model variables: (match_period_vars[(i, j, p)], home_vars[(i, j)]), i < j, 0-based."""
+    pairs = circle_instance(n).pair_list.tolist()
+    match_period, home = variable_arrays(n)
+    match_period_vars = {(i, j, p): var for (i, j), row in zip(pairs, match_period.tolist()) for p, var in enumerate(row)}
+    home_vars = {(i, j): var for (i, j), var in zip(pairs, home.tolist())}
+    return match_period_vars, home_vars
+
+def lex_less(cnf, curr, next):
+    """curr <lex next on one-hot vectors, as in lex_less_bool: one fresh variable per position selects the first difference."""
+    selectors = cnf.new_vars(len(curr)).tolist()
+    for i, c in enumerate(selectors):
+        cnf.add([-c, curr[i]])
+        cnf.add([-c, -next[i]])
+        for j in range(i):
+            cnf.add([-c, -curr[j], next[j]])
+            cnf.add([-c, curr[j], -next[j]])
+    cnf.add(selectors)
+
+def home_games(n):
+    """(n, n-1) literals true when a team plays at home, one per match of the team, in pair_list order."""
+    instance = circle_instance(n)
+    _, home = variable_arrays(n)
+    pairs = np.sort(instance.team_pairs, axis=1)
+    sign = np.where(instance.pair_list[pairs, 0] == np.arange(n)[:, None], 1, -1)
+    return sign * home[pairs]
+
+@contextmanager
+def _group(cnf, name, sizes):
+    """Span of a constraint group, recording in sizes (if not None) the variables and clauses it adds."""
+    num_vars, num_clauses = cnf.num_vars, cnf.num_clauses
+    with span(f"build.{name}"):
+        yield
+    if sizes is not None:
+        sizes[name] = {'variables': cnf.num_vars - num_vars, 'clauses': cnf.num_clauses - num_clauses, 'pb': 0}
+
+def build_sts_cnf(n, max_diff_k, exactly_one, at_most_k, symmetry_breaking=True, balance='totalizer', sizes=None):
+    """
+    The clauses of create_sts_model for n teams, with the encodings given by name (keys of EXACTLY_ONE, AT_MOST_K
+    and BALANCE). The imbalance bound is enforced on the home games of every team, None leaves it unbounded.
+    The size of every constraint group is stored in the dict sizes, if given.
+    """
+    if n % 2 != 0:
+        raise ValueError("The number of teams must be even.")
+    exactly_one_encoding = EXACTLY_ONE[exactly_one]
+    at_most_k_encoding = AT_MOST_K[at_most_k]
+    NUM_TEAMS, NUM_WEEKS, NUM_PERIODS_PER_WEEK = n, n - 1, n // 2
+
+    instance = circle_instance(n)
+    match_period, home = variable_arrays(n)
+    # pairs of every week, in circle-method order
+    week_pairs = pair_index(instance.sorted_pairs[..., 0], instance.sorted_pairs[..., 1], n)
+    cnf = CNF(num_vars=match_period.size + home.size)
+    if sizes is not None:
+        sizes['variables'] = {'variables': cnf.num_vars, 'clauses': 0, 'pb': 0}
+
+    with _group(cnf, "match_once", sizes):
+        exactly_one_encoding(cnf, match_period)
+
+    with _group(cnf, "one_match_per_slot", sizes):
+        # (week, period) groups over the matches of the week
+        exactly_one_encoding(cnf, match_period[week_pairs].transpose(0, 2, 1).reshape(-1, NUM_TEAMS // 2))
+
+    with _group(cnf, "max2_per_period", sizes):
+        # (team, period) groups over the matches of the team, by week
+        at_most_k_encoding(cnf, match_period[instance.team_pairs].transpose(0, 2, 1).reshape(-1, NUM_WEEKS), 2)
+
+    with _group(cnf, "symmetry_breaking", sizes):
+        if symmetry_breaking:
+            cnf.add([int(match_period[pair_index(0, NUM_TEAMS - 1, n), 0])])
+            for w, pair in enumerate(instance.team_pairs[0].tolist()):
+                home_lit = int(home[pair]) if instance.pair_list[pair, 0] == 0 else -int(home[pair])
+                cnf.add([home_lit if w % 2 == 0 else -home_lit])
+            vectors = match_period[np.sort(week_pairs[0])].tolist()
+            for a in range(len(vectors) - 1):
+                lex_less(cnf, vectors[a], vectors[a + 1])
+
+    with _group(cnf, "balance", sizes):
+        if max_diff_k is not None:
+            upper_bound = math.floor((NUM_WEEKS + max_diff_k) / 2)
+            lower_bound = math.ceil((NUM_WEEKS - max_diff_k) / 2)
+            BALANCE[balance](cnf, home_games(n), lower_bound, upper_bound)
+    return cnf
+
+def write_dimacs(cnf, path):
+    with open(path, 'w') as f:
+        f.write(f"p cnf {cnf.num_vars} {cnf.num_clauses}\n")
+        for block in cnf.blocks:
+            # one formatting operation per block
+            f.write(('%d ' * block.shape[1] + '0\n') * len(block) % tuple(block.ravel().tolist()))
+
+def read_dimacs(path):
+    """(num_vars, clauses) of a DIMACS file."""
+    with open(path) as f:
+        header = f.readline().split()
+        lits = np.fromstring(f.read(), dtype=np.int64, sep=' ')
+    ends = np.flatnonzero(lits == 0)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    lits = lits.tolist()
+    return int(header[2]), [lits[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+
+def _cache_path(n, max_diff_k, exactly_one, at_most_k, symmetry_breaking, balance):
+    sb_name = "sb" if symmetry_breaking else "no_sb"
+    k_name = "free" if max_diff_k is None else f"k{max_diff_k}"
+    balance_name = "" if balance == 'totalizer' else f"_{balance}"
+    return os.path.join(CACHE_DIR, f"sts_v{CNF_VERSION}_{n}_{exactly_one}_{at_most_k}{balance_name}_{sb_name}_{k_name}.cnf")
+
+def sts_cnf(n, max_diff_k, exactly_one, at_most_k, symmetry_breaking=True, balance='totalizer'):
+    """
+    Path of the DIMACS file of the STS formula, generated by build_sts_cnf on a cache miss.
+    If the cache directory is not writable the file is written to the temporary directory instead.
+    """
+    path = _cache_path(n, max_diff_k, exactly_one, at_most_k, symmetry_breaking, balance)
+    if os.path.exists(path):
+        return path
+    cnf = build_sts_cnf(n, max_diff_k, exactly_one, at_most_k, symmetry_breaking, balance)
+    with span("build.write_dimacs"):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.sts_', suffix='.cnf', dir=CACHE_DIR)
+            os.close(fd)
+            write_dimacs(cnf, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            fd, path = tempfile.mkstemp(prefix='sts_', suffix='.cnf')
+            os.close(fd)
+            write_dimacs(cnf, path)
+    return path
+
+def schedule_from_model(true_vars, n):
+    """
+    The schedule of a model given as the set of its true variables,
+    as a list of (home, away, week, period) tuples, 1-based (like extract_schedule).
+    """
+    match_period_vars, home_vars = sts_variables(n)
+    week_of_pair = circle_instance(n).week_of_pair
+    schedule = []
+    for (i, j, p), var in match_period_vars.items():
+        if var in true_vars:
+            home, away = (i, j) if home_vars[(i, j)] in true_vars else (j, i)
+            schedule.append((home + 1, away + 1, int(week_of_pair[i, j]) + 1, p + 1))
+    return schedule
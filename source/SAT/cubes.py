@@ -0,0 +1,140 @@
+"""
+Cube-and-conquer for the Z3 model of main.py (--cubes).
+
+A single check of Z3 runs on one core. The model is split into cubes, by fixing the periods of the first
+matches of week 1 (the first week left free by symmetry breaking) in every possible way, and the cubes are
+solved by a pool of forked worker processes. Every worker builds the model once, in its own Z3 context, and
+checks the cubes it takes from a shared queue as assumptions. The search stops as soon as a cube is sat, or
+when all of them are unsat.
+
+CubeSolver exposes the part of the z3.Solver interface used by the solvers in main.py (set, check, model,
+statistics), like the backends of backends.py: model() is the set of the true model variables, numbered as
+in the DIMACS formula (see cnf.sts_variables), so that the schedule is read by extract_schedule_cnf.
+"""
+import os
+import sys
+import time
+import queue
+import multiprocessing
+from itertools import permutations
+
+from z3 import Context, sat, unsat, unknown, is_true
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instance import circle_instance
+from cnf import sts_variables
+from backends import Statistics
+
+# statistics of the workers, summed over the cubes (the memory is the largest of them)
+CUBE_STATS = ['conflicts', 'restarts', 'max memory']
+# seconds between two checks that the workers are still alive while waiting for an answer
+POLL_SECONDS = 1
+
+
+def period_cubes(n, depth, week=1):
+    """
+    Every assignment of distinct periods to the first `depth` matches of a week, as lists of match_period_vars keys.
+    A single empty cube, a plain check of the model, when n has no such week or a single period.
+    """
+    if n < 4 or len(circle_instance(n).sorted_pairs) <= week:
+        return [[]]
+    matches = [tuple(match) for match in sorted(circle_instance(n).sorted_pairs[week].tolist())[:depth]]
+    return [[(i, j, p) for (i, j), p in zip(matches, periods)] for periods in permutations(range(n // 2), len(matches))]
+
+
+def _true_variables(model, n, match_period_vars, home_vars):
+    """The true model variables of a Z3 model, in the numbering of the DIMACS formula."""
+    match_period_numbers, home_numbers = sts_variables(n)
+    true_vars = {match_period_numbers[key] for key, var in match_period_vars.items() if is_true(model.evaluate(var))}
+    return true_vars | {home_numbers[key] for key, var in home_vars.items() if is_true(model.evaluate(var))}
+
+
+def _cube_worker(build, n, cubes, tasks, results, deadline, seed):
+    """Body of a worker process: builds the model, then checks cubes until the queue is empty (deadline None: no limit)."""
+    solver, match_period_vars, home_vars, _ = build(Context())
+    solver.set("random_seed", seed)
+    while True:
+        index = tasks.get()
+        if index is None:
+            return
+        if deadline is not None:
+            solver.set("timeout", max(1, int((deadline - time.time()) * 1000)))
+        status = solver.check(*[match_period_vars[key] for key in cubes[index]])
+        model = _true_variables(solver.model(), n, match_period_vars, home_vars) if status == sat else None
+        stats = solver.statistics()
+        results.put((index, str(status), model, {key: stats.get_key_value(key) for key in CUBE_STATS if key in stats.keys()}))
+
+
+class CubeSolver:
+    """
+    The model returned by build(ctx) (like create_sts_model: solver, match_period_vars, home_vars, pair_to_week)
+    for n teams, split into the cubes of period_cubes and solved by `workers` processes.
+    """
+
+    def __init__(self, build, n, workers, depth=2):
+        self.build = build
+        self.n = n
+        self.workers = workers
+        self.cubes = period_cubes(n, depth)
+        self._timeout = None
+        self._seed = 0
+        self._model = None
+        self._stats = Statistics()
+        self.answers = {}
+
+    def set(self, key, value):
+        if key == 'timeout':
+            self._timeout = value / 1000
+        elif key == 'random_seed':
+            self._seed = value
+
+    def check(self):
+        context = multiprocessing.get_context('fork')
+        tasks, results = context.Queue(), context.Queue()
+        for index in range(len(self.cubes)):
+            tasks.put(index)
+        for _ in range(self.workers):
+            tasks.put(None)
+        deadline = time.time() + self._timeout if self._timeout is not None else None
+        processes = [context.Process(target=_cube_worker, daemon=True,
+                                     args=(self.build, self.n, self.cubes, tasks, results, deadline, self._seed))
+                     for _ in range(self.workers)]
+        for process in processes:
+            process.start()
+
+        self.answers = {}
+        status = unsat
+        try:
+            while len(self.answers) < len(self.cubes):
+                # once every worker has exited, only the answers they already sent are left to read
+                exited = not any(process.is_alive() for process in processes)
+                wait = POLL_SECONDS if deadline is None else max(0, min(POLL_SECONDS, deadline - time.time()))
+                try:
+                    index, answer, model, stats = results.get(timeout=wait)
+                except queue.Empty:
+                    if exited or (deadline is not None and time.time() >= deadline):
+                        # out of time, or a worker died (killed, out of memory) with its cube unanswered
+                        status = unknown
+                        break
+                    continue
+                self.answers[index] = answer
+                for key, value in stats.items():
+                    self._stats[key] = max(self._stats.get(key, 0), value) if key == 'max memory' else self._stats.get(key, 0) + value
+                if answer == 'sat':
+                    self._model = model
+                    status = sat
+                    break
+                if answer != 'unsat':
+                    # other cubes may still be sat
+                    status = unknown
+        finally:
+            for process in processes:
+                process.kill()
+                process.join()
+        return status
+
+    def model(self):
+        return self._model
+
+    def statistics(self):
+        return self._stats
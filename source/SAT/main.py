@@ -1,11 +1,76 @@
 import os
+import sys
+import json
 import argparse
+from functools import partial
 from itertools import combinations
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from z3 import *
 import math
 import time
-import json
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import record_result
+from tracing import span
+from resources import mark, usage
+from instance import circle_instance
+from heuristic import greedy_schedule, match_slot
+from sweep import ENCODING_PAIRS
+from z3_config import new_solver, pipeline_name, add_arguments as add_z3_arguments, configure as configure_z3
+from cnf import CNF, AT_MOST_K as CNF_AT_MOST_K, BALANCE as CNF_BALANCE, build_sts_cnf, sts_cnf, schedule_from_model, \
+    variable_arrays
+from backends import BACKENDS, SWEEP_BACKENDS, PHASE_BACKENDS, EXTERNAL_ENV, backend_available, cnf_solver
+from cubes import CubeSolver
+
+
+# Constants of the encodings are created in the Z3 context of the variables they encode,
+# so that a model can be built in its own context (see --threads)
+def context_of(bool_vars):
+    return bool_vars[0].ctx if len(bool_vars) else main_ctx()
+
+class VarAllocator:
+    """
+    Fresh auxiliary variables of one model, in its Z3 context. Every encoding takes the allocator of
+    the model it builds, so independent models can be built at the same time (in different contexts),
+    and counts the auxiliaries it creates under the current constraint group (see group).
+    """
+
+    def __init__(self, ctx=None):
+        self.ctx = ctx if ctx is not None else main_ctx()
+        self.sort = BoolSort(self.ctx)
+        self.current_group = None
+        self.counts = defaultdict(int)
+
+    def new_vars(self, count):
+        self.counts[self.current_group] += count
+        # as FreshBool, without looking up the context and the sort for every variable
+        return [BoolRef(Z3_mk_fresh_const(self.ctx.ref(), 'aux', self.sort.ast), self.ctx) for _ in range(count)]
+
+    def new_var(self):
+        return self.new_vars(1)[0]
+
+    @contextmanager
+    def group(self, name):
+        """Counts the auxiliaries created in the block under the constraint group name."""
+        previous, self.current_group = self.current_group, name
+        try:
+            yield
+        finally:
+            self.current_group = previous
+
+    def total(self):
+        return sum(self.counts.values())
 
+    def summary(self):
+        """e.g. '120 (match_once: 45, max2_per_period: 75)'"""
+        return f"{self.total()} ({', '.join(f'{group}: {count}' for group, count in self.counts.items())})"
+
+def allocator_for(bool_vars, alloc):
+    """The allocator given to an encoding, or a new one in the context of its variables."""
+    return alloc if alloc is not None else VarAllocator(context_of(bool_vars))
 
 # --------------------------------------------------------------
 # EXACTLY ONE ENCODINGS
@@ -15,11 +80,11 @@ import json
 def at_least_one_np(bool_vars):
     return Or(bool_vars)
 
-def at_most_one_np(bool_vars, name=""):
-    return And([Not(And(pair[0], pair[1])) for pair in combinations(bool_vars, 2)])
+def at_most_one_np(bool_vars, alloc=None):
+    return And([Not(And(pair[0], pair[1])) for pair in combinations(bool_vars, 2)], context_of(bool_vars))
 
-def exactly_one_np(bool_vars, name=""):
-    return And(at_least_one_np(bool_vars), at_most_one_np(bool_vars, name))
+def exactly_one_np(bool_vars, alloc=None):
+    return And(at_least_one_np(bool_vars), at_most_one_np(bool_vars, alloc))
 
 #--------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -33,13 +98,13 @@ def toBinary(num, length=None):
 def at_least_one_bw(bool_vars):
     return at_least_one_np(bool_vars)
 
-def at_most_one_bw(bool_vars, name=''):
+def at_most_one_bw(bool_vars, alloc=None):
     constraints = []
     n = len(bool_vars)
     if n == 0: return BoolVal(True)
     
     m = math.ceil(math.log2(n))
-    r = [Bool(f"r_{name}_{i}") for i in range(m)]
+    r = allocator_for(bool_vars, alloc).new_vars(m)
     binaries = [toBinary(idx, m) for idx in range(n)]
     
     for i in range(n):
@@ -49,25 +114,25 @@ def at_most_one_bw(bool_vars, name=''):
                 phi_parts.append(r[j])
             else:
                 phi_parts.append(Not(r[j]))
-        constraints.append(Or(Not(bool_vars[i]), And(*phi_parts)))
+        constraints.append(Or(Not(bool_vars[i]), And(phi_parts, context_of(bool_vars))))
 
     return And(constraints)
 
-def exactly_one_bw(bool_vars, name=''):
-    return And(at_least_one_bw(bool_vars), at_most_one_bw(bool_vars, name))
+def exactly_one_bw(bool_vars, alloc=None):
+    return And(at_least_one_bw(bool_vars), at_most_one_bw(bool_vars, alloc))
 #--------------------------------------------------------------------------------------------------------------------------------------------------------
 
 # Sequential Encoding (SEQ for k=1)
 def at_least_one_seq(bool_vars):
     return at_least_one_np(bool_vars)
 
-def at_most_one_seq(bool_vars, name=''):
+def at_most_one_seq(bool_vars, alloc=None):
     constraints = []
     n = len(bool_vars)
     if n == 0: return BoolVal(True)
-    if n == 1: return BoolVal(True) 
+    if n == 1: return BoolVal(True, context_of(bool_vars))
 
-    s = [Bool(f"s_{name}_{i}") for i in range(n - 1)]
+    s = allocator_for(bool_vars, alloc).new_vars(n - 1)
 
     constraints.append(Or(Not(bool_vars[0]), s[0]))
     constraints.append(Or(Not(bool_vars[n-1]), Not(s[n-2])))
@@ -79,29 +144,26 @@ def at_most_one_seq(bool_vars, name=''):
     
     return And(constraints)
 
-def exactly_one_seq(bool_vars, name=''):
-    return And(at_least_one_seq(bool_vars), at_most_one_seq(bool_vars, name))
+def exactly_one_seq(bool_vars, alloc=None):
+    return And(at_least_one_seq(bool_vars), at_most_one_seq(bool_vars, alloc))
 
 #--------------------------------------------------------------------------------------------------------------------------------------------------------
 
 # Heule Encoding   
 
-global_most_counter = 0 
-
-def heule_at_most_one(bool_vars):
+def heule_at_most_one(bool_vars, alloc=None):
     if len(bool_vars) <= 4: # Base case: use pairwise encoding
-        return And([Not(And(pair[0], pair[1])) for pair in combinations(bool_vars, 2)])
+        return And([Not(And(pair[0], pair[1])) for pair in combinations(bool_vars, 2)], context_of(bool_vars))
     else:
-        global global_most_counter
-        global_most_counter += 1
-        aux_var = Bool(f'y_amo_{global_most_counter}') 
+        alloc = allocator_for(bool_vars, alloc)
+        aux_var = alloc.new_var()
 
         # Split into roughly 1/4 and 3/4, with an auxiliary variable
-        return And(at_most_one_np(bool_vars[:3] + [aux_var]), heule_at_most_one([Not(aux_var)] + bool_vars[3:]))
+        return And(at_most_one_np(bool_vars[:3] + [aux_var]), heule_at_most_one([Not(aux_var)] + bool_vars[3:], alloc))
     
 
-def heule_exactly_one(bool_vars, name=''):
-    return And(heule_at_most_one(bool_vars), at_least_one_np(bool_vars))
+def heule_exactly_one(bool_vars, alloc=None):
+    return And(heule_at_most_one(bool_vars, alloc), at_least_one_np(bool_vars))
 #--------------------------------------------------------------------------------------------------------------------------------------------------------
 
 # --------------------------------------------------------------
@@ -109,22 +171,23 @@ def heule_exactly_one(bool_vars, name=''):
 # --------------------------------------------------------------
 
 # General K-Encoding (NP - Direct Encoding)
-def at_most_k_np(bool_vars, k, name=""):
-    if k >= len(bool_vars): return BoolVal(True) 
-    if k < 0: return BoolVal(False)
+def at_most_k_np(bool_vars, k, alloc=None):
+    if k >= len(bool_vars): return BoolVal(True, context_of(bool_vars))
+    if k < 0: return BoolVal(False, context_of(bool_vars))
     return And([Or([Not(x) for x in X]) for X in combinations(bool_vars, k + 1)])
 
 
 # General K-Encoding (SEQ - Sequential Counter Encoding)
-def at_most_k_seq(bool_vars, k, name=''):
+def at_most_k_seq(bool_vars, k, alloc=None):
     constraints = []
     n = len(bool_vars)
     
     if n == 0: return BoolVal(True)
     if k == 0: return And([Not(v) for v in bool_vars])
-    if k >= n: return BoolVal(True)
+    if k >= n: return BoolVal(True, context_of(bool_vars))
 
-    s = [[Bool(f"s_{name}_{i}_{j}") for j in range(k)] for i in range(n-1)] 
+    aux = allocator_for(bool_vars, alloc).new_vars((n - 1) * k)
+    s = [aux[i * k:(i + 1) * k] for i in range(n - 1)]
     
     constraints.append(Or(Not(bool_vars[0]), s[0][0])) 
     for j in range(1, k):
@@ -145,9 +208,9 @@ def at_most_k_seq(bool_vars, k, name=''):
 #--------------------------------------------------------------------------------------------------------------------------------------------------------
 
 # Totalizer Encoding
-def totalizer_merge(left_sum, right_sum, name_prefix, depth, constraints):
+def totalizer_merge(left_sum, right_sum, alloc, constraints):
     """Merges two partial sums for the totalizer encoding."""
-    merged = [Bool(f"{name_prefix}_s_{depth}_{i}") for i in range(len(left_sum) + len(right_sum))]
+    merged = alloc.new_vars(len(left_sum) + len(right_sum))
     
     for i in range(len(left_sum)):
         constraints.append(Implies(left_sum[i], merged[i]))
@@ -159,16 +222,16 @@ def totalizer_merge(left_sum, right_sum, name_prefix, depth, constraints):
                 constraints.append(Implies(And(left_sum[i], right_sum[j]), merged[i + j + 1]))
     return merged
 
-def at_most_k_totalizer(bool_vars, k, name=''):
+def at_most_k_totalizer(bool_vars, k, alloc=None):
     """At most k using totalizer encoding."""
     constraints = []
     n = len(bool_vars)
-    if k >= n: return BoolVal(True)
-    if k < 0: return BoolVal(False)
+    if k >= n: return BoolVal(True, context_of(bool_vars))
+    if k < 0: return BoolVal(False, context_of(bool_vars))
     if n == 0: return BoolVal(True)
 
+    alloc = allocator_for(bool_vars, alloc)
     current_level = [[v] for v in bool_vars] # each boolean variable is a leaf
-    depth = 0
     
     # totalizer tree
     while len(current_level) > 1:  # when we encounter the root, we stop
@@ -179,9 +242,8 @@ def at_most_k_totalizer(bool_vars, k, name=''):
             else:
                 left = current_level[i]
                 right = current_level[i + 1]
-                merged = totalizer_merge(left, right, name, depth, constraints)
+                merged = totalizer_merge(left, right, alloc, constraints)
                 next_level.append(merged)
-                depth += 1 # to give unique names in the totalizer_merge
         current_level = next_level
 
     total_sum = current_level[0]
@@ -191,6 +253,62 @@ def at_most_k_totalizer(bool_vars, k, name=''):
         constraints.append(Not(total_sum[i])) # i = at least i+1 variables are true
 
     return And(constraints)
+
+# Cardinality networks, modulo totalizer: built by cnf.py over integer literals and translated
+def encode_with_cnf(encoding, bool_vars, *bounds, alloc=None):
+    """
+    Z3 constraint of a cnf.py encoding applied to bool_vars: the encoding is built over the integer
+    literals 1..len(bool_vars), and its auxiliary variables are drawn from alloc.
+    """
+    cnf = CNF(num_vars=len(bool_vars))
+    encoding(cnf, np.arange(1, len(bool_vars) + 1)[None, :], *bounds)
+    variables = list(bool_vars) + allocator_for(bool_vars, alloc).new_vars(cnf.num_vars - len(bool_vars))
+
+    def literal(v):
+        return variables[v - 1] if v > 0 else Not(variables[-v - 1])
+    return And([Or([literal(v) for v in clause]) for block in cnf.blocks for clause in block.tolist()],
+               context_of(bool_vars))
+
+def at_most_k_cardnet(bool_vars, k, alloc=None):
+    """At most k using a cardinality network."""
+    return encode_with_cnf(CNF_AT_MOST_K['cardnet'], bool_vars, k, alloc=alloc)
+
+def at_most_k_mtotalizer(bool_vars, k, alloc=None):
+    """At most k using a modulo totalizer."""
+    return encode_with_cnf(CNF_AT_MOST_K['mtotalizer'], bool_vars, k, alloc=alloc)
+#--------------------------------------------------------------------------------------------------------------------------------------------------------
+
+def totalizer_counter(bool_vars, alloc=None):
+    """
+    Unary counter over bool_vars: a totalizer whose merges are encoded in both directions, so that
+    output i is true exactly when at least i+1 of the variables are true. Any bound on the count can
+    then be set, or assumed, on a single output. Returns (outputs, constraints).
+    """
+    constraints = []
+    alloc = allocator_for(bool_vars, alloc)
+    current_level = [[v] for v in bool_vars]
+    while len(current_level) > 1:
+        next_level = []
+        for i in range(0, len(current_level), 2):
+            if i + 1 == len(current_level):
+                next_level.append(current_level[i])
+                continue
+            left, right = current_level[i], current_level[i + 1]
+            merged = alloc.new_vars(len(left) + len(right))
+            # a, b: number of true variables on the left and on the right
+            for a in range(len(left) + 1):
+                for b in range(len(right) + 1):
+                    if a + b > 0:
+                        # at least a and at least b -> at least a+b
+                        premise = ([left[a - 1]] if a else []) + ([right[b - 1]] if b else [])
+                        constraints.append(Implies(And(premise), merged[a + b - 1]))
+                    if a + b < len(merged):
+                        # at most a and at most b -> at most a+b
+                        premise = ([Not(left[a])] if a < len(left) else []) + ([Not(right[b])] if b < len(right) else [])
+                        constraints.append(Implies(And(premise), Not(merged[a + b])))
+            next_level.append(merged)
+        current_level = next_level
+    return (current_level[0] if current_level else []), constraints
 #--------------------------------------------------------------------------------------------------------------------------------------------------------
 
 
@@ -210,40 +328,23 @@ def convert_to_matrix(n, solution):
 
 def save_results_as_json(n, results, model_name, output_dir="/res/SAT"):
     """
-    Saves the results dictionary to a JSON file.
+    Records the results in the shared results store, which exports them to <output_dir>/<n>.json.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    json_path = os.path.join(output_dir, f"{n}.json")
-    
-    json_obj = {}
-    if os.path.exists(json_path):
-        with open(json_path, "r") as f:
-            try:
-                json_obj = json.load(f)
-            except json.JSONDecodeError:
-                json_obj = {}
-                
-    result = {}
-    result[model_name] = results
-    
-    for method, res in result.items():
-        runtime = res.get("time", 300.0)
-        
-        time_field = 300 if not res.get("optimal") else math.floor(runtime)
-        sol = res.get("sol")
-        matrix = convert_to_matrix(n, sol) if sol else []
-        
-        json_obj[method] = {
+    runtime = results.get("time", 300.0)
+    time_field = 300 if not results.get("optimal") else math.floor(runtime)
+    sol = results.get("sol")
+    matrix = convert_to_matrix(n, sol) if sol else []
+
+    with span("write"):
+        record_result(output_dir, n, model_name, {
             "time": time_field,
-            "optimal": res.get("optimal"),
-            "obj": res.get("obj"),
+            "resources": results.get("resources"),
+            "optimal": results.get("optimal"),
+            "obj": results.get("obj"),
             "sol": matrix,
-        }
-    
-    with open(json_path, "w") as f:
-        json.dump(json_obj, f, indent=1)
+            **({"probes": results["probes"]} if results.get("probes") is not None else {}),
+        })
+
 
 def print_weekly_schedule(match_list, num_teams):
     """
@@ -281,23 +382,6 @@ def print_weekly_schedule(match_list, num_teams):
     
     print("--- END SCHEDULE ---\n")
     
-def circle_matchings(n):
-    """
-    Generates a schedule using the Circle Method for n teams.
-    Returns a dictionary of week (0-based) to a list of match-ups.
-    """
-    pivot, circle = n - 1, list(range(n - 1))
-    weeks = n - 1
-    m = {}
-    for w in range(weeks):
-        ms = [(pivot, circle[w])]
-        for k in range(1, n // 2):
-            i = circle[(w + k) % (n - 1)]
-            j = circle[(w - k + (n - 1)) % (n - 1)]
-            ms.append((i, j))
-        m[w] = ms
-    return m
-
 def lex_less_bool(curr, next):
     """
     Implements a lexicographical less-than constraint for two lists of boolean variables.
@@ -309,7 +393,30 @@ def lex_less_bool(curr, next):
         conditions.append(condition)
     return Or(conditions)
 
-def create_sts_model(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True):
+def team_home_games(t, matches, home_vars):
+    """
+    Literals true when team t plays at home, one per match (i, j) of the team: every match is played
+    exactly once, so team t plays at home in (i, j) iff home_{i}_{j} == (t == i), whatever its period.
+    """
+    return [home_vars[(i, j)] if t == i else Not(home_vars[(i, j)]) for (i, j) in matches]
+
+def home_symmetry_breaking(team0_matchings, home_vars):
+    """SB2: Team 0 plays at home in even weeks, away in odd weeks."""
+    return [home if w % 2 == 0 else Not(home) for w, home in enumerate(team_home_games(0, team0_matchings, home_vars))]
+
+def balance_constraint(home_games, n, max_diff_k, balance_encoding, alloc=None):
+    """Bounds the home games of a team so that its home/away imbalance does not exceed max_diff_k."""
+    NUM_GAMES = n - 1
+
+    upper_bound = math.floor((NUM_GAMES + max_diff_k) / 2)
+    lower_bound = math.ceil((NUM_GAMES - max_diff_k) / 2)
+
+    if balance_encoding == 'pb':
+        return And(PbLe([(v, 1) for v in home_games], upper_bound), PbGe([(v, 1) for v in home_games], lower_bound))
+    return encode_with_cnf(CNF_BALANCE[balance_encoding], home_games, lower_bound, upper_bound, alloc=alloc)
+
+def create_sts_model(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, balance_encoding='pb',
+                     balance_mode='periods', ctx=None, alloc=None, solver=None):
     """
     Creates a Z3 model for the STS problem with a fixed calendar, using
     Pseudo-Boolean constraints for encoding. The model enforces that
@@ -317,8 +424,16 @@ def create_sts_model(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, sy
 
     Args:
         n (int): Number of teams (must be even).
-        max_diff_k (int): The maximum allowed home/away imbalance.
+        max_diff_k (int): The maximum allowed home/away imbalance, None to leave it unbounded.
         symmetry_breaking (bool): Whether to apply symmetry breaking constraints.
+        balance_encoding (str): 'pb' for Z3's pseudo-Boolean constraints, or an encoding of cnf.BALANCE.
+        balance_mode (str): 'periods' counts the home games over the (n-1) * n/2 conjunctions of a period
+            and a venue of every team, 'direct' over the n-1 home_vars literals of its matches.
+        ctx (z3.Context): Context of the model, None for Z3's main context.
+        alloc (VarAllocator): Allocator of the auxiliary variables, in ctx, whose counts then give the auxiliaries
+            of every constraint group. A new one if None.
+        solver: Where the constraints are added, a new solver of the configured pipeline (see z3_config.py)
+            in ctx if None, or a ConstraintRecorder.
 
     Returns:
         tuple: (solver, match_period_vars, home_vars, pair_to_week)
@@ -330,104 +445,310 @@ def create_sts_model(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, sy
     NUM_WEEKS = n - 1
     NUM_PERIODS_PER_WEEK = n // 2
 
-    solver = Solver()
+    solver = solver if solver is not None else new_solver(ctx, n)
+    alloc = alloc if alloc is not None else VarAllocator(ctx)
 
-    # --- Fixed calendar using the circle method ---
-    week_matchings = circle_matchings(NUM_TEAMS)
-    pair_to_week = {}
-    for w, matches in week_matchings.items():
-        for (i, j) in matches:
-            if i > j:
-                i, j = j, i
-            pair_to_week[(i, j)] = w
+    # --- Fixed calendar using the circle method (pairs with the lower team first) ---
+    with span("circle_matchings", n=n):
+        instance = circle_instance(NUM_TEAMS)
+        week_matchings = [[tuple(match) for match in matches] for matches in instance.sorted_pairs.tolist()]
+        pair_to_week = {match: w for w, matches in enumerate(week_matchings) for match in matches}
+        # matches of every team, by week
+        team_matchings = [[tuple(match) for match in matches]
+                          for matches in instance.pair_list[instance.team_pairs].tolist()]
 
     # === Boolean Variables ===
-    match_period_vars = {}
-    for (i, j) in pair_to_week:
-        for p in range(NUM_PERIODS_PER_WEEK):
-            match_period_vars[(i, j, p)] = Bool(f"m_{i}_{j}_p{p}")
+    with span("build.variables"):
+        match_period_vars = {}
+        for (i, j) in pair_to_week:
+            for p in range(NUM_PERIODS_PER_WEEK):
+                match_period_vars[(i, j, p)] = Bool(f"m_{i}_{j}_p{p}", ctx)
 
-    home_vars = {}
-    for i in range(NUM_TEAMS):
-        for j in range(i + 1, NUM_TEAMS):
-            home_vars[(i, j)] = Bool(f"home_{i}_{j}")
+        home_vars = {}
+        for i, j in instance.pair_list.tolist():
+            home_vars[(i, j)] = Bool(f"home_{i}_{j}", ctx)
 
     # === Base Constraints ===
-    # 1. Each match (i,j) is assigned to exactly one period
-    for (i, j) in pair_to_week:
-        solver.add(exactly_one_encoding(
-            [match_period_vars[(i, j, p)] for p in range(NUM_PERIODS_PER_WEEK)],
-            f"match_once_{i}_{j}"
-        ))
-
-    # 2. Each period in each week contains exactly one match
-    for w in range(NUM_WEEKS):
-        week_matches = week_matchings[w]
-        for p in range(NUM_PERIODS_PER_WEEK):
-            vars_for_slot = []
-            for (i, j) in week_matches:
-                if i > j:
-                    i, j = j, i
-                vars_for_slot.append(match_period_vars[(i, j, p)])
-            solver.add(exactly_one_encoding(vars_for_slot, f"one_match_per_slot_w{w}_p{p}"))
-
-    # 3. Each team plays at most twice in the same period (over the whole tournament)
-    for t in range(NUM_TEAMS):
-        for p in range(NUM_PERIODS_PER_WEEK):
-            appearances = []
-            for (i, j), w in pair_to_week.items():
-                if t == i or t == j:
-                    appearances.append(match_period_vars[(i, j, p)])
-            solver.add(at_most_k_encoding(appearances, 2, f"team_{t}_max2_in_p{p}"))
-
-    # === Symmetry Breaking Constraints ===
-    if symmetry_breaking:
-        # SB1: Force match (0, n-1) to be in the first period
-        team_a, team_b = 0, NUM_TEAMS - 1
-        solver.add(match_period_vars[(team_a, team_b, 0)])
-
-        # SB2: Team 0 plays at home in even weeks, away in odd weeks
-        for (i, j), w in pair_to_week.items():
-            if i == 0:
-                solver.add(home_vars[(i, j)] if w % 2 == 0 else Not(home_vars[(i, j)]))
-            elif j == 0:
-                solver.add(Not(home_vars[(i, j)]) if w % 2 == 0 else home_vars[(i, j)])
-
-        # SB3: Lexicographical ordering of matches in week 0
-        matches_in_week0 = sorted([(i, j) if i < j else (j, i) for (i, j) in week_matchings[0]])
-        if len(matches_in_week0) > 1:
-            bool_vectors = [
-                [match_period_vars[(i, j, p)] for p in range(NUM_PERIODS_PER_WEEK)]
-                for (i, j) in matches_in_week0
-            ]
-            for a in range(len(bool_vectors) - 1):
-                solver.add(lex_less_bool(bool_vectors[a], bool_vectors[a + 1]))
+    with span("build.match_once"), alloc.group("match_once"):
+        # 1. Each match (i,j) is assigned to exactly one period
+        for (i, j) in pair_to_week:
+            solver.add(exactly_one_encoding(
+                [match_period_vars[(i, j, p)] for p in range(NUM_PERIODS_PER_WEEK)],
+                alloc
+            ))
+
+    with span("build.one_match_per_slot"), alloc.group("one_match_per_slot"):
+        # 2. Each period in each week contains exactly one match
+        for w in range(NUM_WEEKS):
+            for p in range(NUM_PERIODS_PER_WEEK):
+                vars_for_slot = [match_period_vars[(i, j, p)] for (i, j) in week_matchings[w]]
+                solver.add(exactly_one_encoding(vars_for_slot, alloc))
 
-    # === Optimization constraint for SAT: max_diff_k ===
-    for t in range(NUM_TEAMS):
-        home_games_for_t = []
-        for (i, j), _ in pair_to_week.items():
+    with span("build.max2_per_period"), alloc.group("max2_per_period"):
+        # 3. Each team plays at most twice in the same period (over the whole tournament)
+        for t in range(NUM_TEAMS):
             for p in range(NUM_PERIODS_PER_WEEK):
-                mp = match_period_vars[(i, j, p)]
-                if t == i:
-                    home_games_for_t.append(And(mp, home_vars[(i, j)]))
-                elif t == j:
-                    home_games_for_t.append(And(mp, Not(home_vars[(i, j)])))
+                appearances = [match_period_vars[(i, j, p)] for (i, j) in team_matchings[t]]
+                solver.add(at_most_k_encoding(appearances, 2, alloc))
 
-        NUM_GAMES = n - 1
-        
-        upper_bound = math.floor((NUM_GAMES + max_diff_k) / 2)
-        lower_bound = math.ceil((NUM_GAMES - max_diff_k) / 2)
+    # === Symmetry Breaking Constraints ===
+    with span("build.symmetry_breaking"), alloc.group("symmetry_breaking"):
+        if symmetry_breaking:
+            # SB1: Force match (0, n-1) to be in the first period
+            team_a, team_b = 0, NUM_TEAMS - 1
+            solver.add(match_period_vars[(team_a, team_b, 0)])
+
+            # SB2: Team 0 plays at home in even weeks, away in odd weeks
+            solver.add(home_symmetry_breaking(team_matchings[0], home_vars))
+
+            # SB3: Lexicographical ordering of matches in week 0
+            matches_in_week0 = sorted(week_matchings[0])
+            if len(matches_in_week0) > 1:
+                bool_vectors = [
+                    [match_period_vars[(i, j, p)] for p in range(NUM_PERIODS_PER_WEEK)]
+                    for (i, j) in matches_in_week0
+                ]
+                for a in range(len(bool_vectors) - 1):
+                    solver.add(lex_less_bool(bool_vectors[a], bool_vectors[a + 1]))
 
-        solver.add(PbLe([(v, 1) for v in home_games_for_t], upper_bound))
-        solver.add(PbGe([(v, 1) for v in home_games_for_t], lower_bound))
+    # === Optimization constraint for SAT: max_diff_k ===
+    with span("build.balance"), alloc.group("balance"):
+        for t in range(NUM_TEAMS if max_diff_k is not None else 0):
+            if balance_mode == 'direct':
+                home_games_for_t = team_home_games(t, team_matchings[t], home_vars)
+            else:
+                home_games_for_t = []
+                for (i, j) in team_matchings[t]:
+                    for p in range(NUM_PERIODS_PER_WEEK):
+                        mp = match_period_vars[(i, j, p)]
+                        if t == i:
+                            home_games_for_t.append(And(mp, home_vars[(i, j)]))
+                        elif t == j:
+                            home_games_for_t.append(And(mp, Not(home_vars[(i, j)])))
+
+            solver.add(balance_constraint(home_games_for_t, n, max_diff_k, balance_encoding, alloc))
     
     return solver, match_period_vars, home_vars, pair_to_week
 
-def solve_sts_optimization(n, timeout_seconds, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, verbose=False):
+def create_home_model(n, max_diff_k, symmetry_breaking=True, balance_encoding='pb', ctx=None, alloc=None, solver=None):
+    """
+    The home/away subproblem alone: the balance bound over the n-1 home_vars literals of every team, and SB2.
+    No constraint links home_vars to the periods, so it is solved apart from the rest of the model.
+
+    Returns:
+        tuple: (solver, home_vars)
+    """
+    instance = circle_instance(n)
+    team_matchings = [[tuple(match) for match in matches] for matches in instance.pair_list[instance.team_pairs].tolist()]
+    home_vars = {(i, j): Bool(f"home_{i}_{j}", ctx) for i, j in instance.pair_list.tolist()}
+
+    solver = solver if solver is not None else new_solver(ctx, n)
+    alloc = alloc if alloc is not None else VarAllocator(ctx)
+    if symmetry_breaking:
+        solver.add(home_symmetry_breaking(team_matchings[0], home_vars))
+    with alloc.group("balance"):
+        for t in range(n):
+            solver.add(balance_constraint(team_home_games(t, team_matchings[t], home_vars), n, max_diff_k, balance_encoding,
+                                          alloc))
+    return solver, home_vars
+
+def seedable_solver(seed_phases, ctx=None):
+    """
+    The solver of a model, None for the default of create_sts_model. Z3's default solver hands a single check
+    to a tactic that ignores initial values, so models seeded by set_initial_phases get a SimpleSolver.
+    """
+    return SimpleSolver(ctx=ctx) if seed_phases else None
+
+def set_initial_phases(solver, n, match_period_vars=None, home_vars=None):
+    """
+    Starts the solver from the constructive schedule of heuristic.py: with Z3 expressions, as the initial
+    values of match_period_vars and home_vars (either may be None), otherwise as the phases of the model
+    variables of the DIMACS formula (on a backend of PHASE_BACKENDS).
+    """
+    schedule = greedy_schedule(n)
+    if match_period_vars is None and home_vars is None:
+        match_period, home = variable_arrays(n)
+        in_period = schedule.period[:, None] == np.arange(n // 2)
+        solver.set_phases(np.where(in_period, match_period, -match_period).ravel().tolist()
+                          + np.where(schedule.home, home, -home).tolist())
+        return
+    for (i, j, p), var in (match_period_vars or {}).items():
+        solver.set_initial_value(var, BoolVal(match_slot(schedule, i, j, n)[0] == p, var.ctx))
+    for (i, j), var in (home_vars or {}).items():
+        solver.set_initial_value(var, BoolVal(match_slot(schedule, i, j, n)[1], var.ctx))
+
+def cube_solver(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, balance_encoding='pb',
+                balance_mode='periods', workers=1, depth=2, seed_phases=False):
+    """The model of create_sts_model split into cubes and solved by worker processes (see cubes.py)."""
+    def build(ctx):
+        solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
+            n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking, balance_encoding, balance_mode,
+            ctx=ctx, solver=seedable_solver(seed_phases, ctx))
+        if seed_phases:
+            set_initial_phases(solver, n, match_period_vars, home_vars)
+        return solver, match_period_vars, home_vars, pair_to_week
+    return CubeSolver(build, n, workers, depth)
+
+# Encoding functions, by name
+EXACTLY_ONE_ENCODINGS = {
+    "np": exactly_one_np,
+    "bw": exactly_one_bw,
+    "seq": exactly_one_seq,
+    "heule": heule_exactly_one,
+}
+AT_MOST_K_ENCODINGS = {
+    "np": at_most_k_np,
+    "seq": at_most_k_seq,
+    "totalizer": at_most_k_totalizer,
+    "cardnet": at_most_k_cardnet,
+    "mtotalizer": at_most_k_mtotalizer,
+}
+BALANCE_ENCODINGS = ['pb'] + list(CNF_BALANCE)
+ENCODING_NAMES = {f: name for encodings in (EXACTLY_ONE_ENCODINGS, AT_MOST_K_ENCODINGS) for name, f in encodings.items()}
+
+class ConstraintRecorder:
+    """
+    Stands in for the solver of create_sts_model: keeps the constraints of every constraint group
+    (the current group of alloc) apart instead of solving them, for the size report of --dry_run.
+    """
+
+    def __init__(self, alloc):
+        self.alloc = alloc
+        self.groups = defaultdict(list)
+
+    def add(self, *constraints):
+        for c in constraints:
+            self.groups[self.alloc.current_group].extend(c if isinstance(c, list) else [c])
+
+PB_KINDS = {Z3_OP_PB_AT_MOST, Z3_OP_PB_AT_LEAST, Z3_OP_PB_LE, Z3_OP_PB_GE, Z3_OP_PB_EQ}
+
+def constraint_size(constraints, ctx=None):
+    """(clauses, pb) of a list of constraints: PB constraints are counted apart, the rest as the clauses of its Tseitin CNF."""
+    goal, pb = Goal(ctx=ctx), 0
+    stack = list(constraints)
+    while stack:
+        c = stack.pop()
+        if is_and(c):
+            stack.extend(c.children())
+        elif is_app(c) and c.decl().kind() in PB_KINDS:
+            pb += 1
+        else:
+            goal.add(c)
+    return len(Tactic('tseitin-cnf', ctx)(goal)[0]), pb
+
+def model_size_report(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, backend=None,
+                      balance_encoding=None, balance_mode='periods', ctx=None):
     """
-    Solves the STS problem by performing a binary search on the maximum home/away
-    imbalance (MinMax objective).
+    Builds the model without solving it, and returns its size by constraint group (variables, clauses and PB
+    constraints) with the build time and memory. With a backend, the DIMACS formula is generated, not read from the cache.
+    """
+    mark()
+    start = time.perf_counter()
+    if backend:
+        groups = {}
+        build_sts_cnf(n, max_diff_k, ENCODING_NAMES[exactly_one_encoding], ENCODING_NAMES[at_most_k_encoding],
+                      symmetry_breaking, balance_encoding or default_balance(backend), sizes=groups)
+        build_time = time.perf_counter() - start
+        resources = usage()
+    else:
+        alloc = VarAllocator(ctx)
+        recorder = ConstraintRecorder(alloc)
+        _, match_period_vars, home_vars, _ = create_sts_model(
+            n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking,
+            balance_encoding=balance_encoding or default_balance(backend), balance_mode=balance_mode, ctx=ctx,
+            alloc=alloc, solver=recorder
+        )
+        build_time = time.perf_counter() - start
+        resources = usage()
+        groups = {'variables': {'variables': len(match_period_vars) + len(home_vars), 'clauses': 0, 'pb': 0}}
+        for group, constraints in recorder.groups.items():
+            clauses, pb = constraint_size(constraints, alloc.ctx)
+            groups[group] = {'variables': alloc.counts.get(group, 0), 'clauses': clauses, 'pb': pb}
+    return {
+        'n': n,
+        'max_diff_k': max_diff_k,
+        'groups': groups,
+        'total': {key: sum(group[key] for group in groups.values()) for key in ('variables', 'clauses', 'pb')},
+        'build_time': round(build_time, 4),
+        'resources': resources,
+    }
+
+def default_balance(backend):
+    """Balance encoding used when none is given: Z3's PB constraints, or a totalizer for the DIMACS formula."""
+    return 'pb' if backend is None else 'totalizer'
+
+def create_sts_model_cnf(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, backend='z3',
+                         balance_encoding='totalizer', ctx=None):
+    """
+    Same model as create_sts_model, generated as DIMACS clauses by cnf.py (or read from its cache)
+    and loaded into a solver of the given backend (see backends.py). The schedule is read back with extract_schedule_cnf.
+    """
+    path = sts_cnf(n, max_diff_k, ENCODING_NAMES[exactly_one_encoding], ENCODING_NAMES[at_most_k_encoding],
+                   symmetry_breaking, balance_encoding)
+    return cnf_solver(path, backend, ctx, n)
+
+def extract_schedule_cnf(model, n):
+    """
+    Reads the schedule from the model of a DIMACS formula: the set of true variables,
+    or a Z3 model, in which variable v is named k!v.
+    """
+    if isinstance(model, set):
+        true_vars = model
+    else:
+        true_vars = {int(d.name()[2:]) for d in model.decls() if is_true(model[d])}
+    return schedule_from_model(true_vars, n)
+
+def extract_schedule(model, match_period_vars, home_vars, pair_to_week):
+    """
+    Reads the schedule from a Z3 model as a list of (home, away, week, period) tuples, 1-based.
+    """
+    schedule = []
+    for (i, j, p), var in match_period_vars.items():
+        if is_true(model.evaluate(var)):
+            home_vars_key = (i, j) if i < j else (j, i)
+            is_home = is_true(model.evaluate(home_vars[home_vars_key]))
+
+            home_team_idx = i if is_home else j
+            away_team_idx = j if is_home else i
+
+            week_idx = pair_to_week[home_vars_key]
+
+            schedule.append((home_team_idx + 1, away_team_idx + 1, week_idx + 1, p + 1))
+    return schedule
+
+SEARCH_STRATEGIES = ['binary', 'sat_unsat', 'unsat_sat', 'core']
+
+def next_bound(search, low, high):
+    """
+    Next imbalance bound k to probe, low <= k <= high, or None when the search is over. Every imbalance is odd
+    for even n, so are low and high. binary probes the middle bound, sat_unsat the loosest (a linear search
+    down from n-1) and unsat_sat the tightest (a linear search up from 1, whose first sat answer is optimal).
+    After a probe, a sat answer moves high below the imbalance of the model found, an unsat one moves low above k.
+    """
+    if low > high:
+        return None
+    if search == 'sat_unsat':
+        return high
+    if search == 'unsat_sat':
+        return low
+    return low + (high - low) // 4 * 2
+
+def schedule_imbalance(schedule, n):
+    """Maximum home/away imbalance of a schedule: it may be better balanced than the bound it was found for."""
+    home_games = [0] * n
+    for home, _, _, _ in schedule:
+        home_games[home - 1] += 1
+    return max(abs(2 * h - (n - 1)) for h in home_games)
+
+def solve_sts_optimization(n, timeout_seconds, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, verbose=False, backend=None,
+                           balance_encoding=None, balance_mode='periods', ctx=None, search='binary', seed_phases=False,
+                           cube_workers=None, cube_depth=2):
+    """
+    Solves the STS problem by searching the maximum home/away imbalance (MinMax objective), one model
+    per probed bound, with the strategy search (see next_bound). With a backend, each probe solves the
+    DIMACS formula from cnf.py. The bound, answer and time of every probe are returned as 'probes'.
+    With seed_phases, every probe starts from the constructive schedule (see set_initial_phases).
+    With cube_workers, every probe is split into cubes solved by that many processes (see cube_solver).
     """
     if n % 2 != 0:
         raise ValueError("The number of teams must be even.")
@@ -436,19 +757,22 @@ def solve_sts_optimization(n, timeout_seconds, exactly_one_encoding, at_most_k_e
     
     low = 1
     high = NUM_WEEKS
-    optimal_diff_MinMax = None
-    best_solution_model = None
-    best_solution_vars = None
-    solution_found_at_least_once = False
-    proven_unsat = False
+    best_k = None
+    best_schedule = []
+    search_completed = False
+    probes = []
 
     init_time = time.time()
+    mark()
     
     if verbose:
-        print(f"\n--- Optimization for n={n} started ---")
+        print(f"\n--- Optimization ({search}) for n={n} started ---")
 
-    # Binary search
-    while low <= high:
+    while True:
+        k = next_bound(search, low, high)
+        if k is None:
+            search_completed = True
+            break
         current_elapsed_time = time.time() - init_time
         remaining_time = timeout_seconds - current_elapsed_time
         
@@ -456,45 +780,63 @@ def solve_sts_optimization(n, timeout_seconds, exactly_one_encoding, at_most_k_e
             if verbose:
                 print("Global timeout reached.")
             break
-            
-        k = (low + high) // 2 # binary search 
         
         if verbose:
             print(f"Testing max_diff <= {k}. Remaining time: {remaining_time:.2f}s...")
         
-        solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
-            n=n,
-            max_diff_k=k,
-            exactly_one_encoding=exactly_one_encoding,
-            at_most_k_encoding=at_most_k_encoding,
-            symmetry_breaking=symmetry_breaking
-        )
+        probe_start = time.perf_counter()
+        with span("build", k=k):
+            if backend:
+                solver = create_sts_model_cnf(n, k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking, backend,
+                                              balance_encoding or default_balance(backend), ctx)
+            elif cube_workers:
+                solver = cube_solver(n, k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking,
+                                     balance_encoding or default_balance(backend), balance_mode, cube_workers, cube_depth,
+                                     seed_phases)
+            else:
+                alloc = VarAllocator(ctx)
+                solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
+                    n=n,
+                    max_diff_k=k,
+                    exactly_one_encoding=exactly_one_encoding,
+                    at_most_k_encoding=at_most_k_encoding,
+                    symmetry_breaking=symmetry_breaking,
+                    balance_encoding=balance_encoding or default_balance(backend),
+                    balance_mode=balance_mode,
+                    ctx=ctx,
+                    alloc=alloc,
+                    solver=seedable_solver(seed_phases, ctx)
+                )
+                if verbose:
+                    print(f"  Auxiliary variables: {alloc.summary()}")
+            if seed_phases and not cube_workers:
+                set_initial_phases(solver, n, *(() if backend else (match_period_vars, home_vars)))
         solver.set("random_seed", 42)
         solver.set("timeout", int(remaining_time * 1000))
         
-        status = solver.check()
+        with span("solve", k=k):
+            status = solver.check()
         
         if verbose:
-            current_elapsed_time = min(current_elapsed_time, timeout_seconds)
             print(f"  Solver result for k={k}: {status}")
+            if cube_workers:
+                print(f"  Cubes solved: {len(solver.answers)} of {len(solver.cubes)}")
             
         if status == sat:
-            model = solver.model()
-            optimal_diff_MinMax = k
-            best_solution_model = model
-            best_solution_vars = (match_period_vars, home_vars, pair_to_week)
-            solution_found_at_least_once = True
-            high = k - 1
-            if verbose and k > 1:
-                print(f"  Found a solution with max_diff <= {k}. Trying for a smaller value.")
-                
+            with span("extract"):
+                if backend or cube_workers:
+                    best_schedule = extract_schedule_cnf(solver.model(), n)
+                else:
+                    best_schedule = extract_schedule(solver.model(), match_period_vars, home_vars, pair_to_week)
+            best_k = schedule_imbalance(best_schedule, n)
+            high = best_k - 2
         elif status == unsat:
-            proven_unsat = True
-            break
-                
+            low = k + 2
         else: 
             if verbose:
                 print("  Solver returned 'unknown'.")
+        probes.append({'k': k, 'status': str(status), 'time': round(time.perf_counter() - probe_start, 4)})
+        if status != sat and status != unsat:
             break
 
     stat = solver.statistics()
@@ -504,109 +846,230 @@ def solve_sts_optimization(n, timeout_seconds, exactly_one_encoding, at_most_k_e
         'mk_bool_var': stat.get_key_value('mk bool var') if 'mk bool var' in stat.keys() else 0,
         'conflicts': stat.get_key_value('conflicts') if 'conflicts' in stat.keys() else 0,
     }
+    resources = usage(solver_memory_mb=final_stats['max_memory'])
     
-    solve_time = time.time() - init_time
+    # if the solver takes few extra seconds than timeout
+    solve_time = min(time.time() - init_time, timeout_seconds)
 
-    best_solution_schedule = []
-    proven_optimal_final = False
+    return {
+        'obj': best_k,
+        'sol': best_schedule if best_k is not None or search_completed else None,
+        'optimal': search_completed,
+        'time': solve_time,
+        'restart': final_stats['restarts'],
+        'max_memory': final_stats['max_memory'],
+        'mk_bool_var': final_stats['mk_bool_var'],
+        'conflicts': final_stats['conflicts'],
+        'resources': resources,
+        'probes': probes
+    }
+    
+    
+def add_home_counters(solver, n, home_vars, pair_to_week, alloc=None):
+    """
+    Adds a totalizer_counter over the home games of every team (see team_home_games), returns the outputs of each team.
+    """
+    counters = []
+    for t in range(n):
+        home_games = team_home_games(t, [(i, j) for (i, j) in pair_to_week if t in (i, j)], home_vars)
+        outputs, constraints = totalizer_counter(home_games, alloc)
+        solver.add(constraints)
+        counters.append(outputs)
+    return counters
+
+def team_assumptions(outputs, n, max_diff_k):
+    """Assumption literals bounding the home/away imbalance of one team, given the outputs of its counter, to max_diff_k."""
+    NUM_GAMES = n - 1
+    upper_bound = math.floor((NUM_GAMES + max_diff_k) / 2)
+    lower_bound = math.ceil((NUM_GAMES - max_diff_k) / 2)
+    assumptions = []
+    if upper_bound < NUM_GAMES:
+        assumptions.append(Not(outputs[upper_bound]))
+    if lower_bound > 0:
+        assumptions.append(outputs[lower_bound - 1])
+    return assumptions
+
+def balance_assumptions(counters, n, max_diff_k):
+    """Assumption literals bounding the home/away imbalance of every team to max_diff_k."""
+    return [literal for outputs in counters for literal in team_assumptions(outputs, n, max_diff_k)]
+
+def solve_sts_optimization_incremental(n, timeout_seconds, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, verbose=False,
+                                       ctx=None, search='binary', seed_phases=False):
+    """
+    Same search as solve_sts_optimization, on a single solver: the base model and one home-game
+    counter per team are built once, and every probe bounds the imbalance through assumptions on the
+    counter outputs, so learned clauses are kept from one probe to the next.
+
+    The core search is core-guided: every team has its own bound, all starting from 1. The unsat core of a
+    probe names teams that cannot all keep their bounds, so the optimum is above the smallest of them: the
+    lower bound is raised past it, and only the teams of the core are relaxed up to the lower bound. The other
+    teams keep their tighter bounds, and the first sat answer is optimal, as no bound is above the lower bound.
+    """
+    if n % 2 != 0:
+        raise ValueError("The number of teams must be even.")
 
-    if best_solution_model:
-        match_period_vars, home_vars, pair_to_week = best_solution_vars
-        
-        for (i, j, p), var in match_period_vars.items():
-            if is_true(best_solution_model.evaluate(var)):
-                home_vars_key = (i, j) if i < j else (j, i)
-                is_home = is_true(best_solution_model.evaluate(home_vars[home_vars_key]))
-                
-                if i < j:
-                    home_team_idx = i if is_home else j
-                    away_team_idx = j if is_home else i
-                else:
-                    home_team_idx = i if is_home else j
-                    away_team_idx = j if is_home else i
+    NUM_GAMES = n - 1
+    low, high = 1, NUM_GAMES
+    team_bounds = [1] * n
+    best_k = None
+    best_schedule = []
+    search_completed = False
+    probes = []
 
-                week_idx = pair_to_week[home_vars_key]
-                
-                best_solution_schedule.append((home_team_idx + 1, away_team_idx + 1, week_idx + 1, p + 1))
+    init_time = time.time()
+    mark()
 
-        if optimal_diff_MinMax is not None and optimal_diff_MinMax == 1:
-            proven_optimal_final = True
-    
-    # if the solver takes few extra seconds than timeout
-    solve_time = min(solve_time, timeout_seconds)
-            
-    if proven_optimal_final:
-        result = {
-            'obj': optimal_diff_MinMax,
-            'sol': best_solution_schedule,
-            'optimal': True,
-            'time': solve_time,
-            'restart': final_stats['restarts'],
-            'max_memory': final_stats['max_memory'],
-            'mk_bool_var': final_stats['mk_bool_var'],
-            'conflicts': final_stats['conflicts']
-        }
-        return result
-    elif proven_unsat:
-        result = {
-            'obj': None,
-            'sol': best_solution_schedule,
-            'optimal': True,
-            'time': solve_time,
-            'restart': final_stats['restarts'],
-            'max_memory': final_stats['max_memory'],
-            'mk_bool_var': final_stats['mk_bool_var'],
-            'conflicts': final_stats['conflicts']
-        }
-        return result
-    elif solution_found_at_least_once:
-        result = {
-            'obj': optimal_diff_MinMax,
-            'sol': best_solution_schedule,
-            'optimal': False,
-            'time': solve_time,
-            'restart': final_stats['restarts'],
-            'max_memory': final_stats['max_memory'],
-            'mk_bool_var': final_stats['mk_bool_var'],
-            'conflicts': final_stats['conflicts']
-        }
-        return result
-    else:
-        result = {
-            'obj': None,
-            'sol': None,
-            'optimal': False,
-            'time': solve_time,
-            'restart': final_stats['restarts'],
-            'max_memory': final_stats['max_memory'],
-            'mk_bool_var': final_stats['mk_bool_var'],
-            'conflicts': final_stats['conflicts']
-        }
-        return result
-    
-    
-def solve_sts_decisional(n, max_diff_k, timeout_seconds, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, verbose=False):
+    if verbose:
+        print(f"\n--- Incremental optimization ({search}) for n={n} started ---")
+
+    alloc = VarAllocator(ctx)
+    with span("build"):
+        solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
+            n=n,
+            max_diff_k=None,
+            exactly_one_encoding=exactly_one_encoding,
+            at_most_k_encoding=at_most_k_encoding,
+            symmetry_breaking=symmetry_breaking,
+            ctx=ctx,
+            alloc=alloc,
+            # the bounds are assumptions whose unsat cores are needed: Z3's incremental solver, whatever the pipeline
+            solver=seedable_solver(seed_phases, ctx) or Solver(ctx=ctx)
+        )
+        with span("build.home_counters"), alloc.group("home_counters"):
+            counters = add_home_counters(solver, n, home_vars, pair_to_week, alloc)
+        if seed_phases:
+            set_initial_phases(solver, n, match_period_vars, home_vars)
+    if verbose:
+        print(f"Auxiliary variables: {alloc.summary()}")
+    solver.set("random_seed", 42)
+
+    while True:
+        k = max(team_bounds) if search == 'core' else next_bound(search, low, high)
+        if k is None or k > NUM_GAMES:
+            search_completed = True
+            break
+        remaining_time = timeout_seconds - (time.time() - init_time)
+        if remaining_time <= 3:
+            if verbose:
+                print("Global timeout reached.")
+            break
+
+        if search == 'core':
+            team_of = {}
+            for t, outputs in enumerate(counters):
+                for literal in team_assumptions(outputs, n, team_bounds[t]):
+                    team_of[literal.get_id()] = t
+            assumptions = [literal for outputs, bound in zip(counters, team_bounds)
+                           for literal in team_assumptions(outputs, n, bound)]
+        else:
+            assumptions = balance_assumptions(counters, n, k)
+        if verbose:
+            print(f"Testing max_diff <= {k}. Remaining time: {remaining_time:.2f}s...")
+
+        probe_start = time.perf_counter()
+        solver.set("timeout", int(remaining_time * 1000))
+        with span("solve", k=k):
+            status = solver.check(*assumptions)
+
+        if verbose:
+            print(f"  Solver result for k={k}: {status}")
+
+        if status == sat:
+            with span("extract"):
+                best_schedule = extract_schedule(solver.model(), match_period_vars, home_vars, pair_to_week)
+            best_k = schedule_imbalance(best_schedule, n)
+            high = best_k - 2
+            if search == 'core':
+                search_completed = True
+        elif status == unsat and search == 'core':
+            core_teams = {team_of[literal.get_id()] for literal in solver.unsat_core()}
+            if not core_teams:
+                # infeasible whatever the bounds
+                team_bounds = [NUM_GAMES + 2] * n
+            else:
+                # every bound is at most low, so the teams of the core are all relaxed to it
+                low = max(low, min(team_bounds[t] for t in core_teams) + 2)
+                for t in core_teams:
+                    team_bounds[t] = low
+        elif status == unsat:
+            low = k + 2
+        else:
+            if verbose:
+                print("  Solver returned 'unknown'.")
+        probes.append({'k': k, 'status': str(status), 'time': round(time.perf_counter() - probe_start, 4)})
+        if (status != sat and status != unsat) or search_completed:
+            break
+
+    stat = solver.statistics()
+    final_stats = {
+        'restarts': stat.get_key_value('restarts') if 'restarts' in stat.keys() else 0,
+        'max_memory': stat.get_key_value('max memory') if 'max memory' in stat.keys() else 0,
+        'mk_bool_var': stat.get_key_value('mk bool var') if 'mk bool var' in stat.keys() else 0,
+        'conflicts': stat.get_key_value('conflicts') if 'conflicts' in stat.keys() else 0,
+    }
+    resources = usage(solver_memory_mb=final_stats['max_memory'])
+    solve_time = min(time.time() - init_time, timeout_seconds)
+
+    return {
+        'obj': best_k,
+        'sol': best_schedule if best_k is not None or search_completed else None,
+        'optimal': search_completed,
+        'time': solve_time,
+        'restart': final_stats['restarts'],
+        'max_memory': final_stats['max_memory'],
+        'mk_bool_var': final_stats['mk_bool_var'],
+        'conflicts': final_stats['conflicts'],
+        'resources': resources,
+        'probes': probes
+    }
+
+def solve_sts_decisional(n, max_diff_k, timeout_seconds, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, verbose=False, backend=None,
+                         balance_encoding=None, balance_mode='periods', ctx=None, seed_phases=False, cube_workers=None,
+                         cube_depth=2):
     """
     Solves the STS decisional problem: finds ONE solution for a given max_diff_k.
-    Does NOT perform optimization.
+    Does NOT perform optimization. With a backend, the DIMACS formula from cnf.py is solved.
+    With seed_phases, the solver starts from the constructive schedule (see set_initial_phases).
+    With cube_workers, the model is split into cubes solved by that many processes (see cube_solver).
     """
     if verbose:
         print(f"\n--- Decisional solver for n={n} ---")
 
     init_time = time.time()
-
-    solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
-        n=n,
-        max_diff_k=max_diff_k,
-        exactly_one_encoding=exactly_one_encoding,
-        at_most_k_encoding=at_most_k_encoding,
-        symmetry_breaking=symmetry_breaking
-    )
+    mark()
+    alloc = VarAllocator(ctx)
+
+    with span("build"):
+        if backend:
+            solver = create_sts_model_cnf(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking, backend,
+                                          balance_encoding or default_balance(backend), ctx)
+        elif cube_workers:
+            solver = cube_solver(n, max_diff_k, exactly_one_encoding, at_most_k_encoding, symmetry_breaking,
+                                 balance_encoding or default_balance(backend), balance_mode, cube_workers, cube_depth,
+                                 seed_phases)
+        else:
+            solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
+                n=n,
+                max_diff_k=max_diff_k,
+                exactly_one_encoding=exactly_one_encoding,
+                at_most_k_encoding=at_most_k_encoding,
+                symmetry_breaking=symmetry_breaking,
+                balance_encoding=balance_encoding or default_balance(backend),
+                balance_mode=balance_mode,
+                ctx=ctx,
+                alloc=alloc,
+                solver=seedable_solver(seed_phases, ctx)
+            )
+            if verbose:
+                print(f"Auxiliary variables: {alloc.summary()}")
+        if seed_phases and not cube_workers:
+            set_initial_phases(solver, n, *(() if backend else (match_period_vars, home_vars)))
     
     solver.set("random_seed", 42)
     solver.set("timeout", int(timeout_seconds * 1000))
     
-    status = solver.check()
+    with span("solve"):
+        status = solver.check()
     solve_time = time.time() - init_time
     
     final_stats = solver.statistics()
@@ -619,24 +1082,11 @@ def solve_sts_decisional(n, max_diff_k, timeout_seconds, exactly_one_encoding, a
     best_solution_schedule = []
     
     if status == sat:
-        model = solver.model()
-        
-        
-        for (i, j, p), var in match_period_vars.items():
-            if is_true(model.evaluate(var)):
-                home_vars_key = (i, j) if i < j else (j, i)
-                is_home = is_true(model.evaluate(home_vars[home_vars_key]))
-                
-                if i < j:
-                    home_team_idx = i if is_home else j
-                    away_team_idx = j if is_home else i
-                else:
-                    home_team_idx = i if is_home else j
-                    away_team_idx = j if is_home else i
-
-                week_idx = pair_to_week[home_vars_key]
-                
-                best_solution_schedule.append((home_team_idx + 1, away_team_idx + 1, week_idx + 1, p + 1))
+        with span("extract"):
+            if backend or cube_workers:
+                best_solution_schedule = extract_schedule_cnf(solver.model(), n)
+            else:
+                best_solution_schedule = extract_schedule(solver.model(), match_period_vars, home_vars, pair_to_week)
     
     solve_time = solve_time if solve_time <= 300 else 300
     optimal = True if solve_time < 300 else False
@@ -648,10 +1098,166 @@ def solve_sts_decisional(n, max_diff_k, timeout_seconds, exactly_one_encoding, a
         'restart': stats_dict['restarts'],
         'max_memory': stats_dict['max_memory'],
         'mk_bool_var': stats_dict['mk_bool_var'],
-        'conflicts': stats_dict['conflicts']
+        'conflicts': stats_dict['conflicts'],
+        'resources': usage(solver_memory_mb=stats_dict['max_memory'])
     }
     return result
 
+def solve_sts_decoupled(n, timeout_seconds, exactly_one_encoding, at_most_k_encoding, symmetry_breaking=True, verbose=False, backend=None,
+                        balance_encoding=None, max_diff_k=None, ctx=None, search='binary', seed_phases=False):
+    """
+    Solves the period subproblem and the home/away subproblem apart, as they share no constraint once the
+    balance is counted over home_vars. The periods are solved once (with the backend, if any), then the
+    imbalance is searched on the small home/away model alone (see next_bound), or only max_diff_k is checked when given.
+    """
+    if n % 2 != 0:
+        raise ValueError("The number of teams must be even.")
+
+    NUM_GAMES = n - 1
+    low, high = (max_diff_k, max_diff_k) if max_diff_k is not None else (1, NUM_GAMES)
+    best_k = None
+    best_home = None
+    search_completed = False
+    probes = []
+
+    init_time = time.time()
+    mark()
+
+    if verbose:
+        print(f"\n--- Decoupled solver for n={n} started ---")
+
+    with span("build"):
+        if backend:
+            solver = create_sts_model_cnf(n, None, exactly_one_encoding, at_most_k_encoding, symmetry_breaking, backend, ctx=ctx)
+        else:
+            solver, match_period_vars, home_vars, pair_to_week = create_sts_model(
+                n=n,
+                max_diff_k=None,
+                exactly_one_encoding=exactly_one_encoding,
+                at_most_k_encoding=at_most_k_encoding,
+                symmetry_breaking=symmetry_breaking,
+                ctx=ctx,
+                solver=seedable_solver(seed_phases, ctx)
+            )
+        if seed_phases:
+            set_initial_phases(solver, n, *(() if backend else (match_period_vars, None)))
+    solver.set("random_seed", 42)
+    solver.set("timeout", int(timeout_seconds * 1000))
+
+    with span("solve"):
+        status = solver.check()
+    if verbose:
+        print(f"  Period subproblem: {status}")
+
+    while status == sat:
+        k = next_bound(search, low, high)
+        if k is None:
+            search_completed = True
+            break
+        remaining_time = timeout_seconds - (time.time() - init_time)
+        if remaining_time <= 0:
+            break
+
+        probe_start = time.perf_counter()
+        with span("build", k=k):
+            home_solver, home_model_vars = create_home_model(n, k, symmetry_breaking, balance_encoding or 'pb', ctx,
+                                                             solver=seedable_solver(seed_phases, ctx))
+            if seed_phases:
+                set_initial_phases(home_solver, n, home_vars=home_model_vars)
+        home_solver.set("random_seed", 42)
+        home_solver.set("timeout", int(remaining_time * 1000))
+        with span("solve", k=k):
+            home_status = home_solver.check()
+        if verbose:
+            print(f"  Home/away subproblem for k={k}: {home_status}")
+
+        probes.append({'k': k, 'status': str(home_status), 'time': round(time.perf_counter() - probe_start, 4)})
+        if home_status == sat:
+            best_k, best_home = k, home_solver.model()
+            high = k - 2
+        elif home_status == unsat:
+            low = k + 2
+        else:
+            break
+
+    stat = solver.statistics()
+    final_stats = {
+        'restarts': stat.get_key_value('restarts') if 'restarts' in stat.keys() else 0,
+        'max_memory': stat.get_key_value('max memory') if 'max memory' in stat.keys() else 0,
+        'mk_bool_var': stat.get_key_value('mk bool var') if 'mk bool var' in stat.keys() else 0,
+        'conflicts': stat.get_key_value('conflicts') if 'conflicts' in stat.keys() else 0,
+    }
+    resources = usage(solver_memory_mb=final_stats['max_memory'])
+    solve_time = min(time.time() - init_time, timeout_seconds)
+
+    schedule = []
+    if best_home is not None:
+        with span("extract"):
+            if backend:
+                schedule = extract_schedule_cnf(solver.model(), n)
+            else:
+                schedule = extract_schedule(solver.model(), match_period_vars, home_vars, pair_to_week)
+            # the venues come from the home/away subproblem
+            venues = {pair: is_true(best_home.evaluate(var, model_completion=True)) for pair, var in home_model_vars.items()}
+            oriented = []
+            for home, away, w, p in schedule:
+                i, j = sorted((home, away))
+                oriented.append((i, j, w, p) if venues[(i - 1, j - 1)] else (j, i, w, p))
+            schedule = oriented
+
+    return {
+        'obj': best_k if max_diff_k is None else None,
+        'sol': schedule if best_k is not None or search_completed or status == unsat else None,
+        'optimal': search_completed or status == unsat,
+        'time': solve_time,
+        'restart': final_stats['restarts'],
+        'max_memory': final_stats['max_memory'],
+        'mk_bool_var': final_stats['mk_bool_var'],
+        'conflicts': final_stats['conflicts'],
+        'resources': resources,
+        'probes': probes
+    }
+
+def run_job(job, own_context=False):
+    """Runs a job of the sweep, in a fresh Z3 context if own_context. Returns its results, or the ValueError raised."""
+    try:
+        return job['solve'](ctx=Context() if own_context else None)
+    except ValueError as e:
+        return e
+
+def report_job(job, results, save_json):
+    n = job['n']
+    if isinstance(results, ValueError):
+        print(f"Skipping n={n}: {results}")
+        return
+
+    if save_json:
+        save_results_as_json(n, model_name=job['model_name'], results=results)
+
+    if results['sol'] is not None:
+        obj = f" | obj={results['obj']}" if job['mode'] == 'Optimization' else ''
+        if os.path.exists("/.dockerenv"):
+            os.system(f"echo '[{job['mode']} Result] n={n}{obj} | time={results['time']}'")
+        else:
+            print(f"[{job['mode']} Result] n={n}{obj} | time={results['time']}")
+    else:
+        print(f"[!] No solution found for n={n}")
+
+def run_sweep(jobs, threads=None, save_json=False):
+    """
+    Runs the jobs of the sweep one after another, or on a pool of threads. Every thread job builds and
+    solves its model in its own z3.Context: Z3 releases the GIL while solving, so the jobs run in parallel
+    in a single interpreter. The results are written and printed in job order, whatever order they finish in.
+    """
+    if not threads:
+        for job in jobs:
+            report_job(job, run_job(job), save_json)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(run_job, job, True) for job in jobs]
+        for job, future in zip(jobs, futures):
+            report_job(job, future.result(), save_json)
+
 
 import argparse
 import re
@@ -680,7 +1286,7 @@ def parse_n_teams(n_input):
                 print(f"[WARNING] Invalid value for -n: {item}")
     return sorted(result)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Sport Tournament Scheduler using Z3 solvers.")
     parser.add_argument(
         "-n", "--n_teams",
@@ -704,9 +1310,23 @@ def main():
     parser.add_argument(
         "--at_most_k_encoding",
         type=str,
-        choices=["np", "seq", "totalizer"],
+        choices=list(AT_MOST_K_ENCODINGS),
         help="Encoding for at-most-k constraints."
     )
+    parser.add_argument(
+        "--balance_encoding",
+        type=str,
+        choices=BALANCE_ENCODINGS,
+        help="Encoding of the home/away balance bounds (default: pb with Z3 expressions, totalizer in DIMACS)."
+    )
+    parser.add_argument(
+        "--balance_mode",
+        choices=["periods", "direct", "decoupled"],
+        default="periods",
+        help="Home games counted over the period/venue conjunctions (periods), over home_vars alone (direct), "
+             "or over home_vars in a home/away subproblem solved apart from the periods (decoupled). "
+             "The DIMACS formula always counts them directly."
+    )
     parser.add_argument(
         "--all",
         action="store_true",
@@ -722,6 +1342,67 @@ def main():
         action="store_true",
         help="Run the optimization solver."
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Run the optimization on a single solver, bounding the imbalance through assumptions."
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only build the model of every configuration, and print its size by constraint group as JSON."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs='?',
+        const=os.cpu_count(),
+        help="Run the jobs of the sweep on a pool of threads, each with its own Z3 context (default: one per CPU)."
+    )
+    parser.add_argument(
+        "--cubes",
+        type=int,
+        nargs='?',
+        const=os.cpu_count(),
+        help="Split every model into cubes, fixing the periods of the first matches of week 1, and solve them "
+             "on N worker processes (default: one per CPU)."
+    )
+    parser.add_argument(
+        "--cube_depth",
+        type=int,
+        default=2,
+        help="Number of matches whose periods are fixed by the cubes (n/2 * (n/2 - 1) * ... cubes)."
+    )
+    parser.add_argument(
+        "--search",
+        choices=SEARCH_STRATEGIES,
+        default="binary",
+        help="Search of the optimal imbalance: binary, linear down from n-1 (sat_unsat), linear up from 1 (unsat_sat), "
+             "or core-guided on the incremental solver (core, with --incremental)."
+    )
+    parser.add_argument(
+        "--seed_phases",
+        action="store_true",
+        help="Start the solver from a constructive schedule (heuristic.py), as the initial values of the model "
+             "variables. With DIMACS, only on the cadical, glucose and minisat backends."
+    )
+    add_z3_arguments(parser)
+    parser.add_argument(
+        "--cnf",
+        action="store_true",
+        help="Generate the model as DIMACS CNF (cached on disk) instead of Z3 expressions."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        help="Solver of the model: z3 (default), a PySAT solver, or an external DIMACS solver. "
+             "Every backend but z3 solves the DIMACS CNF. With --all, every available backend is run."
+    )
+    parser.add_argument(
+        "--sat_solver_cmd",
+        type=str,
+        help=f"Command of the external backend (default: ${EXTERNAL_ENV} or kissat)."
+    )
     
 
     parser.add_argument(
@@ -749,33 +1430,23 @@ def main():
         help="Save solver results to JSON files."
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Parse and validate number of teams
     args.n_teams = parse_n_teams(args.n_teams)
+    try:
+        configure_z3(args, formulation='sat')
+    except Z3Exception as e:
+        print(f"Error: invalid Z3 configuration: {e}")
+        return
 
-    # Encoding functions
-    exactly_one_encodings = {
-        "np": exactly_one_np,
-        "bw": exactly_one_bw,
-        "seq": exactly_one_seq,
-        "heule": heule_exactly_one,
-    }
-    at_most_k_encodings = {
-        "np": at_most_k_np,
-        "seq": at_most_k_seq,
-        "totalizer": at_most_k_totalizer,
-    }
+    exactly_one_encodings = EXACTLY_ONE_ENCODINGS
+    at_most_k_encodings = AT_MOST_K_ENCODINGS
 
     if args.all:
-        allowed_pairs = [
-            ("np", "np"),
-            ("heule", "seq"),
-            ("heule", "totalizer")
-        ]
         encoding_combinations = [
-            ((eo, exactly_one_encodings[eo]), (ak, at_most_k_encodings[ak]))
-            for eo, ak in allowed_pairs
+            ((eo, exactly_one_encodings[eo]), (ak, at_most_k_encodings[ak]), balance or args.balance_encoding)
+            for eo, ak, balance in ENCODING_PAIRS
         ]
         
         if not args.run_decisional and not args.run_optimization:
@@ -787,7 +1458,8 @@ def main():
             return
         encoding_combinations = [(
             (args.exactly_one_encoding, exactly_one_encodings[args.exactly_one_encoding]),
-            (args.at_most_k_encoding, at_most_k_encodings[args.at_most_k_encoding])
+            (args.at_most_k_encoding, at_most_k_encodings[args.at_most_k_encoding]),
+            args.balance_encoding
         )]
 
     if not args.run_decisional and not args.run_optimization:
@@ -795,75 +1467,150 @@ def main():
         parser.print_help()
         return
 
+    if args.sat_solver_cmd:
+        os.environ[EXTERNAL_ENV] = args.sat_solver_cmd
+    if args.backend is not None:
+        backends = [args.backend]
+    elif args.all and not args.incremental:
+        backends = [b for b in SWEEP_BACKENDS if backend_available(b)]
+    else:
+        backends = ['z3']
+    if args.seed_phases:
+        # the Z3 solver of a DIMACS file and the external solvers take no initial phases
+        backends = [b for b in backends if b in PHASE_BACKENDS or (b == 'z3' and not args.cnf)]
+        if not backends:
+            print("Error: --seed_phases needs Z3 expressions or one of the backends " + ", ".join(PHASE_BACKENDS) + ".")
+            return
+    if not backend_available(backends[0]):
+        print(f"Error: the {backends[0]} backend is not installed.")
+        return
+    if args.search == 'core' and not args.incremental:
+        print("Error: the core search needs the assumptions of --incremental.")
+        return
+    if args.cubes and (args.cnf or backends != ['z3'] or args.incremental or args.balance_mode == 'decoupled'
+                       or args.threads or args.dry_run):
+        print("Error: --cubes splits the Z3 expressions of the decisional and optimization solvers only, "
+              "and already runs in parallel.")
+        return
+    if args.dry_run and (args.incremental or args.balance_mode == 'decoupled'):
+        print("Error: --dry_run reports the models of the decisional and optimization solvers only.")
+        return
+    if args.incremental and (args.cnf or backends != ['z3'] or args.balance_encoding or args.balance_mode != 'periods'):
+        print("Error: --incremental is only supported with Z3 expressions, and bounds the balance with its own counters.")
+        return
+    decoupled = args.balance_mode == 'decoupled'
+    if args.balance_encoding == 'pb' and (args.cnf or args.backend not in (None, 'z3')) and not decoupled:
+        print("Error: the pb balance encoding needs Z3 expressions, DIMACS has no pseudo-Boolean constraints.")
+        return
+
     timeout = args.timeout - 1
     if args.sb is None:
         sb_options = [True, False]
     else:
         sb_options = [args.sb]
 
-    for sb in sb_options:
+    jobs = []
+    for sb, backend in product(sb_options, backends):
         sb_name = "sb" if sb else "no_sb"
-        for (eo_name, eo_func), (ak_name, ak_func) in encoding_combinations:
-            name_prefix = f"{eo_name}_{ak_name}"
+        # None: the Z3 expressions of create_sts_model, otherwise the DIMACS formula on that backend
+        model_backend = backend if args.cnf or backend != 'z3' else None
+        variant = '' if model_backend is None else 'cnf_' if model_backend == 'z3' else f"{backend}_"
+        variant += 'cubes_' if args.cubes else ''
+        seen = set()
+        # the home/away subproblem of the decoupled mode is always made of Z3 expressions
+        default_balance_encoding = 'pb' if decoupled else default_balance(model_backend)
+        # seeded Z3 expressions are solved by a SimpleSolver instead of the configured one (see seedable_solver)
+        seeded_name = '_seeded_simple' if model_backend is None else '_seeded'
+        mode_name = ('' if args.balance_mode == 'periods' else f"_{args.balance_mode}") + (seeded_name if args.seed_phases else '')
+        # the Z3 pipeline of --tactic solves the Z3 models, but not the incremental or seeded ones (see seedable_solver)
+        uses_pipeline = model_backend in (None, 'z3') and not args.incremental and not args.seed_phases
+        tactic_name = pipeline_name if uses_pipeline else lambda n: ''
+        for (eo_name, eo_func), (ak_name, ak_func), balance in encoding_combinations:
+            balance = balance or default_balance_encoding
+            balance_name = '' if balance == default_balance_encoding else f"_{balance}"
+            name_prefix = f"{variant}{eo_name}_{ak_name}{balance_name}{mode_name}"
+            if name_prefix in seen or (args.incremental and balance_name):
+                continue
+            seen.add(name_prefix)
+
+            if args.dry_run:
+                # the decisional model has k = n-1, the optimization one is reported at its tightest bound k = 1
+                for n in args.n_teams:
+                    for mode, k, selected in (('decisional', n - 1, args.run_decisional), ('optimization', 1, args.run_optimization)):
+                        if selected:
+                            jobs.append({
+                                'mode': mode,
+                                'n': n,
+                                'model_name': f"{mode}_{name_prefix}{tactic_name(n)}_{sb_name}",
+                                'solve': partial(model_size_report, n, k, eo_func, ak_func, sb, model_backend, balance,
+                                                 args.balance_mode),
+                            })
+                continue
 
             if args.run_decisional:
-                # print(f"\n=== Decisional Solver | {eo_name} + {ak_name} | Symmetry: {sb_name} ===\n")
                 for n in args.n_teams:
-                    model_name = f"decisional_{name_prefix}_{sb_name}"
-                    try:
-                        results = solve_sts_decisional(
+                    decide = solve_sts_decoupled if decoupled else partial(solve_sts_decisional, balance_mode=args.balance_mode,
+                                                                           cube_workers=args.cubes, cube_depth=args.cube_depth)
+                    jobs.append({
+                        'mode': 'Decisional',
+                        'n': n,
+                        'model_name': f"decisional_{name_prefix}{tactic_name(n)}_{sb_name}",
+                        'solve': partial(
+                            decide,
                             n,
                             max_diff_k=n-1,
                             exactly_one_encoding=eo_func,
                             at_most_k_encoding=ak_func,
                             timeout_seconds=timeout,
                             symmetry_breaking=sb,
-                            verbose=args.verbose
-                        )
-                    except ValueError as e:
-                        print(f"Skipping n={n}: {e}")
-                        continue
-
-                    if args.save_json:
-                        save_results_as_json(n, model_name=model_name, results=results)
-
-                    if results['sol'] is not None:
-                        if os.path.exists("/.dockerenv"):
-                            os.system(f"echo '[Decisional Result] n={n} | time={results['time']}'")
-                        else:
-                            print(f"[Decisional Result] n={n} | time={results['time']}")
-                        # print_weekly_schedule(results['sol'], n)
-                    else:
-                        print(f"[!] No solution found for n={n}")
+                            verbose=args.verbose,
+                            backend=model_backend,
+                            balance_encoding=balance,
+                            seed_phases=args.seed_phases
+                        ),
+                    })
 
             if args.run_optimization:
-                # print(f"\n=== Optimization Solver | {eo_name} + {ak_name} | Symmetry: {sb_name} ===\n")
                 for n in args.n_teams:
-                    model_name = f"optimization_{name_prefix}_{sb_name}"
-                    try:
-                        results = solve_sts_optimization(
+                    if args.incremental:
+                        optimize = partial(solve_sts_optimization_incremental, search=args.search)
+                    elif decoupled:
+                        optimize = partial(solve_sts_decoupled, backend=model_backend, balance_encoding=balance,
+                                           search=args.search)
+                    else:
+                        optimize = partial(solve_sts_optimization, backend=model_backend, balance_encoding=balance,
+                                           balance_mode=args.balance_mode, search=args.search, cube_workers=args.cubes,
+                                           cube_depth=args.cube_depth)
+                    jobs.append({
+                        'mode': 'Optimization',
+                        'n': n,
+                        'model_name': f"optimization_{'incremental_' if args.incremental else ''}"
+                                      f"{'' if args.search == 'binary' else args.search + '_'}{name_prefix}{tactic_name(n)}_{sb_name}",
+                        'solve': partial(
+                            optimize,
                             n,
                             exactly_one_encoding=eo_func,
                             at_most_k_encoding=ak_func,
                             timeout_seconds=timeout,
                             symmetry_breaking=sb,
-                            verbose=args.verbose
-                        )
-                    except ValueError as e:
-                        print(f"Skipping n={n}: {e}")
-                        continue
-
-                    if args.save_json:
-                        save_results_as_json(n, model_name=model_name, results=results)
-                    if results['sol'] is not None:
-                        if os.path.exists("/.dockerenv"):
-                            os.system(f"echo '[Optimization Result] n={n} | obj={results['obj']} | time={results['time']}'")
-                            
-                        else:
-                            print(f"[Optimization Result] n={n} | obj={results['obj']} | time={results['time']}")
-                        
-                    else:
-                        print(f"[!] No solution found for n={n}")
+                            verbose=args.verbose,
+                            seed_phases=args.seed_phases
+                        ),
+                    })
+
+    if args.dry_run:
+        # one build at a time, so that the peak memory of each is its own
+        reports = []
+        for job in jobs:
+            report = run_job(job)
+            if isinstance(report, ValueError):
+                print(f"Skipping n={job['n']}: {report}", file=sys.stderr)
+                continue
+            reports.append({'model_name': job['model_name'], **report})
+        print(json.dumps(reports, indent=2))
+        return
+
+    run_sweep(jobs, args.threads, args.save_json)
 
 if __name__ == "__main__":
     main()
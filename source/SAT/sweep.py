@@ -0,0 +1,11 @@
+"""
+Encodings swept by `main.py --all`, also read by runner.py and selector.py for their `--all` jobs.
+
+Every entry is (exactly-one, at-most-k, balance), named as in EXACTLY_ONE_ENCODINGS, AT_MOST_K_ENCODINGS and
+the --balance_encoding choices of main.py; a balance of None is the default of the model (pb, or totalizer
+in DIMACS).
+"""
+
+ENCODING_PAIRS = [("np", "np", None), ("heule", "seq", None), ("heule", "totalizer", None),
+                  ("heule", "cardnet", None), ("heule", "mtotalizer", None),
+                  ("heule", "totalizer", "totalizer"), ("heule", "totalizer", "sortnet")]
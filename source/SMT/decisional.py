@@ -1,84 +1,101 @@
 import argparse
 import os
-import json
+import sys
 import time
 from z3 import *
 from collections import defaultdict
 
-def z3_label_periods(matches_per_week, periods, max_per_team=2, sb_enabled=True, timeout=290):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import record_result
+from tracing import span
+from instance import week_matchings
+from heuristic import greedy_schedule, match_slot
+from z3_config import new_solver, pipeline_name, add_arguments as add_z3_arguments, configure as configure_z3
+from resources import mark, usage, z3_memory_mb
+
+def z3_label_periods(matches_per_week, periods, max_per_team=2, sb_enabled=True, timeout=290, seed_phases=False):
     """
     Build and solve the SMT model. If sb_enabled is False, skip symmetry-breaking constraints.
+    If seed_phases is True, p starts from the periods of the constructive schedule of heuristic.py.
     """
-    weeks = sorted(matches_per_week.keys())
-    # decision vars
-    # 1) period assignment variables p[w,i,j] ∈ [1..periods]
-    p = { (w,i,j): Int(f"p_{w}_{i}_{j}")
-          for w in weeks
-          for (i,j) in matches_per_week[w] }
-
-    # directive for solver to convert cardinality constraints to bit-vectors
-    solver = Then('card2bv','smt').solver()
-    solver.set(timeout=timeout * 1000)
-
-    # domain constraints
-    for var in p.values():
-        solver.add(var >= 1, var <= periods)
-
-    # symmetry breaking: optional week1 period fixing
-    if sb_enabled:
-        w1 = weeks[0]
-        for k, (i,j) in enumerate(sorted(matches_per_week[w1])):
-            solver.add(p[w1,i,j] == k+1)
-
-    # one match per slot per week
-    for w in weeks:
-        for k in range(1, periods+1):
-            guards = [(p[w,i,j] == k, 1) for (i,j) in matches_per_week[w]]
-            solver.add(PbEq(guards, 1))
-
-    # at most max games per team per slot
-    teams = {t for w in weeks for (i,j) in matches_per_week[w] for t in (i,j)}
-    for t in teams:
-        for k in range(1, periods+1):
-            guards = [(p[w,i,j] == k, 1)
-                      for w in weeks
-                      for (i,j) in matches_per_week[w]
-                      if t in (i,j)]
-            solver.add(PbLe(guards, max_per_team))
+    with span("build"):
+        weeks = sorted(matches_per_week.keys())
+        # decision vars
+        with span("build.variables"):
+            # 1) period assignment variables p[w,i,j] ∈ [1..periods]
+            p = { (w,i,j): Int(f"p_{w}_{i}_{j}")
+                  for w in weeks
+                  for (i,j) in matches_per_week[w] }
+
+            # pipeline of --tactic, by default card2bv: the solver converts cardinality constraints to bit-vectors
+            # (a tactic ignores initial values, so a seeded model is solved by the SMT core directly)
+            solver = SimpleSolver() if seed_phases else new_solver(n=2 * periods)
+            solver.set(timeout=timeout * 1000)
+
+            # domain constraints
+            for var in p.values():
+                solver.add(var >= 1, var <= periods)
+
+        with span("build.symmetry_breaking"):
+            # symmetry breaking: optional week1 period fixing
+            if sb_enabled:
+                w1 = weeks[0]
+                for k, (i,j) in enumerate(sorted(matches_per_week[w1])):
+                    solver.add(p[w1,i,j] == k+1)
+
+        with span("build.one_match_per_slot"):
+            # one match per slot per week
+            for w in weeks:
+                for k in range(1, periods+1):
+                    guards = [(p[w,i,j] == k, 1) for (i,j) in matches_per_week[w]]
+                    solver.add(PbEq(guards, 1))
+
+        with span("build.max2_per_period"):
+            # at most max games per team per slot
+            teams = {t for w in weeks for (i,j) in matches_per_week[w] for t in (i,j)}
+            # matches of every team, by week
+            team_matches = {t: [] for t in teams}
+            for (w,i,j) in p:
+                team_matches[i].append((w,i,j))
+                team_matches[j].append((w,i,j))
+            for t in teams:
+                for k in range(1, periods+1):
+                    guards = [(p[key] == k, 1) for key in team_matches[t]]
+                    solver.add(PbLe(guards, max_per_team))
+
+        if seed_phases:
+            with span("build.seed_phases"):
+                n = 2 * periods
+                schedule = greedy_schedule(n)
+                for (w,i,j), var in p.items():
+                    solver.set_initial_value(var, match_slot(schedule, i-1, j-1, n)[0] + 1)
 
     # solve
-    solver.check()
+    with span("solve"):
+        solver.check()
 
     # build as weeks x periods
     sol = []
-    try:
-        m = solver.model()
-        for w in weeks:
-            row = []
-            for k in range(1, periods+1):
-                for (a,b) in matches_per_week[w]:
-                    if m[p[w,a,b]].as_long() == k:
-                        row.append([a, b])
-                        break
-            sol.append(row)
-    except:
-        sol = None
+    with span("extract"):
+        try:
+            m = solver.model()
+            for w in weeks:
+                row = []
+                for k in range(1, periods+1):
+                    for (a,b) in matches_per_week[w]:
+                        if m[p[w,a,b]].as_long() == k:
+                            row.append([a, b])
+                            break
+                sol.append(row)
+        except:
+            sol = None
     return sol
 
 # presolve: matching and balancing
 
 def circle_matchings(n):
-    pivot, circle = n, list(range(1,n))
-    weeks = n-1
-    m = {}
-    for w in range(1, weeks+1):
-        ms = [(pivot, circle[w-1])]
-        for k in range(1, n//2):
-            i = circle[(w-1 + k) % (n-1)]
-            j = circle[(w-1 - k) % (n-1)]
-            ms.append((i,j))
-        m[w] = ms
-    return m
+    """Circle-method matches as {week: [(i, j), ...]}, 1-based (see instance.py)."""
+    return week_matchings(n, base=1)
 
 
 def home_away_balance(matches_per_week, n):
@@ -92,26 +109,34 @@ def home_away_balance(matches_per_week, n):
     return balanced
 
 
-def main():
+def main(argv=None):
     # usage: python decisional.py <-n n> <--approach_base> [--sb_disabled]
     parser = argparse.ArgumentParser(description='Decisional solver with optional SB.')
     parser.add_argument('-n', type=int, help='Number of teams (even)')
     parser.add_argument('--approach_base', help='Base name for the approach in JSON')
     parser.add_argument('--sb_disabled', action='store_true', help='Disable symmetry breaking')
-    args = parser.parse_args()
+    parser.add_argument('--seed_phases', action='store_true', help='Start from the periods of a constructive schedule')
+    add_z3_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_z3(args, formulation='smt_dec')
     
 
     n = args.n
     sb_enabled = not args.sb_disabled
     suffix = '_sb_enabled' if sb_enabled else '_sb_disabled'
-    approach = args.approach_base + suffix
+    # seeded, the model is solved by a SimpleSolver instead of card2bv or the --tactic pipeline
+    approach = args.approach_base + ('_seeded_simple' if args.seed_phases else '') + suffix
+    if not args.seed_phases:
+        approach += pipeline_name(args.n)
 
     # presolve + solve benchmark
     t0 = time.time()
-    raw = circle_matchings(n)
-    matches = home_away_balance(raw, n)
+    mark()
+    with span("circle_matchings", n=n):
+        raw = circle_matchings(n)
+        matches = home_away_balance(raw, n)
     periods = n // 2
-    sol_weeks = z3_label_periods(matches, periods, sb_enabled=sb_enabled)
+    sol_weeks = z3_label_periods(matches, periods, sb_enabled=sb_enabled, seed_phases=args.seed_phases)
     t2 = time.time()
 
     # transpose to periods x weeks
@@ -134,28 +159,15 @@ def main():
     if not optimal:
         total_time = 300
 
-    # write json
-    folder = '/res/SMT'
-    os.makedirs(folder, exist_ok=True)
-    json_path = os.path.join(folder, f'{n}.json')
-
-    # load existing data
-    if os.path.exists(json_path):
-        with open(json_path) as f:
-            data = json.load(f)
-    else:
-        data = {}
-
-    # append/update
-    data[approach] = {
-        'time': total_time,
-        'optimal': optimal,
-        'obj': obj,
-        'sol': sol_periods
-    }
-
-    with open(json_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    # record in the results store (exported to /res/SMT/<n>.json)
+    with span("write"):
+        record_result('/res/SMT', n, approach, {
+            'time': total_time,
+            'resources': usage(solver_memory_mb=z3_memory_mb()),
+            'optimal': optimal,
+            'obj': obj,
+            'sol': sol_periods
+        })
     
     if os.path.exists("/.dockerenv"):
         os.system(f"echo 'Solved {approach} for {n} teams in {total_time} seconds'")
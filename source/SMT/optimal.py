@@ -1,100 +1,149 @@
 import os
-import json
+import sys
 import time
 from z3 import *
 from collections import defaultdict
 import argparse
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import record_result
+from tracing import span
+from instance import week_matchings
+from heuristic import greedy_schedule, match_slot
+from z3_config import new_solver, pipeline_name, add_arguments as add_z3_arguments, configure as configure_z3
+from resources import mark, usage, z3_memory_mb
 
-def z3_label_periods_with_home_away(matches_per_week, periods, n, max_per_team=2, sb_enabled=True, timeout=290):
+
+def build_schedule(solver, matches_per_week, periods, max_per_team=2, sb_enabled=True):
     """
-    Build and solve the SMT optimization model with home/away balance.
+    Adds the period and home/away variables and the scheduling constraints to solver (Optimize or Solver).
     If sb_enabled is False, skip symmetry-breaking constraints.
-    Returns: timetable, home_away, team_away_counts, imbalance_sum
+    Returns: p, h, and the matches of every team as {team: [(w, i, j), ...]}
     """
     weeks = sorted(matches_per_week.keys())
     # decision vars
-    # 1) period assignment variables p[w,i,j] ∈ [1..periods]
-    p = {(w,i,j): Int(f"p_{w}_{i}_{j}")
-         for w in weeks
-         for (i,j) in matches_per_week[w]}
-    # 2) home/away indicator h[w,i,j] ∈ {0,1}: 1 if first team plays home, 0 otherwise
-    h = {(w,i,j): Int(f"h_{w}_{i}_{j}")
-         for w in weeks
-         for (i,j) in matches_per_week[w]}
-
-    opt = Optimize()
-    opt.set(timeout=timeout * 1000)
-    # domain
-    for var in p.values():
-        opt.add(var >= 1, var <= periods)
-    for var in h.values():
-        opt.add(var >= 0, var <= 1)
-
-    # symmetry breaking: optional week1 period fixing
-    if sb_enabled:
-        w1 = weeks[0]
-        for k, (i,j) in enumerate(sorted(matches_per_week[w1])):
-            opt.add(p[w1,i,j] == k+1)
-
-    # one match per slot per week
-    for w in weeks:
-        for k in range(1, periods+1):
-            guards = [(p[w,i,j] == k, 1) for (i,j) in matches_per_week[w]]
-            opt.add(PbEq(guards, 1))
-
-    # at most max games per team per slot
-    teams = {t for w in weeks for (i,j) in matches_per_week[w] for t in (i,j)}
-    for t in teams:
-        for k in range(1, periods+1):
-            guards = [(p[w,i,j] == k, 1)
-                      for w in weeks
-                      for (i,j) in matches_per_week[w]
-                      if t in (i,j)]
-            opt.add(PbLe(guards, max_per_team))
-
-    # away count and imbalance
-    away_count = {}
-    abs_diff = {}
-    for t in teams:
-        terms = []
+    with span("build.variables"):
+        # 1) period assignment variables p[w,i,j] ∈ [1..periods]
+        p = {(w,i,j): Int(f"p_{w}_{i}_{j}")
+             for w in weeks
+             for (i,j) in matches_per_week[w]}
+        # 2) home/away indicator h[w,i,j] ∈ {0,1}: 1 if first team plays home, 0 otherwise
+        h = {(w,i,j): Int(f"h_{w}_{i}_{j}")
+             for w in weeks
+             for (i,j) in matches_per_week[w]}
+
+        # domain
+        for var in p.values():
+            solver.add(var >= 1, var <= periods)
+        for var in h.values():
+            solver.add(var >= 0, var <= 1)
+
+    with span("build.symmetry_breaking"):
+        # symmetry breaking: optional week1 period fixing
+        if sb_enabled:
+            w1 = weeks[0]
+            for k, (i,j) in enumerate(sorted(matches_per_week[w1])):
+                solver.add(p[w1,i,j] == k+1)
+
+    with span("build.one_match_per_slot"):
+        # one match per slot per week
         for w in weeks:
-            for (i,j) in matches_per_week[w]:
-                if i == t:
-                    terms.append(1 - h[w,i,j])
-                elif j == t:
-                    terms.append(h[w,i,j])
-        away_count[t] = Sum(terms)
-        diff = (n - 1) - 2 * away_count[t]
-        abs_diff[t] = If(diff >= 0, diff, -diff)
-
-    # order abs_diff to minimize the maximal abs_diff later, and break abs_diff team symmetry
-    for t1, t2 in zip(sorted(teams)[:-1], sorted(teams)[1:]):
-        opt.add(abs_diff[t1] >= abs_diff[t2])
-
-    sumDif = Int('sumDif')
-    opt.add(sumDif == Sum([abs_diff[t] for t in sorted(teams)]))
-    # optional lower bound
-    opt.add(sumDif >= n)
-    # objective: minimize maximum imbalance (abs_diff of first team)
-    first_team = sorted(teams)[0]
-    opt.minimize(abs_diff[first_team])
+            for k in range(1, periods+1):
+                guards = [(p[w,i,j] == k, 1) for (i,j) in matches_per_week[w]]
+                solver.add(PbEq(guards, 1))
+
+    with span("build.max2_per_period"):
+        # at most max games per team per slot
+        teams = {t for w in weeks for (i,j) in matches_per_week[w] for t in (i,j)}
+        # matches of every team, by week
+        team_matches = {t: [] for t in teams}
+        for (w,i,j) in p:
+            team_matches[i].append((w,i,j))
+            team_matches[j].append((w,i,j))
+        for t in teams:
+            for k in range(1, periods+1):
+                guards = [(p[key] == k, 1) for key in team_matches[t]]
+                solver.add(PbLe(guards, max_per_team))
+    return p, h, team_matches
+
+
+def away_games(h, team_matches, t):
+    """Number of away games of team t, as a Z3 expression."""
+    return Sum([1 - h[w,i,j] if i == t else h[w,i,j] for (w,i,j) in team_matches[t]])
+
+
+def seed_schedule(solver, p, h, n):
+    """Starts p and h from the constructive schedule of heuristic.py."""
+    with span("build.seed_phases"):
+        schedule = greedy_schedule(n)
+        for (w,i,j) in p:
+            period, i_home = match_slot(schedule, i-1, j-1, n)
+            solver.set_initial_value(p[w,i,j], period + 1)
+            solver.set_initial_value(h[w,i,j], int(i_home))
+
+
+def extract_schedule(m, p, h, weeks):
+    """Timetable {week: {period: (i, j)}} and home/away indicators of a model."""
+    with span("extract"):
+        # extract timetable
+        timetable = {w: {} for w in weeks}
+        for (w,i,j), var in p.items():
+            slot = m[var].as_long()
+            timetable[w][slot] = (i,j)
+
+        # extract home/away
+        home_away = {(w,i,j): m[h[w,i,j]].as_long()
+                     for (w,i,j) in h}
+    return timetable, home_away
+
+
+def z3_label_periods_with_home_away(matches_per_week, periods, n, max_per_team=2, sb_enabled=True, timeout=290,
+                                    seed_phases=False):
+    """
+    Build and solve the SMT optimization model with home/away balance.
+    If sb_enabled is False, skip symmetry-breaking constraints.
+    If seed_phases is True, p and h start from the constructive schedule of heuristic.py.
+    Returns: timetable, home_away, team_away_counts, imbalance_sum
+    """
+    with span("build"):
+        weeks = sorted(matches_per_week.keys())
+        opt = Optimize()
+        opt.set(timeout=timeout * 1000)
+        p, h, team_matches = build_schedule(opt, matches_per_week, periods, max_per_team, sb_enabled)
+        teams = set(team_matches)
+
+        with span("build.balance"):
+            # away count and imbalance
+            away_count = {}
+            abs_diff = {}
+            for t in teams:
+                away_count[t] = away_games(h, team_matches, t)
+                diff = (n - 1) - 2 * away_count[t]
+                abs_diff[t] = If(diff >= 0, diff, -diff)
+
+            # order abs_diff to minimize the maximal abs_diff later, and break abs_diff team symmetry
+            for t1, t2 in zip(sorted(teams)[:-1], sorted(teams)[1:]):
+                opt.add(abs_diff[t1] >= abs_diff[t2])
+
+            sumDif = Int('sumDif')
+            opt.add(sumDif == Sum([abs_diff[t] for t in sorted(teams)]))
+            # optional lower bound
+            opt.add(sumDif >= n)
+            # objective: minimize maximum imbalance (abs_diff of first team)
+            first_team = sorted(teams)[0]
+            opt.minimize(abs_diff[first_team])
+
+        if seed_phases:
+            seed_schedule(opt, p, h, n)
 
     # solve
-    if opt.check() != sat:
+    with span("solve"):
+        status = opt.check()
+    if status != sat:
         return None, None, None, None
     m = opt.model()
 
-    # extract timetable
-    timetable = {w: {} for w in weeks}
-    for (w,i,j), var in p.items():
-        slot = m[var].as_long()
-        timetable[w][slot] = (i,j)
-
-    # extract home/away
-    home_away = {(w,i,j): m[h[w,i,j]].as_long()
-                 for (w,i,j) in h}
-
+    timetable, home_away = extract_schedule(m, p, h, weeks)
     # compute team away counts and imbalance sum (it was used for debugging only)
     team_away_counts = {t: m.evaluate(abs_diff[t]).as_long() for t in teams}
     imbalance_sum = m.evaluate(sumDif).as_long()
@@ -103,43 +152,117 @@ def z3_label_periods_with_home_away(matches_per_week, periods, n, max_per_team=2
     objective_value = m.evaluate(abs_diff[first_team]).as_long()
     return timetable, home_away, team_away_counts, objective_value
 
+
+def z3_label_periods_incremental(matches_per_week, periods, n, max_per_team=2, sb_enabled=True, timeout=290,
+                                 seed_phases=False):
+    """
+    Solves the same model as z3_label_periods_with_home_away on a single Solver instead of Optimize, by
+    tightening the bound on the maximum imbalance. A team plays n-1 games, so its imbalance is odd: every
+    bound k = 1, 3, ..., n-2 is a Boolean that limits the away games of every team to [(n-1-k)/2, (n-1+k)/2],
+    with no absolute values. Each check assumes the bound just below the incumbent, so the lemmas learned
+    by a check are kept for the next; it stops at imbalance 1, at the first unsat bound (the incumbent is
+    optimal) or when the time runs out (the incumbent is returned, not proven optimal).
+    Returns: timetable, home_away, team_imbalances, objective value, optimal, probes
+    """
+    deadline = time.time() + timeout
+    with span("build"):
+        weeks = sorted(matches_per_week.keys())
+        # Z3's default solver hands a single check to a tactic that ignores initial values
+        solver = SimpleSolver() if seed_phases else new_solver(n=n)
+        p, h, team_matches = build_schedule(solver, matches_per_week, periods, max_per_team, sb_enabled)
+
+        with span("build.balance"):
+            away_count = {t: away_games(h, team_matches, t) for t in team_matches}
+            bounds = {k: Bool(f"imbalance_le_{k}") for k in range(1, n - 1, 2)}
+            for k, bound in bounds.items():
+                solver.add(Implies(bound, And([And(away >= (n - 1 - k) // 2, away <= (n - 1 + k) // 2)
+                                               for away in away_count.values()])))
+
+        if seed_phases:
+            seed_schedule(solver, p, h, n)
+
+    incumbent = (None, None, None, None)
+    optimal = False
+    probes = []
+    k = None
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        solver.set(timeout=max(1, int(remaining * 1000)))
+        probe_start = time.perf_counter()
+        # one solve span per probe, so that extracting the incumbents is not counted as solving
+        with span("solve", k=k):
+            status = solver.check(*([bounds[k]] if k is not None else []))
+        probes.append({'k': k, 'status': str(status), 'time': round(time.perf_counter() - probe_start, 4)})
+        if status == unsat:
+            # no schedule is better than the incumbent (or there is none)
+            optimal = incumbent[0] is not None
+            break
+        if status != sat:
+            break
+        m = solver.model()
+        imbalances = {t: abs(n - 1 - 2 * m.evaluate(away).as_long()) for t, away in away_count.items()}
+        objective_value = max(imbalances.values())
+        incumbent = (*extract_schedule(m, p, h, weeks), imbalances, objective_value)
+        print(f"[Incumbent] n={n} | obj={objective_value} | time={timeout - deadline + time.time():.2f}", flush=True)
+        if objective_value == 1:
+            optimal = True
+            break
+        k = objective_value - 2
+    return (*incumbent, optimal, probes)
+
 # presolve: matching and balancing
 
 def circle_matchings(n):
-    pivot, circle = n, list(range(1, n))
-    weeks = n - 1
-    m = {}
-    for w in range(1, weeks+1):
-        ms = [(pivot, circle[w-1])]
-        for k in range(1, n//2):
-            i = circle[(w-1 + k) % (n-1)]
-            j = circle[(w-1 - k) % (n-1)]
-            ms.append((i,j))
-        m[w] = ms
-    return m
-
-def main():
+    """Circle-method matches as {week: [(i, j), ...]}, 1-based (see instance.py)."""
+    return week_matchings(n, base=1)
+
+ENGINES = ['optimize', 'incremental']
+
+
+def seeded_name(engine):
+    """Approach suffix of a seeded run: the incremental engine is then solved by a SimpleSolver, not its pipeline."""
+    return '_seeded_simple' if engine == 'incremental' else '_seeded'
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Optim. solver with home/away and optional SB.')
     parser.add_argument('-n', type=int, help='Number of teams (even)')
     parser.add_argument('--approach_base', help='Base name for the approach in JSON')
     parser.add_argument('--sb_disabled', action='store_true', help='Disable symmetry breaking')
-    args = parser.parse_args()
+    parser.add_argument('--seed_phases', action='store_true', help='Start from a constructive schedule')
+    parser.add_argument('--engine', choices=ENGINES, default='optimize',
+                        help='optimize: z3.Optimize; incremental: bound tightening on a Solver, keeping the best schedule found')
+    add_z3_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_z3(args, formulation='smt_opt')
 
     n = args.n
     sb_enabled = not args.sb_disabled
     suffix = '_sb_enabled' if sb_enabled else '_sb_disabled'
-    approach = args.approach_base + suffix
+    approach = (args.approach_base + ('_incremental' if args.engine == 'incremental' else '')
+                + (seeded_name(args.engine) if args.seed_phases else '') + suffix)
+    if args.engine == 'incremental' and not args.seed_phases:
+        approach += pipeline_name(n)
 
     # benchmark start
     t0 = time.time()
-    matches = circle_matchings(n)
+    mark()
+    with span("circle_matchings", n=n):
+        matches = circle_matchings(n)
     periods = n // 2
-    timetable, home_away, counts, obj = z3_label_periods_with_home_away(
-        matches, periods, n, sb_enabled=sb_enabled)
+    probes = None
+    if args.engine == 'incremental':
+        timetable, home_away, counts, obj, optimal, probes = z3_label_periods_incremental(
+            matches, periods, n, sb_enabled=sb_enabled, seed_phases=args.seed_phases)
+    else:
+        timetable, home_away, counts, obj = z3_label_periods_with_home_away(
+            matches, periods, n, sb_enabled=sb_enabled, seed_phases=args.seed_phases)
+        optimal = timetable is not None
     t2 = time.time()
 
     total_time = min(int(t2 - t0), 300)
-    optimal = timetable is not None
 
     if not optimal:
         total_time = 300
@@ -161,24 +284,16 @@ def main():
     except:
         pass
 
-    # write JSON
-    folder = '/res/SMT'
-    os.makedirs(folder, exist_ok=True)
-    json_path = os.path.join(folder, f'{n}.json')
-    if os.path.exists(json_path):
-        with open(json_path) as f:
-            data = json.load(f)
-    else:
-        data = {}
-
-    data[approach] = {
-        'time': total_time,
-        'optimal': optimal,
-        'obj': obj,
-        'sol': sol_periods
-    }
-    with open(json_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    # record in the results store (exported to /res/SMT/<n>.json)
+    with span("write"):
+        record_result('/res/SMT', n, approach, {
+            'time': total_time,
+            'resources': usage(solver_memory_mb=z3_memory_mb()),
+            'optimal': optimal,
+            'obj': obj,
+            'sol': sol_periods,
+            **({'probes': probes} if probes is not None else {})
+        })
     
     if os.path.exists("/.dockerenv"):
         os.system(f"echo 'Solved {approach} for {n} teams in {total_time} seconds'")
@@ -0,0 +1,338 @@
+"""
+End-to-end benchmark of the four formulations.
+
+Each (formulation, n) is run `--repeat` times, every repetition in a fresh process, recording the
+build, solve and extraction time of the model (see tracing.py), the CPU time and the peak memory
+(see resources.py).
+Results can be stored as a named baseline and compared against a previous one: a phase is flagged
+as a regression when it is slower by more than `--threshold` and the slowdown is statistically
+significant (one-sided Mann-Whitney U test).
+
+With `--pipelines`, every run is repeated with each Z3 tactic pipeline (see z3_config.py), and the fastest
+pipeline of every (formulation, n) is printed; `--save_pipelines` stores it as the pipeline that
+`--tactic auto` uses for that formulation and size.
+"""
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import statistics
+import multiprocessing
+from functools import lru_cache
+
+import tracing
+import resources
+import z3_config
+from runner import load_entry_point
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(SRC_DIR, 'benchmarks')
+METRICS = ['build', 'solve', 'extract', 'total']
+# recorded but not tested for regressions
+RESOURCES = ['cpu_user', 'cpu_sys', 'peak_rss_mb', 'solver_peak_rss_mb']
+
+
+def _bench_sat(module, n, timeout):
+    result = module.solve_sts_optimization(n, timeout, module.heule_exactly_one, module.at_most_k_totalizer,
+                                           symmetry_breaking=True)
+    return bool(result['sol'])
+
+
+def _bench_sat_direct(module, n, timeout):
+    result = module.solve_sts_optimization(n, timeout, module.heule_exactly_one, module.at_most_k_totalizer,
+                                           symmetry_breaking=True, balance_mode='direct')
+    return bool(result['sol'])
+
+
+def _bench_sat_decoupled(module, n, timeout):
+    result = module.solve_sts_decoupled(n, timeout, module.heule_exactly_one, module.at_most_k_totalizer,
+                                        symmetry_breaking=True)
+    return bool(result['sol'])
+
+
+def _bench_sat_incremental(module, n, timeout):
+    result = module.solve_sts_optimization_incremental(n, timeout, module.heule_exactly_one, module.at_most_k_totalizer,
+                                                       symmetry_breaking=True)
+    return bool(result['sol'])
+
+
+def _bench_sat_seeded(module, n, timeout):
+    result = module.solve_sts_optimization(n, timeout, module.heule_exactly_one, module.at_most_k_totalizer,
+                                           symmetry_breaking=True, seed_phases=True)
+    return bool(result['sol'])
+
+
+def _bench_smt(module, n, timeout):
+    timetable, _, _, _ = module.z3_label_periods_with_home_away(module.circle_matchings(n), n // 2, n, timeout=timeout)
+    return timetable is not None
+
+
+def _bench_smt_incremental(module, n, timeout):
+    *_, optimal, _ = module.z3_label_periods_incremental(module.circle_matchings(n), n // 2, n, timeout=timeout)
+    return optimal
+
+
+def _bench_smt_decisional(module, n, timeout):
+    matches = module.home_away_balance(module.circle_matchings(n), n)
+    return module.z3_label_periods(matches, n // 2, timeout=timeout) is not None
+
+
+def _bench_smt_seeded(module, n, timeout):
+    timetable, _, _, _ = module.z3_label_periods_with_home_away(module.circle_matchings(n), n // 2, n, timeout=timeout,
+                                                                seed_phases=True)
+    return timetable is not None
+
+
+def _bench_cp(module, n, timeout):
+    result = module.solve_cp_optimization(n, timeout, 'chuffed', 'ro_Luby', 'SB')
+    return bool(result['sol'])
+
+
+def _bench_mip(module, n, timeout):
+    solver = 'gurobi' if os.path.exists('/opt/gurobi/gurobi.lic') else 'cbc'
+    result, solution = module.solveCircleMatching(n, optimization=True, ic=True, solver=solver, timeout=timeout)
+    return int(solution.sum()) == n * (n - 1) // 2
+
+
+# Benchmarked configuration of each formulation: (script, function running it, formulation name the script
+# passes to z3_config.configure, None when its solver takes no tactic pipeline)
+BENCH_CONFIGS = {
+    'sat': ('SAT/main.py', _bench_sat, 'sat'),           # optimization, heule + totalizer, symmetry breaking
+    'sat_inc': ('SAT/main.py', _bench_sat_incremental, None),  # the same, on a single incremental solver
+    'sat_direct': ('SAT/main.py', _bench_sat_direct, 'sat'),    # the same, balance counted over home_vars
+    'sat_decoupled': ('SAT/main.py', _bench_sat_decoupled, 'sat'),  # the same, home/away solved apart from the periods
+    'sat_seeded': ('SAT/main.py', _bench_sat_seeded, None),    # the same, starting from the schedule of heuristic.py
+    'smt': ('SMT/optimal.py', _bench_smt, None),        # Optimize with symmetry breaking
+    'smt_seeded': ('SMT/optimal.py', _bench_smt_seeded, None),  # the same, starting from the schedule of heuristic.py
+    'smt_inc': ('SMT/optimal.py', _bench_smt_incremental, 'smt_opt'),  # the same model, bound tightening on a Solver
+    'smt_dec': ('SMT/decisional.py', _bench_smt_decisional, 'smt_dec'),  # decisional, with symmetry breaking
+    'cp': ('CP/main.py', _bench_cp, None),              # chuffed, ro_Luby, symmetry breaking
+    'mip': ('MIP/circleMatching.py', _bench_mip, None), # circle matching with implied constraints
+}
+
+
+def _run_once(conn, formulation, n, timeout, pipeline=None):
+    """Body of a benchmark process: one timed run of a formulation, with the given Z3 pipeline (None for its own)."""
+    script, bench, z3_formulation = BENCH_CONFIGS[formulation]
+    script = os.path.join(SRC_DIR, script)
+    os.chdir(os.path.dirname(script))
+    module = load_entry_point(script, {})
+    z3_config.configure(tactic=pipeline, formulation=z3_formulation)
+
+    resources.mark()
+    tracing.reset()
+    start = time.perf_counter()
+    solved = bench(module, n, timeout)
+    total = time.perf_counter() - start
+
+    sample = {phase: tracing.phase_times().get(phase, 0.0) for phase in METRICS[:-1]}
+    sample['total'] = total
+    usage = resources.usage()
+    sample.update({metric: usage[metric] for metric in RESOURCES})
+    sample['solved'] = solved
+    conn.send(sample)
+
+
+def run_benchmark(formulations, n_list, repeat, timeout, pipeline=None):
+    """
+    Runs every (formulation, n) `repeat` times, each in a fresh process, returning the samples.
+    With a Z3 pipeline, the keys are suffixed with its name.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for formulation in formulations:
+        for n in n_list:
+            key = f"{formulation}/n={n}" + (f"/{pipeline}" if pipeline else '')
+            samples = {metric: [] for metric in METRICS + RESOURCES + ['solved']}
+            for _ in range(repeat):
+                parent_conn, child_conn = context.Pipe()
+                process = context.Process(target=_run_once, args=(child_conn, formulation, n, timeout, pipeline))
+                process.start()
+                sample = parent_conn.recv() if parent_conn.poll(timeout + 60) else None
+                process.join()
+                if sample is None:
+                    print(f"[WARNING] {key}: benchmark process failed")
+                    break
+                if not sample['solved']:
+                    print(f"[WARNING] {key}: no solution within the timeout")
+                for metric, value in sample.items():
+                    samples[metric].append(value)
+            results[key] = samples
+            print_summary(key, samples)
+    return results
+
+
+def fastest_pipelines(results, formulations, n_list, pipelines):
+    """{formulation: {n: pipeline}} with the smallest median total time among the pipelines that solved every run."""
+    fastest = {}
+    for formulation in formulations:
+        for n in n_list:
+            times = {}
+            for pipeline in pipelines:
+                samples = results.get(f"{formulation}/n={n}/{pipeline}")
+                if samples and samples['total'] and all(samples['solved']) and len(samples['solved']) == len(samples['total']):
+                    times[pipeline] = statistics.median(samples['total'])
+            if times:
+                best = min(times, key=times.get)
+                fastest.setdefault(formulation, {})[n] = best
+                print(f"{formulation}/n={n}: fastest pipeline {best} ({times[best] * 1000:.1f} ms), "
+                      + ", ".join(f"{p} {t * 1000:.1f} ms" for p, t in sorted(times.items(), key=lambda item: item[1])))
+    return fastest
+
+
+def save_pipelines(fastest, path=z3_config.PIPELINES_PATH):
+    """
+    Merges the fastest pipelines into the table read by --tactic auto, under the formulation name of each
+    benchmarked configuration (the first one benchmarked when several share a name).
+    """
+    try:
+        with open(path) as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        table = {'pipelines': {}}
+    table['created'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    table['machine'] = {'processor': platform.processor(), 'cpus': os.cpu_count()}
+    saved = {}
+    for formulation, by_n in fastest.items():
+        z3_formulation = BENCH_CONFIGS[formulation][2]
+        if z3_formulation in saved:
+            print(f"[WARNING] {formulation}: the pipelines of {saved[z3_formulation]} are saved for {z3_formulation}")
+            continue
+        saved[z3_formulation] = formulation
+        table['pipelines'].setdefault(z3_formulation, {}).update({str(n): pipeline for n, pipeline in by_n.items()})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(table, f, indent=1)
+    print(f"Pipelines saved to {path}")
+
+
+def print_summary(key, samples):
+    if not samples['total']:
+        return
+    phases = " | ".join(f"{metric} {statistics.median(samples[metric]) * 1000:.3f} ms" for metric in METRICS)
+    print(f"{key:<12} {phases} | cpu {statistics.median(samples['cpu_user']):.2f}s user "
+          f"{statistics.median(samples['cpu_sys']):.2f}s sys | peak {max(samples['peak_rss_mb']):.1f} MB "
+          f"(solver {max(samples['solver_peak_rss_mb']):.1f} MB) | {len(samples['total'])} runs", flush=True)
+
+
+@lru_cache(maxsize=None)
+def _u_distribution(m, n):
+    """Number of arrangements of two samples of sizes m and n for each value of the Mann-Whitney U statistic."""
+    if m == 0 or n == 0:
+        return (1,)
+    counts = [0] * (m * n + 1)
+    for u, c in enumerate(_u_distribution(m - 1, n)):
+        counts[u + n] += c
+    for u, c in enumerate(_u_distribution(m, n - 1)):
+        counts[u] += c
+    return tuple(counts)
+
+
+def mann_whitney_greater(new, base):
+    """
+    One-sided p-value of the Mann-Whitney U test for `new` being stochastically greater than `base`.
+    Exact for small samples, normal approximation otherwise.
+    """
+    m, n = len(new), len(base)
+    if m == 0 or n == 0:
+        return 1.0
+    u = sum(1.0 if x > y else 0.5 if x == y else 0.0 for x in new for y in base)
+    if m * n <= 400:
+        counts = _u_distribution(m, n)
+        return sum(counts[math.ceil(u):]) / math.comb(m + n, m)
+    mean = m * n / 2
+    sd = math.sqrt(m * n * (m + n + 1) / 12)
+    z = (u - 0.5 - mean) / sd
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline, current, threshold=0.05, alpha=0.05):
+    """Prints the median change of each phase and returns the regressions found."""
+    regressions = []
+    for key, samples in current['results'].items():
+        base_samples = baseline['results'].get(key)
+        if not base_samples:
+            continue
+        for metric in METRICS:
+            new, base = samples.get(metric, []), base_samples.get(metric, [])
+            if not new or not base:
+                continue
+            base_median, new_median = statistics.median(base), statistics.median(new)
+            change = (new_median - base_median) / base_median if base_median > 0 else 0.0
+            p_value = mann_whitney_greater(new, base)
+            regression = change > threshold and p_value < alpha
+            if regression:
+                regressions.append((key, metric, change, p_value))
+            print(f"{key:<12} {metric:<8} {base_median * 1000:>12.3f} ms -> {new_median * 1000:>12.3f} ms "
+                  f"({change:+.1%}, p={p_value:.3f}){'  REGRESSION' if regression else ''}")
+    return regressions
+
+
+def load_baseline(name, baseline_dir=BASELINE_DIR):
+    path = name if name.endswith('.json') else os.path.join(baseline_dir, f"{name}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(name, data, baseline_dir=BASELINE_DIR):
+    os.makedirs(baseline_dir, exist_ok=True)
+    path = os.path.join(baseline_dir, f"{name}.json")
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1)
+    print(f"Baseline saved to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the STS formulations and detect regressions.")
+    parser.add_argument("-f", nargs='+', choices=list(BENCH_CONFIGS), default=list(BENCH_CONFIGS), help="Formulations to benchmark")
+    parser.add_argument("-n", type=int, nargs='+', default=[6, 8, 10], help="Problem sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of every (formulation, n)")
+    parser.add_argument("-t", "--timeout", type=int, default=300, help="Timeout in seconds of each run")
+    parser.add_argument("--save", help="Store the results as a baseline with this name")
+    parser.add_argument("--compare", help="Compare the results against this stored baseline")
+    parser.add_argument("--baseline_dir", default=BASELINE_DIR, help="Directory of the stored baselines")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Relative slowdown of the median flagged as a regression")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level of the regression test")
+    parser.add_argument("--pipelines", nargs='+', metavar="PIPELINE",
+                        help=f"Run every formulation with each of these Z3 pipelines ({', '.join(z3_config.PIPELINES)}, "
+                             "or tactics separated by commas) and print the fastest")
+    parser.add_argument("--save_pipelines", action='store_true',
+                        help="Store the fastest pipelines as the ones used by --tactic auto")
+    args = parser.parse_args(argv)
+
+    if args.pipelines:
+        fixed = [formulation for formulation in args.f if BENCH_CONFIGS[formulation][2] is None]
+        if fixed:
+            print(f"[WARNING] {', '.join(fixed)}: the solver takes no tactic pipeline, skipped")
+        args.f = [formulation for formulation in args.f if formulation not in fixed]
+        results = {}
+        for pipeline in args.pipelines:
+            results.update(run_benchmark(args.f, args.n, args.repeat, args.timeout, pipeline))
+        fastest = fastest_pipelines(results, args.f, args.n, args.pipelines)
+        if args.save_pipelines:
+            save_pipelines(fastest)
+        return
+
+    data = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'machine': {'node': platform.node(), 'processor': platform.processor(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'repeat': args.repeat,
+        'timeout': args.timeout,
+        'results': run_benchmark(args.f, args.n, args.repeat, args.timeout),
+    }
+    if args.save:
+        save_baseline(args.save, data, args.baseline_dir)
+    if args.compare:
+        regressions = compare(load_baseline(args.compare, args.baseline_dir), data, args.threshold, args.alpha)
+        if regressions:
+            print(f"{len(regressions)} significant slowdowns against baseline '{args.compare}'")
+            sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Constructive schedule on the circle-method instance, used to seed the solvers (--seed_phases).
+
+It is computed in milliseconds, for the pairs of pair_list (see instance.py):
+
+    period   (n(n-1)/2,)   0-based period of every match
+    home     (n(n-1)/2,)   True when the lower team of the pair plays at home
+    excess   int           games over the limit of two per team and period, 0 if the schedule is a solution
+
+The periods are the positions of the matches in the circle method, which already puts every team at most twice
+in the same period, except the pivot team n-1, always at position 0. So the match of the pivot in every week is
+swapped with the match of another position, chosen by a short min-conflicts search: the schedule is a solution
+for some n, and a few games away from one for the others.
+
+The venues follow an Euler tour of the complete graph, with the matches of one week doubled so that every degree
+is even: every team leaves the tour as often as it enters it, so without the doubled match its home/away
+imbalance is 1, the optimum.
+"""
+import random
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from instance import circle_instance, pair_index
+
+Schedule = namedtuple('Schedule', ['period', 'home', 'excess'])
+
+
+def _week_periods(periods, q):
+    """Period of every circle position of a week in which the pivot match is swapped with position q."""
+    order = np.arange(periods)
+    order[0], order[q] = q, 0
+    return order
+
+
+def _assign_periods(n, steps, seed):
+    """Periods of the matches, as (n-1, n/2) by week and circle position, and their excess."""
+    pairs = circle_instance(n).pairs
+    periods = n // 2
+    rng = random.Random(seed)
+    swaps = [w % periods for w in range(n - 1)]
+    counts = np.zeros((n, periods), dtype=int)
+
+    def place(w, delta):
+        order = _week_periods(periods, swaps[w])
+        np.add.at(counts, (pairs[w, :, 0], order), delta)
+        np.add.at(counts, (pairs[w, :, 1], order), delta)
+
+    def excess():
+        return int(np.maximum(counts - 2, 0).sum())
+
+    for w in range(n - 1):
+        place(w, 1)
+    best = (excess(), list(swaps))
+    for _ in range(steps):
+        if best[0] == 0:
+            break
+        # move the pivot match of a random week to the position with the fewest games over the limit
+        w = rng.randrange(n - 1)
+        place(w, -1)
+        scores = []
+        for q in range(periods):
+            order = _week_periods(periods, q)
+            scores.append(int(np.maximum(counts[pairs[w, :, 0], order] - 1, 0).sum()
+                              + np.maximum(counts[pairs[w, :, 1], order] - 1, 0).sum()))
+        swaps[w] = rng.choice([q for q, score in enumerate(scores) if score == min(scores)])
+        place(w, 1)
+        if excess() < best[0]:
+            best = (excess(), list(swaps))
+
+    score, swaps = best
+    return np.array([_week_periods(periods, q) for q in swaps]), score
+
+
+def _euler_orientation(n):
+    """{(i, j): True if i plays at home}, from an Euler tour of K_n with the matches of week 0 doubled."""
+    adjacency = [set(range(n)) - {t} for t in range(n)]
+    doubled = [None] * n
+    for i, j in circle_instance(n).sorted_pairs[0].tolist():
+        doubled[i], doubled[j] = j, i
+    home = {}
+    # Hierholzer's algorithm: every closed walk is followed from the home team to the away team of each edge
+    stack = [0]
+    while stack:
+        t = stack[-1]
+        if adjacency[t]:
+            u = adjacency[t].pop()
+            adjacency[u].discard(t)
+            home[(min(t, u), max(t, u))] = t < u
+            stack.append(u)
+        elif doubled[t] is not None:
+            u = doubled[t]
+            doubled[t] = doubled[u] = None
+            stack.append(u)
+        else:
+            stack.pop()
+    return home
+
+
+@lru_cache(maxsize=None)
+def greedy_schedule(n, steps=300, seed=0):
+    """The constructive schedule for n teams (n even), as a Schedule of arrays indexed like pair_list."""
+    if n < 2 or n % 2 != 0:
+        raise ValueError("The number of teams must be even.")
+    instance = circle_instance(n)
+    week_periods, excess = _assign_periods(n, steps, seed)
+    pair_periods = {}
+    for w, matches in enumerate(instance.sorted_pairs.tolist()):
+        for position, (i, j) in enumerate(matches):
+            pair_periods[(i, j)] = int(week_periods[w, position])
+    venues = _euler_orientation(n)
+    pairs = [tuple(pair) for pair in instance.pair_list.tolist()]
+    period = np.array([pair_periods[pair] for pair in pairs])
+    home = np.array([venues[pair] for pair in pairs])
+    period.flags.writeable = home.flags.writeable = False
+    return Schedule(period=period, home=home, excess=excess)
+
+
+def match_slot(schedule, i, j, n):
+    """(period, True if i plays at home) of the match of teams i and j (0-based, in either order) in a Schedule."""
+    index = pair_index(min(i, j), max(i, j), n)
+    return int(schedule.period[index]), bool(schedule.home[index]) == (i < j)
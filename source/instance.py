@@ -0,0 +1,98 @@
+"""
+Circle-method instance shared by all formulations.
+
+The circle method fixes the matches of every week in advance, the formulations then only assign periods
+and home/away. For each n the instance is computed once per process, and cached on disk in STS_CACHE_DIR
+(default source/.cache), as read-only numpy arrays with 0-based teams and weeks:
+
+    pairs          (n-1, n/2, 2)   matches of every week, in the order and orientation of the circle method
+    sorted_pairs   (n-1, n/2, 2)   the same matches with the lower team first
+    week_of_pair   (n, n)          week in which two teams meet (-1 on the diagonal)
+    opponents      (n, n-1)        opponent of every team in every week
+    pair_list      (n(n-1)/2, 2)   all pairs i < j, in lexicographic order
+    pair_week      (n(n-1)/2,)     week of every pair of pair_list
+    team_pairs     (n, n-1)        index in pair_list of the match of every team in every week
+"""
+import os
+import tempfile
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+CACHE_DIR = os.environ.get('STS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+# bumped whenever the arrays change, so stale cache files are ignored
+CACHE_VERSION = 1
+
+FIELDS = ['pairs', 'sorted_pairs', 'week_of_pair', 'opponents', 'pair_list', 'pair_week', 'team_pairs']
+Instance = namedtuple('Instance', ['n'] + FIELDS)
+
+
+def pair_index(i, j, n):
+    """Index of the pair i < j in pair_list (works element-wise on arrays)."""
+    return i * (2 * n - i - 1) // 2 + (j - i - 1)
+
+
+def _compute(n):
+    weeks = np.arange(n - 1)[:, None]
+    k = np.arange(1, n // 2)[None, :]
+    pivot = np.stack([np.full(n - 1, n - 1), np.arange(n - 1)], axis=1)[:, None, :]
+    circle = np.stack(np.broadcast_arrays((weeks + k) % (n - 1), (weeks - k) % (n - 1)), axis=2)
+    pairs = np.concatenate([pivot, circle], axis=1)
+    sorted_pairs = np.sort(pairs, axis=2)
+
+    week_of_pair = np.full((n, n), -1)
+    week_idx = np.broadcast_to(np.arange(n - 1)[:, None], pairs.shape[:2])
+    week_of_pair[pairs[..., 0], pairs[..., 1]] = week_idx
+    week_of_pair[pairs[..., 1], pairs[..., 0]] = week_idx
+
+    opponents = np.zeros((n, n - 1), dtype=int)
+    opponents[pairs[..., 0], week_idx] = pairs[..., 1]
+    opponents[pairs[..., 1], week_idx] = pairs[..., 0]
+
+    pair_list = np.argwhere(np.triu(np.ones((n, n), dtype=bool), 1))
+    pair_week = week_of_pair[pair_list[:, 0], pair_list[:, 1]]
+    teams = np.arange(n)[:, None]
+    team_pairs = pair_index(np.minimum(teams, opponents), np.maximum(teams, opponents), n)
+
+    return {'pairs': pairs, 'sorted_pairs': sorted_pairs, 'week_of_pair': week_of_pair, 'opponents': opponents,
+            'pair_list': pair_list, 'pair_week': pair_week, 'team_pairs': team_pairs}
+
+
+def _cache_path(n):
+    return os.path.join(CACHE_DIR, f"circle_v{CACHE_VERSION}_{n}.npz")
+
+
+def _save(path, arrays):
+    """Atomically writes the cache file; a read-only or missing cache directory is not an error."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.circle_', suffix='.npz', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def circle_instance(n):
+    """The circle-method instance for n teams (n even)."""
+    if n < 2 or n % 2 != 0:
+        raise ValueError("The number of teams must be even.")
+    path = _cache_path(n)
+    try:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in FIELDS}
+    except (OSError, KeyError, ValueError):
+        arrays = _compute(n)
+        _save(path, arrays)
+    for array in arrays.values():
+        array.flags.writeable = False
+    return Instance(n=n, **arrays)
+
+
+def week_matchings(n, base=0):
+    """The matches as {week: [(i, j), ...]}, with teams and weeks counted from `base`."""
+    return {w + base: [(i + base, j + base) for i, j in matches]
+            for w, matches in enumerate(circle_instance(n).pairs.tolist())}
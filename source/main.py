@@ -3,6 +3,10 @@ import argparse
 import sys
 from typing import Set, List
 import subprocess
+from runner import (expand_jobs, run_jobs, schedule_jobs, portfolio_jobs, selected_jobs, race, drop_options,
+                    DEFAULT_TIMEOUT, SMT_OPTIMAL_OPTIONS)
+from selector import select
+from tracing import TRACE_ENV, merge
 
 def parse_n_teams(n_input: str) -> List[int]:
     """
@@ -173,11 +177,12 @@ def run_smt(n_teams: int | str, extra_args_str: str, config: dict):
     
     solver_args_filtered = [arg for arg in extra_args_list if arg not in ['--run_decisional', '--run_optimization', '--all']]
     solver_args_str_filtered = " ".join(solver_args_filtered)
+    decisional_args_str = " ".join(drop_options(solver_args_filtered, SMT_OPTIMAL_OPTIONS))
     
     if run_all:
         for n in n_teams:
             if run_decisional or run_both:
-                command = build_command(config['main_file_dec'], n, solver_args_str_filtered, "--approach_base z3_decisional", config['default_range'])
+                command = build_command(config['main_file_dec'], n, decisional_args_str, "--approach_base z3_decisional", config['default_range'])
                 os.system(command)
             if run_optimal or run_both:
                 command = build_command(config['main_file_opt'], n, solver_args_str_filtered, "--approach_base z3_optimal", config['default_range'])
@@ -185,14 +190,73 @@ def run_smt(n_teams: int | str, extra_args_str: str, config: dict):
     else:
         for n in n_teams:
             if run_decisional or run_both:
-                command = build_command(config['main_file_dec'], n, solver_args_str_filtered, "--approach_base z3_decisional", config['default_range'])
+                command = build_command(config['main_file_dec'], n, decisional_args_str, "--approach_base z3_decisional", config['default_range'])
                 os.system(command)
             if run_optimal or run_both:
                 command = build_command(config['main_file_opt'], n, solver_args_str_filtered, "--approach_base z3_optimal", config['default_range'])
                 os.system(command)
     return
-    
-   
+
+def run_parallel(models: dict, selected: List[str], n_teams: int | str, extra_args_str: str, args):
+    """Expands the selected formulations into independent jobs and runs them on a worker pool."""
+    jobs = []
+    for model_name in selected:
+        config = models[model_name]
+        n_list = parse_n_teams(config['default_range'] if n_teams == 'all' else n_teams)
+        jobs += expand_jobs(model_name, n_list, extra_args_str.split(), config)
+    if args.schedule == 'grid':
+        run_jobs(jobs, workers=args.jobs or 1, job_timeout=args.job_timeout, pin_cpus=args.pin_cpus,
+                 resume=not args.no_resume, warm=args.warm)
+    else:
+        schedule_jobs(jobs, workers=args.jobs or 1, strategy=args.schedule, budget=args.budget,
+                      job_timeout=args.job_timeout, pin_cpus=args.pin_cpus, resume=not args.no_resume, warm=args.warm)
+    return
+
+def run_race(models: dict, n_teams: str, args):
+    """Races the best configuration of every formulation on each n, keeping the first proven-optimal schedule."""
+    for n in parse_n_teams(n_teams):
+        os.system(f"echo '--- racing formulations for n={n} ---'")
+        winner = race(portfolio_jobs(n, models), timeout=args.job_timeout, pin_cpus=args.pin_cpus)
+        if winner is None:
+            print(f"[Race] n={n} | no formulation proved an optimal schedule")
+            continue
+        output = winner['output'].strip()
+        if output:
+            print(output)
+        print(f"[Race] n={n} | winner={winner['formulation']} ({winner['approach']}) | time={winner['elapsed']:.2f}")
+    return
+
+def run_select(models: dict, formulations: List[str], n_teams: str, extra_args_str: str, args):
+    """Runs only the configurations predicted fastest on each n by the selector, racing them when more than one."""
+    mode = 'decisional' if '--run_decisional' in extra_args_str.split() else 'optimization'
+    res_dir = os.path.dirname(models['sat']['res_dir'])
+    for n in parse_n_teams(n_teams):
+        choices = select(n, formulations, mode, top=args.select, res_dir=res_dir, timeout=DEFAULT_TIMEOUT)
+        if not choices:
+            print(f"[Select] n={n} | no results in {res_dir} to select a configuration from")
+            continue
+        for predicted, formulation, approach, _ in choices:
+            estimate = f"{predicted:.1f}s" if predicted < float('inf') else "a timeout (largest solved n first)"
+            print(f"[Select] n={n} | {formulation} {approach} | predicted {estimate}")
+        jobs = selected_jobs(n, [choice[1:] for choice in choices], models)
+        winner = race(jobs, timeout=args.job_timeout, pin_cpus=args.pin_cpus)
+        if winner is None:
+            print(f"[Select] n={n} | no selected configuration solved the instance")
+            continue
+        output = winner['output'].strip()
+        if output:
+            print(output)
+        print(f"[Select] n={n} | solved by {winner['formulation']} ({winner['approach']}) | time={winner['elapsed']:.2f}")
+    return
+
+
+def write_trace(args):
+    """Merges the per-process traces of the run into <trace dir>/trace.json."""
+    if args.trace and os.path.isdir(args.trace):
+        output = os.path.join(args.trace, 'trace.json')
+        count = merge(args.trace, output)
+        print(f"Trace with {count} spans written to {output}")
+
 
 def main():
     parser = argparse.ArgumentParser(description="Sport Tournament Scheduling.")
@@ -202,29 +266,64 @@ def main():
     
     parser.add_argument("-n", type=str, help="Problem size(s) to run")
     parser.add_argument("--run_all_sizes", action="store_true", help="Run all problem sizes for the specified formulation")
+
+    parser.add_argument("-j", "--jobs", type=int, help="Run every (formulation, n, configuration) as an independent job on this many parallel workers")
+    parser.add_argument("--job_timeout", type=float, default=600, help="Wall-clock limit in seconds for each parallel job")
+    parser.add_argument("--pin_cpus", action="store_true", help="Pin each parallel worker to its own CPU")
+    parser.add_argument("--warm", action="store_true", help="Run jobs inside long-lived workers with the solver libraries preloaded")
+    parser.add_argument("--no_resume", action="store_true", help="Re-run jobs even if results with identical settings are already stored")
+    parser.add_argument("--race", action="store_true", help="Race the best configuration of every formulation on each n and keep the first proven-optimal schedule")
+    parser.add_argument("--select", type=int, nargs='?', const=1, metavar="K",
+                        help="Run only the K configurations (default 1) predicted fastest on each n from the stored results, of the formulation given with -f or of all")
+    parser.add_argument("--schedule", choices=['grid', 'escalate', 'bisect'], default='grid',
+                        help="Run every n of the range (grid), or per configuration climb n until the first timeout (escalate) or binary search the largest solvable n (bisect)")
+    parser.add_argument("--budget", type=float, help="Wall-clock budget in seconds of an escalate/bisect sweep")
+    parser.add_argument("--trace", help="Record the phases of every run in this directory as a Chrome trace (trace.json)")
     
     args, extra_args = parser.parse_known_args()
     extra_args_str = " ".join(extra_args)
 
     handle_gurobi_license()
 
+    if args.trace:
+        # inherited by every run, see tracing.py
+        args.trace = os.path.abspath(args.trace)
+        os.makedirs(args.trace, exist_ok=True)
+        os.environ[TRACE_ENV] = args.trace
+
     models = {
-        'cp': {'path': '/src/CP', 'main_file': '/src/CP/main.py', 'default_range': '2-18', 'run_func': run_cp},
-        'sat': {'path': '/src/SAT', 'main_file': '/src/SAT/main.py', 'default_range': '2-20', 'run_func': run_sat},
-        'smt': {'path': '/src/SMT', 'main_file_dec': '/src/SMT/decisional.py', 'main_file_opt': '/src/SMT/optimal.py', 'default_range': '6-20', 'run_func': run_smt},
-        'mip': {'path': '/src/MIP', 'main_file': '/src/MIP/main.py', 'default_range': '6-18', 'run_func': run_mip},
+        'cp': {'path': '/src/CP', 'main_file': '/src/CP/main.py', 'res_dir': '/res/CP', 'default_range': '2-18', 'run_func': run_cp},
+        'sat': {'path': '/src/SAT', 'main_file': '/src/SAT/main.py', 'res_dir': '/res/SAT', 'default_range': '2-20', 'run_func': run_sat},
+        'smt': {'path': '/src/SMT', 'main_file_dec': '/src/SMT/decisional.py', 'main_file_opt': '/src/SMT/optimal.py', 'res_dir': '/res/SMT', 'default_range': '6-20', 'run_func': run_smt},
+        'mip': {'path': '/src/MIP', 'main_file': '/src/MIP/main.py', 'res_dir': '/res/MIP', 'default_range': '6-18', 'run_func': run_mip},
     }
     
     n_to_run = args.n
     if args.run_all_sizes:
         n_to_run = 'all'
 
+    if args.race:
+        if args.f or args.run_all_formulations or not args.n:
+            print("[ERROR] --race runs every formulation: specify only -n.")
+            sys.exit(1)
+        run_race(models, args.n, args)
+        write_trace(args)
+        return
+
+    if args.select:
+        if args.run_all_formulations or not args.n:
+            print("[ERROR] --select picks the configurations itself: specify -n, and optionally -f.")
+            sys.exit(1)
+        run_select(models, [args.f] if args.f else list(models), args.n, extra_args_str, args)
+        write_trace(args)
+        return
+
     if args.run_all_formulations:
         if args.f or args.n or args.run_all_sizes or (len(extra_args) > 0 and '--help' not in extra_args_str):
             print("[ERROR] Arguments are not allowed with --run_all_formulations.")
             sys.exit(1)
-        for model_name, config in models.items():
-            config['run_func'](config['default_range'], "--all", config)
+        # always expanded into jobs, so that configurations already solved with identical settings are skipped
+        run_parallel(models, list(models), 'all', "--all", args)
     else:
         if not args.f and not '--help' in extra_args_str:
             print("[ERROR] You must specify a formulation with -f or use --run_all_formulations.")
@@ -234,8 +333,12 @@ def main():
             print(f"[ERROR] Please specify -n, --run_all_sizes, or --all for formulation {args.f}.")
             sys.exit(1)
         
-        config = models[args.f]
-        config['run_func'](n_to_run, extra_args_str, config)
+        if (args.jobs or args.schedule != 'grid') and '--help' not in extra_args_str:
+            run_parallel(models, [args.f], n_to_run or 'all', extra_args_str, args)
+        else:
+            config = models[args.f]
+            config['run_func'](n_to_run, extra_args_str, config)
+    write_trace(args)
     return
 
 if __name__ == '__main__':
@@ -0,0 +1,89 @@
+"""
+Resource accounting shared by all formulations.
+
+A run calls `mark()` when it starts; `usage()` then returns the resources spent since, stored as the
+"resources" field of each result next to "time":
+    cpu_user, cpu_sys     CPU seconds in user and kernel mode, of this process and of the solver subprocesses
+    peak_rss_mb           peak resident memory of this process (which includes Z3, as it runs in-process)
+    solver_peak_rss_mb    largest peak resident memory of the solver subprocesses (minizinc, fzn-gecode, cbc, ...),
+                          since the start of the process: the kernel does not allow resetting it
+    solver_memory_mb      peak memory reported by the solver itself, None if it reports none
+
+A run in a worker thread (SAT --threads) is accounted on its own: its CPU time is that of the thread,
+in which Z3 solves, while the peak RSS remains the one of the whole process.
+"""
+import resource
+import threading
+
+_marks = threading.local()
+
+
+def _self_usage():
+    if threading.current_thread() is threading.main_thread():
+        return resource.getrusage(resource.RUSAGE_SELF)
+    return resource.getrusage(resource.RUSAGE_THREAD)
+
+
+def _reset_peak_rss():
+    """Resets the peak RSS counter of the current process (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Peak RSS of the current process since the last mark, falling back to the lifetime peak."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def children_peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def mark():
+    """Starts accounting a new run."""
+    if threading.current_thread() is threading.main_thread():
+        # the peak RSS is shared by all threads, which must not reset it under each other
+        _reset_peak_rss()
+    _marks.self = _self_usage()
+    _marks.children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def usage(solver_memory_mb=None):
+    """Resources spent since the last mark (since the start of the process if there was none)."""
+    now_self = _self_usage()
+    now_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_user = now_self.ru_utime + now_children.ru_utime
+    cpu_sys = now_self.ru_stime + now_children.ru_stime
+    if getattr(_marks, 'self', None) is not None:
+        cpu_user -= _marks.self.ru_utime + _marks.children.ru_utime
+        cpu_sys -= _marks.self.ru_stime + _marks.children.ru_stime
+    return {
+        'cpu_user': round(cpu_user, 3),
+        'cpu_sys': round(cpu_sys, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'solver_peak_rss_mb': round(children_peak_rss_mb(), 1),
+        'solver_memory_mb': round(solver_memory_mb, 1) if solver_memory_mb is not None else None,
+    }
+
+
+def z3_memory_mb():
+    """Peak memory allocated by Z3 in this process, as reported in its statistics."""
+    import z3
+    stats = z3.Solver().statistics()
+    return stats.get_key_value('max memory') if 'max memory' in stats.keys() else None
+
+
+def minizinc_memory_mb(statistics):
+    """Peak memory from the statistics of a MiniZinc result (`peakMem`, in MB), if the solver reports it."""
+    value = statistics.get('peakMem')
+    return float(value) if isinstance(value, (int, float)) else None
@@ -0,0 +1,187 @@
+"""
+Concurrency-safe results store shared by all formulations.
+
+Every result is appended as a new row of a SQLite database (`/res/results.sqlite`, WAL mode),
+so many workers can record results for the same n at the same time without losing any.
+The `/res/<F>/<n>.json` files read by solution_checker.py are exported from the store,
+keeping the latest entry of each approach.
+"""
+import os
+import glob
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+
+DB_NAME = 'results.sqlite'
+# Set by the job runner: identifies the job configuration that produced the results, see runner.fingerprint
+FINGERPRINT_ENV = 'STS_FINGERPRINT'
+
+
+def db_path_for(output_dir):
+    """The store lives next to the per-formulation result folders (e.g. /res/SAT -> /res/results.sqlite)."""
+    return os.path.join(os.path.dirname(os.path.normpath(output_dir)), DB_NAME)
+
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=120, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        formulation TEXT NOT NULL,
+                        n INTEGER NOT NULL,
+                        approach TEXT NOT NULL,
+                        created REAL NOT NULL,
+                        entry TEXT NOT NULL,
+                        fingerprint TEXT)""")
+    if 'fingerprint' not in [row[1] for row in conn.execute("PRAGMA table_info(results)")]:
+        conn.execute("ALTER TABLE results ADD COLUMN fingerprint TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS results_instance ON results (formulation, n, approach)")
+    conn.execute("CREATE INDEX IF NOT EXISTS results_fingerprint ON results (fingerprint)")
+    return conn
+
+
+def _import_legacy(conn, output_dir, formulation, n):
+    """Imports a res/<F>/<n>.json written before the store existed, so its approaches are not lost on export."""
+    if conn.execute("SELECT 1 FROM results WHERE formulation = ? AND n = ? LIMIT 1", (formulation, n)).fetchone():
+        return
+    json_path = os.path.join(output_dir, f"{n}.json")
+    try:
+        with open(json_path) as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return
+    created = os.path.getmtime(json_path)
+    conn.executemany("INSERT INTO results (formulation, n, approach, created, entry) VALUES (?, ?, ?, ?, ?)",
+                     [(formulation, n, approach, created, json.dumps(entry)) for approach, entry in data.items()])
+
+
+def _latest(conn, formulation, n, since=None):
+    """Latest entry of each approach for an instance, in order of first appearance."""
+    rows = conn.execute("SELECT approach, entry FROM results WHERE formulation = ? AND n = ? AND created >= ? ORDER BY id",
+                        (formulation, n, since if since is not None else 0)).fetchall()
+    latest = {}
+    for approach, entry in rows:
+        latest[approach] = entry
+    return {approach: json.loads(entry) for approach, entry in latest.items()}
+
+
+def _write_json(json_path, data):
+    """Atomically replaces the JSON file, so readers never see a partially written file."""
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(json_path)}.", dir=os.path.dirname(json_path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, json_path)
+
+
+def export_instance(conn, output_dir, n):
+    """Writes res/<F>/<n>.json from the store."""
+    formulation = os.path.basename(os.path.normpath(output_dir))
+    data = _latest(conn, formulation, n)
+    if data:
+        os.makedirs(output_dir, exist_ok=True)
+        _write_json(os.path.join(output_dir, f"{n}.json"), data)
+
+
+def record_result(output_dir, n, approach, entry):
+    """
+    Appends one result to the store and refreshes the exported res/<F>/<n>.json.
+    Insert and export happen in a single write transaction, so concurrent writers are serialized.
+    """
+    formulation = os.path.basename(os.path.normpath(output_dir))
+    conn = _connect(db_path_for(output_dir))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _import_legacy(conn, output_dir, formulation, n)
+            conn.execute("INSERT INTO results (formulation, n, approach, created, entry, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+                         (formulation, n, approach, time.time(), json.dumps(entry), os.environ.get(FINGERPRINT_ENV)))
+            export_instance(conn, output_dir, n)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def results_since(output_dir, n, since):
+    """Latest entry of each approach recorded for an instance at or after the `since` timestamp."""
+    db_path = db_path_for(output_dir)
+    if not os.path.exists(db_path):
+        return {}
+    conn = _connect(db_path)
+    try:
+        return _latest(conn, os.path.basename(os.path.normpath(output_dir)), n, since)
+    finally:
+        conn.close()
+
+
+def fingerprint_results(output_dir, fingerprint):
+    """Latest entry of each approach recorded with the given job fingerprint."""
+    db_path = db_path_for(output_dir)
+    if not os.path.exists(db_path):
+        return {}
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute("SELECT approach, entry FROM results WHERE fingerprint = ? ORDER BY id", (fingerprint,)).fetchall()
+    finally:
+        conn.close()
+    return {approach: json.loads(entry) for approach, entry in rows}
+
+
+def all_results(res_dir):
+    """
+    Every result ever recorded, as (formulation, n, approach, entry) rows in order of recording,
+    followed by the res/<F>/<n>.json files of instances the store does not hold.
+    """
+    rows = []
+    db_path = os.path.join(res_dir, DB_NAME)
+    if os.path.exists(db_path):
+        conn = _connect(db_path)
+        try:
+            rows = [(formulation, n, approach, json.loads(entry)) for formulation, n, approach, entry in
+                    conn.execute("SELECT formulation, n, approach, entry FROM results ORDER BY id")]
+        finally:
+            conn.close()
+    stored = {(formulation, n) for formulation, n, _, _ in rows}
+    for json_path in sorted(glob.glob(os.path.join(res_dir, '*', '*.json'))):
+        formulation = os.path.basename(os.path.dirname(json_path))
+        try:
+            n = int(os.path.splitext(os.path.basename(json_path))[0])
+            with open(json_path) as f:
+                data = json.load(f)
+        except (ValueError, OSError):
+            continue
+        if (formulation, n) not in stored:
+            rows += [(formulation, n, approach, entry) for approach, entry in data.items()]
+    return rows
+
+
+def export_all(res_dir):
+    """Regenerates every res/<F>/<n>.json from the store."""
+    conn = _connect(os.path.join(res_dir, DB_NAME))
+    try:
+        instances = conn.execute("SELECT DISTINCT formulation, n FROM results ORDER BY formulation, n").fetchall()
+        for formulation, n in instances:
+            export_instance(conn, os.path.join(res_dir, formulation), n)
+    finally:
+        conn.close()
+    return instances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the results store to the res/<F>/<n>.json layout.")
+    parser.add_argument("--res", default="/res", help="Results directory containing results.sqlite")
+    args = parser.parse_args()
+
+    instances = export_all(args.res)
+    print(f"Exported {len(instances)} result files to {args.res}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,5 @@ docker run -v "$PWD/res:/res" cdmo python3 /src/main.py --run_all_formulations
 mv ./res/CP ../res
 mv ./res/SAT ../res
 mv ./res/SMT ../res
-mv ./res/MIP ../res
\ No newline at end of file
+mv ./res/MIP ../res
+mv ./res/results.sqlite ../res
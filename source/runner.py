@@ -0,0 +1,690 @@
+import os
+import sys
+import json
+import shlex
+import shutil
+import time
+import queue
+import hashlib
+import tempfile
+import signal
+import threading
+import traceback
+import subprocess
+import multiprocessing
+import importlib.util
+from functools import lru_cache
+from typing import List, Optional
+from importlib import metadata
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import tracing
+from results_store import results_since, fingerprint_results, FINGERPRINT_ENV
+from solution_checker import check_solution
+from SAT.sweep import ENCODING_PAIRS as SAT_ENCODING_PAIRS
+
+# Configuration grids swept by `--all`, mirroring the combinations each formulation runs internally
+# (the SAT encodings are the ones of SAT/main.py --all, see SAT/sweep.py)
+# SAT backends swept when installed, see SAT/backends.py (PySAT for cadical, a DIMACS solver binary for external)
+SAT_BACKENDS = ["z3", "cadical", "external"]
+CP_COMBINATIONS = [("gecode", "base", "Y"),
+                   ("gecode", "base", "N"),
+                   ("gecode", "dwd_random", "Y"),
+                   ("gecode", "dwd_r_Luby", "Y"),
+                   ("chuffed", "base", "Y"),
+                   ("chuffed", "base", "N"),
+                   ("chuffed", "ro_Luby", "Y")]
+MIP_MODELS = [("CM", "--CM"), ("4D", "--_4D")]
+
+# Best optimization configuration of each formulation, raced against each other by `--race`
+RACE_PORTFOLIO = {
+    'sat': (['--exactly_one_encoding', 'heule', '--at_most_k_encoding', 'totalizer', '--sb', '--run_optimization', '--save_json'],
+            ['optimization_heule_totalizer_sb']),
+    'smt': (['--approach_base', 'z3_optimal'], ['z3_optimal_sb_enabled']),
+    'cp': (['-s', 'chuffed', '-ss', 'ro_Luby', '--sb', 'Y', '--run_optimization', '--save_json'], ['o_chuffed_SB_ro_Luby']),
+    'mip': (['--CM', '--run_optimization', '--ic', 'true'], ['optimization_{solver}_circleMatching_ic']),
+}
+
+MODE_FLAGS = ['--run_decisional', '--run_optimization', '--all']
+# options (with their value) of SMT/optimal.py only, not passed to SMT/decisional.py
+SMT_OPTIMAL_OPTIONS = ['--engine']
+
+# Random seeds hard-coded in the formulations (SMT and MIP run with the solver defaults)
+SOLVER_SEEDS = {'sat': 42, 'cp': 42, 'smt': None, 'mip': None}
+SOLVER_PACKAGES = {'sat': ['z3-solver', 'python-sat'], 'smt': ['z3-solver'], 'cp': ['minizinc'], 'mip': ['pyomo']}
+# Arguments that do not change what a job computes
+NEUTRAL_ARGS = ['--save_json', '--verbose']
+DEFAULT_TIMEOUT = 300
+
+# Imported once by the forkserver, so warm workers start with the solver libraries already loaded
+PRELOAD_MODULES = ['numpy', 'z3', 'pyomo.environ', 'minizinc', 'runner']
+
+
+def drop_options(args: List[str], options: List[str]) -> List[str]:
+    """The args without the given options and their values (in either the `--name value` or `--name=value` form)."""
+    kept = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in options:
+            skip = True
+        elif arg.split('=', 1)[0] not in options:
+            kept.append(arg)
+    return kept
+
+
+def _modes(extra_args_list: List[str]) -> List[str]:
+    """Returns the solving modes requested by the extra args (both when none is given)."""
+    run_decisional = '--run_decisional' in extra_args_list
+    run_optimal = '--run_optimization' in extra_args_list
+    run_both = not run_decisional and not run_optimal
+    modes = []
+    if run_decisional or run_both:
+        modes.append('--run_decisional')
+    if run_optimal or run_both:
+        modes.append('--run_optimization')
+    return modes
+
+
+@lru_cache(maxsize=None)
+def sat_backends() -> List[str]:
+    """The SAT backends of SAT_BACKENDS installed here."""
+    available = {
+        'z3': True,
+        'cadical': importlib.util.find_spec('pysat') is not None,
+        'external': shutil.which(shlex.split(os.environ.get('STS_SAT_SOLVER', 'kissat'))[0]) is not None,
+    }
+    return [backend for backend in SAT_BACKENDS if available[backend]]
+
+
+@lru_cache(maxsize=None)
+def solver_versions(formulation: str) -> dict:
+    """Versions of the solver packages (and of the MiniZinc binary) a formulation runs with."""
+    versions = {}
+    for package in SOLVER_PACKAGES[formulation]:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    if formulation == 'cp':
+        try:
+            versions['minizinc-bin'] = subprocess.run(['minizinc', '--version'], capture_output=True,
+                                                      text=True).stdout.strip().splitlines()[-1]
+        except (OSError, IndexError):
+            versions['minizinc-bin'] = None
+    return versions
+
+
+def fingerprint(formulation: str, n: int, script: str, args: List[str]) -> str:
+    """
+    Identifies what a job computes: formulation, n, model configuration (encodings, model file,
+    symmetry breaking, solver), timeout, seed and solver versions.
+    """
+    config = [arg for arg in args if arg not in NEUTRAL_ARGS]
+    timeout = DEFAULT_TIMEOUT
+    for flag in ('-t', '--timeout'):
+        if flag in config[:-1]:
+            timeout = int(config[config.index(flag) + 1])
+    record = {
+        'formulation': formulation,
+        'n': n,
+        'script': os.path.basename(script),
+        'config': config,
+        'timeout': timeout,
+        'seed': SOLVER_SEEDS[formulation],
+        'versions': solver_versions(formulation),
+    }
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _job(formulation: str, n: int, name: str, script: str, args: List[str], config: dict) -> dict:
+    return {
+        'formulation': formulation,
+        'n': n,
+        'name': f"{formulation}/{name}/n={n}",
+        # jobs differing only in n share the configuration, see schedule_jobs
+        'config': f"{formulation}/{name}",
+        'cmd': [sys.executable, script] + args,
+        'cwd': config['path'],
+        'res_dir': config['res_dir'],
+        'fingerprint': fingerprint(formulation, n, script, args),
+    }
+
+
+def already_solved(job: dict) -> bool:
+    """
+    True when the results store holds checker-valid results recorded with the job's fingerprint, each with
+    a schedule found (and proven optimal) within the time limit. Timed-out results are valid for the checker,
+    but resuming a sweep runs their jobs again.
+    """
+    entries = fingerprint_results(job['res_dir'], job['fingerprint'])
+    if not entries:
+        return False
+    return all(e.get('sol') and e.get('optimal')
+               and isinstance(check_solution(e.get('sol'), e.get('obj'), e.get('time'), e.get('optimal')), str)
+               for e in entries.values())
+
+
+def job_solved(job: dict) -> Optional[bool]:
+    """
+    Whether the results recorded with the job's fingerprint were all solved within the time limit
+    (proven optimal, or a decisional schedule found). None when the job has no results yet.
+    """
+    entries = fingerprint_results(job['res_dir'], job['fingerprint'])
+    if not entries:
+        return None
+    return all(bool(e.get('optimal')) for e in entries.values())
+
+
+def expand_jobs(formulation: str, n_list: List[int], extra_args_list: List[str], config: dict) -> List[dict]:
+    """
+    Expands a formulation sweep into independent (n, configuration) jobs.
+    With --all every configuration of the formulation becomes its own job,
+    otherwise one job per n and solving mode is created with the extra args passed through.
+    """
+    run_all = '--all' in extra_args_list
+    passthrough = [arg for arg in extra_args_list if arg not in MODE_FLAGS]
+    modes = _modes(extra_args_list)
+    jobs = []
+
+    for n in n_list:
+        for mode in modes:
+            short = 'dec' if mode == '--run_decisional' else 'opt'
+            if formulation == 'sat':
+                save = [] if '--save_json' in passthrough else ['--save_json']
+                if run_all:
+                    backends = sat_backends() if '--backend' not in passthrough else [None]
+                    for sb in ['--sb', '--no_sb']:
+                        for eo, ak, balance in SAT_ENCODING_PAIRS:
+                            for backend in backends:
+                                dimacs = backend not in (None, 'z3')
+                                if dimacs and balance == 'totalizer':
+                                    continue  # the default of the DIMACS formula, already swept
+                                args = ['-n', str(n), '--exactly_one_encoding', eo, '--at_most_k_encoding', ak, sb, mode]
+                                encodings = f"{eo}_{ak}_{balance}" if balance else f"{eo}_{ak}"
+                                name = f"{short}_{encodings}_{sb[2:]}"
+                                if balance:
+                                    args += ['--balance_encoding', balance]
+                                if dimacs:
+                                    args += ['--backend', backend]
+                                    name = f"{short}_{backend}_{encodings}_{sb[2:]}"
+                                jobs.append(_job('sat', n, name, config['main_file'], args + save + passthrough, config))
+                else:
+                    jobs.append(_job('sat', n, short, config['main_file'],
+                                     ['-n', str(n), mode] + save + passthrough, config))
+            elif formulation == 'cp':
+                save = [] if '--save_json' in passthrough else ['--save_json']
+                if run_all:
+                    for solver, ss, sb in CP_COMBINATIONS:
+                        args = ['-n', str(n), '-s', solver, '-ss', ss, '--sb', sb, mode]
+                        jobs.append(_job('cp', n, f"{short}_{solver}_{ss}_{sb}", config['main_file'],
+                                         args + save + passthrough, config))
+                else:
+                    jobs.append(_job('cp', n, short, config['main_file'],
+                                     ['-n', str(n), mode] + save + passthrough, config))
+            elif formulation == 'mip':
+                if run_all:
+                    for model_name, model_flag in MIP_MODELS:
+                        for ic in ['false', 'true']:
+                            args = ['-n', str(n), model_flag, mode, '--ic', ic]
+                            jobs.append(_job('mip', n, f"{short}_{model_name}_ic_{ic}", config['main_file'],
+                                             args + passthrough, config))
+                else:
+                    jobs.append(_job('mip', n, short, config['main_file'],
+                                     ['-n', str(n), mode] + passthrough, config))
+            elif formulation == 'smt':
+                script = config['main_file_dec'] if mode == '--run_decisional' else config['main_file_opt']
+                base = 'z3_decisional' if mode == '--run_decisional' else 'z3_optimal'
+                sb_options = [[], ['--sb_disabled']] if run_all and '--sb_disabled' not in passthrough else [[]]
+                options = passthrough if mode == '--run_optimization' else drop_options(passthrough, SMT_OPTIMAL_OPTIONS)
+                for sb in sb_options:
+                    name = f"{short}_{'no_sb' if sb else 'sb'}"
+                    jobs.append(_job('smt', n, name, script,
+                                     ['-n', str(n), '--approach_base', base] + sb + options, config))
+    return jobs
+
+
+def _kill(proc: subprocess.Popen):
+    """Kills the whole process group of a job, including solver subprocesses (minizinc, cbc, ...)."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _spawn(job: dict, cpu: Optional[int], stdout=subprocess.PIPE) -> subprocess.Popen:
+    """Starts a job in its own session, optionally pinned to a single CPU."""
+    # the fingerprint is recorded by the results store along with every result of the job
+    env = dict(os.environ, **{FINGERPRINT_ENV: job['fingerprint']})
+    proc = subprocess.Popen(job['cmd'], cwd=job['cwd'], stdout=stdout, stderr=subprocess.STDOUT,
+                            text=True, start_new_session=True, env=env)
+    if cpu is not None:
+        try:
+            # solver subprocesses started later by the job inherit the affinity
+            os.sched_setaffinity(proc.pid, {cpu})
+        except (AttributeError, OSError):
+            pass
+    return proc
+
+
+def run_job(job: dict, cpu: Optional[int] = None, job_timeout: Optional[float] = None) -> dict:
+    """Runs a single job to completion or until its wall-clock limit, returning its outcome."""
+    start = time.perf_counter()
+    proc = _spawn(job, cpu)
+    try:
+        output, _ = proc.communicate(timeout=job_timeout)
+        status = 'ok' if proc.returncode == 0 else 'failed'
+    except subprocess.TimeoutExpired:
+        _kill(proc)
+        output, _ = proc.communicate()
+        status = 'timeout'
+    return {'status': status, 'output': output or '', 'elapsed': time.perf_counter() - start}
+
+
+def load_entry_point(script: str, modules: dict):
+    """Imports a formulation script as a module (once per worker), with its folder on sys.path for local imports."""
+    if script not in modules:
+        folder = os.path.dirname(script)
+        if folder not in sys.path:
+            sys.path.insert(0, folder)
+        name = f"sts_{os.path.basename(folder).lower()}_{os.path.splitext(os.path.basename(script))[0]}"
+        spec = importlib.util.spec_from_file_location(name, script)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules[script] = module
+    return modules[script]
+
+
+def _run_in_process(job: dict, modules: dict) -> dict:
+    """Runs a job by calling the formulation entry point in the current process, capturing its output."""
+    start = time.perf_counter()
+    log = tempfile.TemporaryFile(mode='w+')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+    # redirect at the file descriptor level, so echo and solver subprocesses are captured too
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    os.environ[FINGERPRINT_ENV] = job['fingerprint']
+    status = 'ok'
+    try:
+        os.chdir(job['cwd'])
+        load_entry_point(job['cmd'][1], modules).main(job['cmd'][2:])
+    except SystemExit as e:
+        status = 'ok' if not e.code else 'failed'
+    except Exception:
+        traceback.print_exc()
+        status = 'failed'
+    finally:
+        # warm workers never exit normally, so their spans are written after every job
+        tracing.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+    log.seek(0)
+    output = log.read()
+    log.close()
+    return {'status': status, 'output': output, 'elapsed': time.perf_counter() - start}
+
+
+def _warm_worker_loop(conn, cpu: Optional[int]):
+    """Body of a warm worker: runs the jobs it receives until it gets None."""
+    os.setsid()
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    modules = {}
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        conn.send(_run_in_process(job, modules))
+
+
+@lru_cache(maxsize=None)
+def _forkserver_context():
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+class WarmWorker:
+    """
+    A long-lived worker process forked from a server with z3, pyomo and minizinc already imported.
+    Formulations are called as library functions, so jobs pay no interpreter or import start-up cost.
+    """
+
+    def __init__(self, cpu: Optional[int] = None):
+        context = _forkserver_context()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_warm_worker_loop, args=(child_conn, cpu))
+        self.process.start()
+        child_conn.close()
+
+    def run(self, job: dict, job_timeout: Optional[float] = None) -> dict:
+        start = time.perf_counter()
+        self.conn.send(job)
+        if self.conn.poll(job_timeout):
+            try:
+                return self.conn.recv()
+            except EOFError:
+                status = 'failed'
+        else:
+            status = 'timeout'
+        # a crashed or timed out worker cannot be reused
+        self.kill()
+        return {'status': status, 'output': '', 'elapsed': time.perf_counter() - start}
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.join()
+
+    def close(self):
+        if self.alive():
+            self.conn.send(None)
+            self.process.join()
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """Thread-safe live summary of a running sweep."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.running = 0
+        self.counts = {'ok': 0, 'timeout': 0, 'failed': 0}
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def started(self):
+        with self.lock:
+            self.running += 1
+
+    def finished(self, job: dict, outcome: dict):
+        with self.lock:
+            self.running -= 1
+            self.done += 1
+            self.counts[outcome['status']] = self.counts.get(outcome['status'], 0) + 1
+            elapsed = time.perf_counter() - self.start
+            eta = elapsed / self.done * (self.total - self.done)
+            output = outcome['output'].strip()
+            if output:
+                print(output)
+            print(f"[{self.done}/{self.total}] {outcome['status']:<7} {job['name']} ({outcome['elapsed']:.1f}s) | "
+                  f"ok={self.counts['ok']} timeout={self.counts['timeout']} failed={self.counts['failed']} | "
+                  f"running={self.running} | elapsed {_format_seconds(elapsed)} eta {_format_seconds(eta)}",
+                  flush=True)
+
+    def drop(self, count: int):
+        """Removes jobs that will not run anymore from the total."""
+        with self.lock:
+            self.total -= count
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        print(f"--- {self.done} jobs in {_format_seconds(elapsed)}: ok={self.counts['ok']} "
+              f"timeout={self.counts['timeout']} failed={self.counts['failed']} ---", flush=True)
+
+
+def _slot_cpus(workers: int, pin_cpus: bool) -> List[Optional[int]]:
+    """The CPU each worker slot is pinned to (None when not pinning)."""
+    cpus = []
+    if pin_cpus and hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        if workers > len(cpus):
+            print(f"[WARNING] {workers} workers pinned on {len(cpus)} CPUs: some CPUs will be shared.")
+    return [cpus[i % len(cpus)] if cpus else None for i in range(workers)]
+
+
+class WorkerSlots:
+    """
+    The slots of a worker pool: each runs one job at a time, pinned to its own CPU,
+    either in a fresh process or in a warm worker kept for the whole sweep.
+    """
+
+    def __init__(self, workers: int, pin_cpus: bool = False, warm: bool = False):
+        self.cpus = _slot_cpus(workers, pin_cpus)
+        self.free = queue.Queue()
+        for slot in range(workers):
+            self.free.put(slot)
+        self.warm = warm
+        self.warm_workers = {}
+
+    def run(self, job: dict, job_timeout: Optional[float], progress: Progress) -> dict:
+        slot = self.free.get()
+        progress.started()
+        try:
+            if self.warm:
+                worker = self.warm_workers.get(slot)
+                if worker is None or not worker.alive():
+                    worker = self.warm_workers[slot] = WarmWorker(self.cpus[slot])
+                outcome = worker.run(job, job_timeout)
+            else:
+                outcome = run_job(job, self.cpus[slot], job_timeout)
+        finally:
+            self.free.put(slot)
+        progress.finished(job, outcome)
+        return outcome
+
+    def close(self):
+        for worker in self.warm_workers.values():
+            worker.close()
+
+
+def run_jobs(jobs: List[dict], workers: int, job_timeout: Optional[float] = None, pin_cpus: bool = False,
+             resume: bool = True, warm: bool = False) -> List[dict]:
+    """
+    Runs the jobs on a pool of `workers` concurrent processes.
+    Each job is killed after `job_timeout` seconds of wall-clock time.
+    With `resume`, jobs whose fingerprint already has valid results in the store are skipped.
+    With `warm`, jobs run inside long-lived preloaded workers instead of a fresh interpreter each.
+    """
+    if resume:
+        pending = [job for job in jobs if not already_solved(job)]
+        if len(pending) < len(jobs):
+            print(f"--- skipping {len(jobs) - len(pending)} jobs already solved with identical settings ---")
+        jobs = pending
+    print(f"--- running {len(jobs)} jobs on {workers} {'warm ' if warm else ''}workers ---", flush=True)
+    slots = WorkerSlots(workers, pin_cpus, warm)
+    progress = Progress(len(jobs))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(lambda job: slots.run(job, job_timeout, progress), jobs))
+    finally:
+        slots.close()
+    progress.summary()
+    return outcomes
+
+
+def _next_index(chain: dict, strategy: str) -> Optional[int]:
+    """
+    Next n to try in a configuration chain, where every n up to index `lo` is known to be solvable
+    and every n from index `hi` on is known not to be: escalation tries the next size, bisection the middle one.
+    """
+    if chain['lo'] + 1 >= chain['hi']:
+        return None
+    if strategy == 'escalate':
+        return chain['lo'] + 1
+    return (chain['lo'] + chain['hi']) // 2
+
+
+def schedule_jobs(jobs: List[dict], workers: int, strategy: str = 'escalate', budget: Optional[float] = None,
+                  job_timeout: Optional[float] = None, pin_cpus: bool = False, resume: bool = True,
+                  warm: bool = False) -> dict:
+    """
+    Runs the jobs of each configuration in order of n instead of as a full grid, assuming that a
+    configuration that cannot solve some n within the time limit cannot solve any larger n either.
+    With 'escalate' each configuration climbs n and stops at its first timeout, with 'bisect' it
+    binary searches the largest solvable n. The slots freed by configurations that stopped go to
+    the ones still making progress, smallest pending n first, until the optional wall-clock `budget`
+    is used up. Returns the largest n solved by each configuration (None if none).
+    """
+    chains = {}
+    for job in sorted(jobs, key=lambda job: job['n']):
+        chains.setdefault(job['config'], {'jobs': [], 'lo': -1, 'hi': 0, 'seen': 0})
+        chains[job['config']]['jobs'].append(job)
+    for chain in chains.values():
+        chain['hi'] = len(chain['jobs'])
+
+    print(f"--- scheduling {len(jobs)} jobs of {len(chains)} configurations by {strategy} "
+          f"on {workers} {'warm ' if warm else ''}workers ---", flush=True)
+    deadline = time.perf_counter() + budget if budget else None
+    slots = WorkerSlots(workers, pin_cpus, warm)
+    progress = Progress(len(jobs))
+    running = {}
+    ran = 0
+
+    def update(chain, index, solved):
+        chain['seen'] += 1
+        if solved:
+            chain['lo'] = index
+        else:
+            chain['hi'] = index
+        if _next_index(chain, strategy) is None:
+            # the sizes left out of the chain will never run
+            progress.drop(len(chain['jobs']) - chain['seen'])
+
+    def pending():
+        """The next job of every idle configuration, smallest n first."""
+        candidates = []
+        for key, chain in chains.items():
+            index = _next_index(chain, strategy)
+            if key not in running.values() and index is not None:
+                candidates.append((chain['jobs'][index]['n'], key, index))
+        return sorted(candidates)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                remaining = deadline - time.perf_counter() if deadline else None
+                if remaining is not None and remaining <= 0 and not running:
+                    break
+                for _, key, index in pending():
+                    if len(running) >= workers or (remaining is not None and remaining <= 0):
+                        break
+                    chain = chains[key]
+                    job = chain['jobs'][index]
+                    stored = job_solved(job) if resume else None
+                    if stored is not None:
+                        # already run with identical settings: reuse the outcome
+                        progress.drop(1)
+                        update(chain, index, stored)
+                        continue
+                    # no job may outlive the budget
+                    timeout = job_timeout
+                    if remaining is not None:
+                        timeout = min(timeout, remaining) if timeout else remaining
+                    running[executor.submit(slots.run, job, timeout, progress)] = key
+                    chain['running'] = index
+                if not running:
+                    if not pending():
+                        break
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chain = chains[running.pop(future)]
+                    job = chain['jobs'][chain['running']]
+                    ran += 1
+                    update(chain, chain['running'], future.result()['status'] == 'ok' and bool(job_solved(job)))
+    finally:
+        slots.close()
+    progress.drop(progress.total - progress.done)
+    progress.summary()
+
+    largest = {}
+    for key, chain in chains.items():
+        largest[key] = chain['jobs'][chain['lo']]['n'] if chain['lo'] >= 0 else None
+        print(f"{key:<40} largest solved n={largest[key]}", flush=True)
+    print(f"--- {ran} of {len(jobs)} jobs run, {len(jobs) - ran} skipped ---", flush=True)
+    return largest
+
+
+def portfolio_jobs(n: int, models: dict) -> List[dict]:
+    """Builds one job per formulation of the race portfolio for a given n."""
+    gurobi = os.path.exists('/opt/gurobi/gurobi.lic') or os.path.exists(os.path.join(models['mip']['path'], 'gurobi.lic'))
+    mip_solver = 'gurobi' if gurobi else 'cbc'
+    jobs = []
+    for formulation, (args, approaches) in RACE_PORTFOLIO.items():
+        config = models[formulation]
+        script = config.get('main_file_opt', config.get('main_file'))
+        if formulation == 'mip':
+            args = args + ['--solver', mip_solver]
+        job = _job(formulation, n, 'race', script, ['-n', str(n)] + args, config)
+        job['approaches'] = [a.format(solver=mip_solver) for a in approaches]
+        jobs.append(job)
+    return jobs
+
+
+def selected_jobs(n: int, choices: List[tuple], models: dict) -> List[dict]:
+    """Builds one job per configuration picked by selector.select (formulation, approach, args) for a given n."""
+    jobs = []
+    for formulation, approach, args in choices:
+        config = models[formulation]
+        script = config.get('main_file') or config['main_file_dec' if 'z3_decisional' in args else 'main_file_opt']
+        job = _job(formulation, n, f"select_{approach}", script, ['-n', str(n)] + args, config)
+        job['approaches'] = [approach]
+        jobs.append(job)
+    return jobs
+
+
+def _optimal_result(job: dict, since: float) -> Optional[str]:
+    """Returns the approach name if the job recorded a proven-optimal schedule after `since`."""
+    recorded = results_since(job['res_dir'], job['n'], since)
+    for approach in job['approaches']:
+        entry = recorded.get(approach, {})
+        if entry.get('optimal') and entry.get('sol'):
+            return approach
+    return None
+
+
+def race(jobs: List[dict], timeout: Optional[float] = None, pin_cpus: bool = False) -> Optional[dict]:
+    """
+    Starts all jobs at once and waits for the first one that produces a proven-optimal schedule.
+    The remaining jobs are killed as soon as a winner is found or the wall-clock limit expires.
+    Returns the winning job (with its approach and elapsed time) or None.
+    """
+    cpus = _slot_cpus(len(jobs), pin_cpus)
+    since = time.time()
+    start = time.perf_counter()
+    running = {}
+    for job, cpu in zip(jobs, cpus):
+        log = tempfile.TemporaryFile(mode='w+')
+        running[job['name']] = (job, _spawn(job, cpu, stdout=log), log)
+
+    winner = None
+    try:
+        while running and winner is None:
+            if timeout is not None and time.perf_counter() - start > timeout:
+                break
+            for name, (job, proc, log) in list(running.items()):
+                if proc.poll() is None:
+                    continue
+                del running[name]
+                approach = _optimal_result(job, since)
+                if approach is not None:
+                    log.seek(0)
+                    winner = dict(job, approach=approach, elapsed=time.perf_counter() - start, output=log.read())
+                    break
+                print(f"[Race] {job['name']} finished without a proven-optimal schedule "
+                      f"({time.perf_counter() - start:.1f}s)", flush=True)
+            time.sleep(0.05)
+    finally:
+        for job, proc, log in running.values():
+            _kill(proc)
+            proc.wait()
+            log.close()
+    return winner
@@ -0,0 +1,191 @@
+"""
+Configuration selector learned from the results of earlier runs (`main.py --select`).
+
+The `--all` sweeps run every configuration of a formulation, although the results already stored in /res
+show which ones are fastest at each size. The selector reads every result of the store (repeated runs
+included) and predicts the time of each configuration of the `--all` grids for a requested n:
+
+    * at a size it solved, the median of its runs;
+    * otherwise from an exponential fit, log(time) = a + b·n, over the solved sizes closest to n, so that
+      sizes beyond the largest one seen are extrapolated. A configuration solved at a single size grows
+      like the median fit of the others. The prediction is never faster than a smaller size, and infinite
+      when the configuration did not solve a size up to n within the time limit, the assumption of
+      schedule_jobs in runner.py.
+
+Configurations predicted to time out are ranked last, by the largest size they solved. The stored times
+are whole wall-clock seconds, taken at the middle of their second (a time of 0 s is about 0.5 s).
+Configurations that never ran are left out: the selector ranks what the history shows.
+
+    python3 selector.py -n 22 --top 5
+"""
+import os
+import math
+import shutil
+import argparse
+import statistics
+from typing import List, Optional
+
+from results_store import all_results
+from SAT.sweep import ENCODING_PAIRS as SAT_ENCODING_PAIRS
+from runner import SAT_BACKENDS, CP_COMBINATIONS, MIP_MODELS, DEFAULT_TIMEOUT, sat_backends
+
+FORMULATIONS = ['sat', 'smt', 'cp', 'mip']
+MODES = ['decisional', 'optimization']
+MIP_SOLVERS = ['cbc', 'glpk', 'gurobi']
+# executables the open-source solvers are run through
+SOLVER_BINARIES = {'cp': 'minizinc', 'cbc': 'cbc', 'glpk': 'glpsol'}
+# solved sizes a prediction is fitted on, and the shortest time it trusts
+FIT_SIZES = 4
+MIN_SECONDS = 0.01
+
+
+def candidates(formulation: str, mode: str) -> List[tuple]:
+    """(approach, args) of every configuration of the formulation's `--all` grid in a solving mode."""
+    flag = '--run_decisional' if mode == 'decisional' else '--run_optimization'
+    configs = []
+    if formulation == 'sat':
+        for sb in ['sb', 'no_sb']:
+            for eo, ak, balance in SAT_ENCODING_PAIRS:
+                for backend in SAT_BACKENDS:
+                    dimacs = backend != 'z3'
+                    if dimacs and balance == 'totalizer':
+                        continue  # the default of the DIMACS formula
+                    args = ['--exactly_one_encoding', eo, '--at_most_k_encoding', ak, f'--{sb}', flag, '--save_json']
+                    args += ['--balance_encoding', balance] if balance else []
+                    args += ['--backend', backend] if dimacs else []
+                    name = f"{backend + '_' if dimacs else ''}{eo}_{ak}{'_' + balance if balance else ''}_{sb}"
+                    configs.append((f"{mode}_{name}", args))
+    elif formulation == 'smt':
+        base = 'z3_decisional' if mode == 'decisional' else 'z3_optimal'
+        configs = [(f"{base}_sb_enabled", ['--approach_base', base]),
+                   (f"{base}_sb_disabled", ['--approach_base', base, '--sb_disabled'])]
+    elif formulation == 'cp':
+        for solver, ss, sb in CP_COMBINATIONS:
+            name = f"{mode[0]}_{solver}_{'SB' if sb == 'Y' else 'no_SB'}_{ss}"
+            configs.append((name, ['-s', solver, '-ss', ss, '--sb', sb, flag, '--save_json']))
+    elif formulation == 'mip':
+        prefix = 'decision' if mode == 'decisional' else 'optimization'
+        for model, model_flag in MIP_MODELS:
+            for ic in ['false', 'true']:
+                for solver in MIP_SOLVERS:
+                    name = f"{prefix}_{solver}_{'circleMatching' if model == 'CM' else '4dArray'}_{'ic' if ic == 'true' else 'no_ic'}"
+                    configs.append((name, [model_flag, flag, '--ic', ic, '--solver', solver]))
+    return configs
+
+
+def installed(formulation: str, args: List[str], mip_path: str = '/src/MIP') -> bool:
+    """Whether the solver a configuration needs is available here."""
+    if formulation == 'sat' and '--backend' in args:
+        return args[args.index('--backend') + 1] in sat_backends()
+    if formulation == 'mip' and args[-1] == 'gurobi':
+        return os.path.exists('/opt/gurobi/gurobi.lic') or os.path.exists(os.path.join(mip_path, 'gurobi.lic'))
+    binary = SOLVER_BINARIES.get(args[-1] if formulation == 'mip' else formulation)
+    return binary is None or shutil.which(binary) is not None
+
+
+def seconds(entry: dict) -> Optional[float]:
+    """Run time of a solved result, the middle of its recorded whole second; None if unsolved."""
+    if not entry.get('optimal'):
+        return None
+    return (entry.get('time') or 0) + 0.5
+
+
+def history(res_dir: str) -> dict:
+    """{(formulation, approach): {n: [seconds, or -limit when not solved within `limit` seconds]}}."""
+    observed = {}
+    for formulation, n, approach, entry in all_results(res_dir):
+        runs = observed.setdefault((formulation.lower(), approach), {}).setdefault(n, [])
+        solved = seconds(entry)
+        runs.append(solved if solved is not None else -float(entry.get('time') or DEFAULT_TIMEOUT))
+    return observed
+
+
+def _fit(points):
+    """Slope and intercept of the least-squares line through (n, log seconds) points."""
+    mean_n = statistics.fmean(n for n, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    spread = sum((n - mean_n) ** 2 for n, _ in points)
+    slope = sum((n - mean_n) * (y - mean_y) for n, y in points) / spread
+    return slope, mean_y - slope * mean_n
+
+
+def growth_rate(observed: dict) -> float:
+    """Median over the configurations with several solved sizes of their fitted growth of log(time) per team."""
+    slopes = []
+    for by_n in observed.values():
+        points = [(n, math.log(statistics.median(runs))) for n, runs in by_n.items() if min(runs) > 0]
+        if len(points) >= 2:
+            slopes.append(max(0.0, _fit(sorted(points)[-FIT_SIZES:])[0]))
+    return statistics.median(slopes) if slopes else math.log(2) / 2
+
+
+def predict(by_n: dict, n: int, growth: float, timeout: float = DEFAULT_TIMEOUT) -> float:
+    """Predicted seconds of a configuration on n teams from its runs {n: [seconds or -limit]}; inf if out of reach."""
+    times = [run for run in by_n.get(n, []) if run > 0]
+    if times:
+        return statistics.median(times)
+    solved = {}
+    floor = MIN_SECONDS
+    for size, runs in by_n.items():
+        limits = [-run for run in runs if run < 0]
+        if size <= n:
+            if limits and max(limits) >= timeout:
+                return math.inf
+            # a size it ran out of time on takes it at least that long
+            floor = max([floor] + limits)
+        times = [run for run in runs if run > 0]
+        if times:
+            solved[size] = statistics.median(times)
+            if size <= n:
+                floor = max(floor, solved[size])
+    if not solved:
+        return math.inf
+    points = sorted(solved, key=lambda size: (abs(size - n), -size))[:FIT_SIZES]
+    points = [(size, math.log(solved[size])) for size in points]
+    slope, intercept = _fit(points) if len(points) >= 2 else (growth, points[0][1] - growth * points[0][0])
+    estimate = max(math.exp(intercept + max(slope, 0.0) * n), floor)
+    return estimate if estimate < timeout else math.inf
+
+
+def rank(n: int, formulations: List[str], mode: str, res_dir: str = '/res', timeout: float = DEFAULT_TIMEOUT) -> List[tuple]:
+    """
+    (predicted seconds, formulation, approach, args) of every installed configuration with history, fastest first,
+    then the ones predicted to time out by the largest size they solved.
+    """
+    observed = history(res_dir)
+    growth = growth_rate(observed)
+    ranking = []
+    for formulation in formulations:
+        for approach, args in candidates(formulation, mode):
+            by_n = observed.get((formulation, approach))
+            if by_n and installed(formulation, args):
+                reach = max([size for size, runs in by_n.items() if max(runs) > 0], default=0)
+                ranking.append((predict(by_n, n, growth, timeout), -reach, formulation, approach, args))
+    return [(predicted, formulation, approach, args) for predicted, _, formulation, approach, args in sorted(ranking)]
+
+
+def select(n: int, formulations: List[str], mode: str, top: int = 1, res_dir: str = '/res',
+           timeout: float = DEFAULT_TIMEOUT) -> List[tuple]:
+    """The `top` configurations of rank(): the ones predicted fastest on n teams."""
+    return rank(n, formulations, mode, res_dir, timeout)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the configurations of the formulations by their predicted time on n teams.")
+    parser.add_argument("-n", type=int, required=True, help="Number of teams")
+    parser.add_argument("-f", nargs='+', choices=FORMULATIONS, default=FORMULATIONS, help="Formulations to rank")
+    parser.add_argument("--mode", choices=MODES, default='optimization', help="Solving mode")
+    parser.add_argument("--top", type=int, default=10, help="Number of configurations to print")
+    parser.add_argument("-t", "--timeout", type=float, default=DEFAULT_TIMEOUT, help="Time limit of a run in seconds")
+    parser.add_argument("--res", default="/res", help="Results directory containing results.sqlite")
+    args = parser.parse_args()
+
+    ranking = rank(args.n, args.f, args.mode, args.res, args.timeout)
+    if not ranking:
+        print(f"No results in {args.res} for the configurations of {', '.join(args.f)}")
+    for predicted, formulation, approach, _ in ranking[:args.top]:
+        print(f"{formulation:<4} {approach:<50} {'timeout' if predicted == math.inf else f'{predicted:.2f}s'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Lightweight tracing shared by all formulations.
+
+Formulations wrap their phases in `span(name)`: the top-level phases are `circle_matchings`, `build`,
+`solve`, `extract` and `write`, with finer spans nested as `build.<constraint group>`, `solve.flatten`, ...
+The accumulated duration of every span name is always available through `phase_times()`.
+
+When the environment variable STS_TRACE names a directory, every span is also recorded as an event
+and written to `<dir>/trace_<pid>.json` in the Chrome trace format (chrome://tracing, Perfetto).
+The per-process files of a run can be merged into a single timeline with `python3 tracing.py <dir>`.
+"""
+import os
+import json
+import time
+import atexit
+import argparse
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+TRACE_ENV = 'STS_TRACE'
+
+_totals = defaultdict(float)
+_events = []
+# trace file of the current process (None when tracing is disabled), re-initialized after a fork
+_state = {'pid': None, 'path': None}
+# converts perf_counter values to wall-clock microseconds, so traces of different processes line up
+_EPOCH = time.time() - time.perf_counter()
+
+
+def _trace_path():
+    if _state['pid'] != os.getpid():
+        _state['pid'] = os.getpid()
+        _events.clear()
+        trace_dir = os.environ.get(TRACE_ENV)
+        _state['path'] = os.path.join(trace_dir, f"trace_{os.getpid()}.json") if trace_dir else None
+        if _state['path']:
+            atexit.register(flush)
+    return _state['path']
+
+
+def record(name, start, duration, **args):
+    """Adds a span measured elsewhere, `start` being a time.perf_counter() value."""
+    _totals[name] += duration
+    if _trace_path():
+        _events.append({
+            'name': name,
+            'cat': name.split('.')[0],
+            'ph': 'X',
+            'ts': (_EPOCH + start) * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+
+@contextmanager
+def span(name, **args):
+    """Times the enclosed block as the span `name`; keyword arguments are attached to the trace event."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter() - start, **args)
+
+
+def phase_times():
+    """Seconds spent in each span name since the last reset."""
+    return dict(_totals)
+
+
+def reset():
+    _totals.clear()
+    _events.clear()
+
+
+def flush():
+    """Writes the events recorded so far by this process to its trace file."""
+    path = _trace_path()
+    if not path or not _events:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms'}, f)
+    os.replace(tmp_path, path)
+
+
+def merge(trace_dir, output):
+    """Merges the per-process trace files of a directory into one Chrome trace."""
+    events = []
+    for name in sorted(os.listdir(trace_dir)):
+        if name.startswith('trace_') and name.endswith('.json'):
+            with open(os.path.join(trace_dir, name)) as f:
+                events += json.load(f)['traceEvents']
+    with open(output, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the per-process trace files of a run into one Chrome trace.")
+    parser.add_argument("trace_dir", help="Directory given as STS_TRACE (or main.py --trace)")
+    parser.add_argument("-o", "--output", default="trace.json", help="Merged Chrome trace file")
+    args = parser.parse_args()
+
+    count = merge(args.trace_dir, args.output)
+    print(f"Merged {count} events into {args.output}")
+
+
+if __name__ == '__main__':
+    main()
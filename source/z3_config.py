@@ -0,0 +1,120 @@
+"""
+Z3 configuration shared by the SAT and SMT formulations: the tactic pipeline of their solvers, parallel mode
+and the options of the pseudo-Boolean solver, all set from the command line (see add_arguments).
+
+A pipeline is one of PIPELINES, or a comma-separated list of Z3 tactics (e.g. simplify,card2bv,smt), run in
+sequence on the assertions before the last one solves them. Without --tactic every formulation keeps its own
+solver (DEFAULT_PIPELINES, Z3's default solver otherwise). 'auto' is opt-in: it takes the fastest pipeline
+measured for the formulation and the size of the instance by `benchmark.py --pipelines ... --save_pipelines`,
+stored in benchmarks/z3_pipelines.json on the machine it was measured on, and otherwise the default pipeline.
+Whenever --tactic is given, the pipeline actually used is part of the approach name (see pipeline_name).
+
+The parameters are global to the process: they apply to every solver created after configure().
+Optimize takes no tactic: the optimize engine of SMT/optimal.py only uses the parameters, its incremental
+engine solves with the pipeline.
+"""
+import os
+import json
+from functools import lru_cache
+
+from z3 import Solver, Tactic, Then, set_param
+
+PIPELINES = {
+    'default': None,                                 # Z3's default solver, chosen by the logic of the assertions
+    'smt': ['smt'],                                  # the SMT core alone
+    'qffd': ['qffd'],                                # Z3's tactic for finite domains (bit-vectors, Booleans, PB)
+    'card2bv': ['card2bv', 'smt'],                   # cardinality constraints to bit-vectors, then the SMT core
+    'pb2bv': ['simplify', 'propagate-values', 'pb2bv', 'smt'],
+    'sat': ['simplify', 'propagate-values', 'card2bv', 'bit-blast', 'sat'],  # Boolean models only: to CNF, then the SAT solver
+}
+# the solver of every formulation without --tactic, by the formulation names passed to configure()
+DEFAULT_PIPELINES = {'smt_dec': 'card2bv'}
+PB_SOLVERS = ['circuit', 'sorting', 'totalizer', 'binary_merge', 'segmented', 'solver']
+CARDINALITY_ENCODINGS = ['grouped', 'bimander', 'ordered', 'unate', 'circuit']
+PIPELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'z3_pipelines.json')
+
+_settings = {'formulation': None, 'pipeline': None}
+
+
+def add_arguments(parser):
+    """Adds the Z3 options to the argparse parser of a formulation."""
+    parser.add_argument("--tactic",
+                        help="Tactic pipeline of the Z3 solver (default: the solver of the formulation): "
+                             f"{', '.join(PIPELINES)}, tactics separated by commas, or auto (the fastest "
+                             "saved by benchmark.py --save_pipelines for n).")
+    parser.add_argument("--parallel", action='store_true', help="Enable Z3's parallel mode (parallel.enable).")
+    parser.add_argument("--sat_threads", type=int, help="Threads of Z3's SAT solver (sat.threads).")
+    parser.add_argument("--pb_solver", choices=PB_SOLVERS, help="Handling of PB constraints by the SAT solver (sat.pb.solver).")
+    parser.add_argument("--cardinality_encoding", choices=CARDINALITY_ENCODINGS,
+                        help="Encoding of at-most-k constraints by the SAT solver (sat.cardinality.encoding).")
+    parser.add_argument("--z3_param", action='append', default=[], metavar="NAME=VALUE",
+                        help="Any other global Z3 parameter, may be repeated.")
+
+
+def configure(args=None, formulation=None, **options):
+    """
+    Applies the Z3 options parsed by add_arguments (args, or the same names as keyword arguments).
+    formulation names its default pipeline in DEFAULT_PIPELINES and its pipelines in benchmarks/z3_pipelines.json.
+    """
+    options = {**(vars(args) if args is not None else {}), **options}
+    pipeline = options.get('tactic')
+    if pipeline is not None and pipeline not in PIPELINES and pipeline != 'auto':
+        for name in pipeline.split(','):
+            Tactic(name)  # raises a Z3Exception on an unknown tactic
+    _settings.update(formulation=formulation, pipeline=pipeline)
+
+    params = {}
+    if options.get('parallel'):
+        params['parallel.enable'] = True
+    if options.get('sat_threads'):
+        params['sat.threads'] = options['sat_threads']
+    if options.get('pb_solver'):
+        params['sat.pb.solver'] = options['pb_solver']
+    if options.get('cardinality_encoding'):
+        params['sat.cardinality.encoding'] = options['cardinality_encoding']
+    for param in options.get('z3_param') or []:
+        name, _, value = param.partition('=')
+        params[name] = value
+    for name, value in params.items():
+        set_param(name, value)
+    return params
+
+
+@lru_cache(maxsize=None)
+def benchmarked_pipelines(path=PIPELINES_PATH):
+    """{formulation: {n: pipeline}} measured by benchmark.py, empty if never saved."""
+    try:
+        with open(path) as f:
+            return {formulation: {int(n): pipeline for n, pipeline in by_n.items()}
+                    for formulation, by_n in json.load(f)['pipelines'].items()}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def pipeline_for(n=None):
+    """
+    The configured pipeline, the default of the formulation without one, and for 'auto' the one benchmarked
+    for the largest size up to n.
+    """
+    default = DEFAULT_PIPELINES.get(_settings['formulation'], 'default')
+    if _settings['pipeline'] != 'auto':
+        return _settings['pipeline'] or default
+    by_n = benchmarked_pipelines().get(_settings['formulation'], {})
+    sizes = [size for size in by_n if n is None or size <= n]
+    return by_n[max(sizes)] if sizes else default
+
+
+def pipeline_name(n=None):
+    """Approach name suffix of the pipeline used for n teams: empty without --tactic."""
+    return '' if _settings['pipeline'] is None else '_' + pipeline_for(n).replace(',', '+')
+
+
+def new_solver(ctx=None, n=None):
+    """A solver of the configured pipeline for an instance of n teams, in the Z3 context ctx."""
+    pipeline = pipeline_for(n)
+    tactics = PIPELINES[pipeline] if pipeline in PIPELINES else pipeline.split(',')
+    if tactics is None:
+        return Solver(ctx=ctx)
+    if len(tactics) == 1:
+        return Tactic(tactics[0], ctx).solver()
+    return Then(*tactics, ctx=ctx).solver()